@@ -0,0 +1,87 @@
+"""Benchmark entry conversion against `schema` based validation.
+
+The baseline is the previous implementation of `coerce.convert`, which
+validated records with the `schema` library. Records are copies of the
+mock entry used by the test suite. Run from the repository root:
+
+    python -m benchmarks.coerce --entries 10000
+"""
+
+from functools import partial
+from schema import And, Schema, Use
+
+import argparse
+import json
+import timeit
+
+from bookinglog import coerce
+
+
+MOCK_ENTRY = "tests/data/mock.json"
+
+len_eq1 = partial(coerce.len_eq, n=1)
+len_eq3 = partial(coerce.len_eq, n=3)
+
+inmate_schema = Schema({
+    "address": str,
+    "arrest_agency": str,
+    "arrest_date": Use(coerce.convert_dt),
+    "arrest_location": str,
+    "date_of_birth": Use(coerce.convert_dob),
+    "eye_color": And(str, len_eq3),
+    "hair_color": And(str, len_eq3),
+    "height": Use(coerce.parse_height),
+    "jail_id": str,
+    "latest_charge_date": Use(coerce.convert_dt),
+    "name": str,
+    "occupation": str,
+    "orig_booking_date": Use(coerce.convert_dt),
+    "race": And(str, len_eq1),
+    "sex": And(str, len_eq1),
+    "weight": Use(int)
+}, ignore_extra_keys=True)
+
+charge_schema = Schema([{
+    "bail": Use(coerce.parse_bail),
+    "charge": str,
+    "charge_authority": str,
+    "description": str,
+    "level": And(str, len_eq1)
+}], ignore_extra_keys=True)
+
+def convert_schema(inmate, charges):
+    inmate = inmate_schema.validate(coerce.standardize_keys(inmate))
+    charges = charge_schema.validate(
+        list(map(coerce.standardize_keys, charges)))
+    return inmate, charges
+
+def make_argparser():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser
+
+def main(entries, repeat):
+    with open(MOCK_ENTRY) as fh:
+        entry = tuple(json.load(fh))
+    batch = [entry] * entries
+
+    assert coerce.convert_many(batch[:1]) == [convert_schema(*entry)]
+
+    timings = {}
+    candidates = (
+        ("schema", lambda: [convert_schema(*e) for e in batch]),
+        ("compiled", lambda: coerce.convert_many(batch)),
+    )
+    for name, fn in candidates:
+        timings[name] = min(timeit.repeat(fn, number=1, repeat=repeat))
+        print("{:>8}: {:.3f}s ({:.0f} entries/s)".format(
+            name, timings[name], entries / timings[name]))
+
+    print("Speedup (schema / compiled): {:.1f}x".format(
+        timings["schema"] / timings["compiled"]))
+
+
+if __name__ == "__main__":
+    args = make_argparser().parse_args()
+    main(args.entries, args.repeat)
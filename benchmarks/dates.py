@@ -0,0 +1,74 @@
+"""Benchmark date parsing against `strptime` and `pytz` per call.
+
+The baseline is the previous implementation of `coerce.convert_dt`,
+which resolved the timezone and called `strptime` for every value.
+Values are drawn from a pool of distinct times, as bookings share
+times. Run from the repository root:
+
+    python -m benchmarks.dates --values 30000 --distinct 2000
+"""
+
+from datetime import datetime, timedelta
+
+import argparse
+import pytz
+import random
+import timeit
+
+from bookinglog import dates
+
+
+def convert_dt_strptime(x):
+    pacific = pytz.timezone("US/Pacific")
+    dt = datetime.strptime(x, "%m/%d/%Y %I:%M %p")
+    return pacific.localize(dt)
+
+def convert_dt_uncached(x):
+    return dates.parse_datetime.__wrapped__(x)
+
+def make_values(n, distinct, seed=13):
+    rng = random.Random(seed)
+    start = datetime(2016, 1, 1)
+    pool = []
+    for _ in range(distinct):
+        dt = start + timedelta(minutes=rng.randrange(60 * 24 * 365))
+        pool.append("{}/{}/{} {}:{:02d} {}".format(
+            dt.month, dt.day, dt.year,
+            dt.hour % 12 or 12, dt.minute, "AM" if dt.hour < 12 else "PM"))
+    return [rng.choice(pool) for _ in range(n)]
+
+def make_argparser():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--values", type=int, default=30000)
+    parser.add_argument("--distinct", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser
+
+def main(n, distinct, repeat):
+    values = make_values(n, distinct)
+    for value in values[:100]:
+        assert dates.parse_datetime(value) == convert_dt_strptime(value)
+
+    def cached():
+        dates.parse_datetime.cache_clear()
+        return [dates.parse_datetime(x) for x in values]
+
+    candidates = (
+        ("strptime", lambda: [convert_dt_strptime(x) for x in values]),
+        ("parser", lambda: [convert_dt_uncached(x) for x in values]),
+        ("cached", cached),
+    )
+
+    timings = {}
+    for name, fn in candidates:
+        timings[name] = min(timeit.repeat(fn, number=1, repeat=repeat))
+        print("{:>8}: {:.3f}s ({:.0f} values/s)".format(
+            name, timings[name], n / timings[name]))
+
+    print("Speedup (strptime / cached): {:.1f}x".format(
+        timings["strptime"] / timings["cached"]))
+
+
+if __name__ == "__main__":
+    args = make_argparser().parse_args()
+    main(args.values, args.distinct, args.repeat)
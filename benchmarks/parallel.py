@@ -0,0 +1,48 @@
+"""Benchmark parsing and converting a page with worker processes.
+
+Times `pipeline.run_parallel` without a database, on a synthetic page
+built from the mock page used by the test suite. Run from the
+repository root:
+
+    python -m benchmarks.parallel --entries 4000 --workers 1 2 4
+"""
+
+from collections import Counter
+
+import argparse
+import time
+
+from benchmarks.parse import MOCK_PAGE, synthesize
+from bookinglog import pipeline
+
+
+def discard(chunk, cursor):
+    return Counter()
+
+def make_argparser():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=4000)
+    parser.add_argument("--parser", type=str, default="lxml")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    return parser
+
+def main(entries, parser, workers):
+    with open(MOCK_PAGE) as fh:
+        html = synthesize(fh.read(), entries)
+
+    baseline = None
+    for n in workers:
+        start = time.perf_counter()
+        counts = pipeline.run_parallel(
+            html, None, discard, parser=parser, workers=n)
+        elapsed = time.perf_counter() - start
+
+        if baseline is None:
+            baseline = elapsed
+        print("{:>2} workers: {:.3f}s ({:.0f} entries/s, {:.1f}x)".format(
+            n, elapsed, counts["converted"] / elapsed, baseline / elapsed))
+
+
+if __name__ == "__main__":
+    args = make_argparser().parse_args()
+    main(args.entries, args.parser, args.workers)
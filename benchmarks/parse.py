@@ -0,0 +1,60 @@
+"""Benchmark page parsing engines on a large synthetic page.
+
+The page is built by repeating the inmate sections of the mock page used
+by the test suite. Run from the repository root:
+
+    python -m benchmarks.parse --entries 2000
+"""
+
+import argparse
+import timeit
+
+from bookinglog import pull
+
+
+MOCK_PAGE = "tests/data/mock.html"
+
+def synthesize(html, n):
+    """Build a results page with (about) `n` inmate entries."""
+
+    # Each entry is wrapped in a bordered div, the last of which is
+    # followed by the closing tag of the results container.
+    marker = '<div style="border-top:solid;border-color:#000000">'
+    start = html.index(marker)
+    end = html.rindex("</div>", 0, html.index("</body>"))
+    per_copy = html.count(marker)
+
+    copies = max(1, n // per_copy)
+    return html[:start] + html[start:end] * copies + html[end:]
+
+def make_argparser():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser
+
+def main(entries, repeat):
+    with open(MOCK_PAGE) as fh:
+        html = synthesize(fh.read(), entries)
+
+    reference = pull.parse(html, engine="bs4")
+    print("Page: {} entries, {:.1f} MB".format(
+        len(reference), len(html) / 1e6))
+
+    timings = {}
+    for engine in pull.engines:
+        assert pull.parse(html, engine=engine) == reference
+        timings[engine] = min(timeit.repeat(
+            lambda: pull.parse(html, engine=engine),
+            number=1,
+            repeat=repeat
+        ))
+        print("{:>6}: {:.3f}s".format(engine, timings[engine]))
+
+    print("Speedup (bs4 / lxml): {:.1f}x".format(
+        timings["bs4"] / timings["lxml"]))
+
+
+if __name__ == "__main__":
+    args = make_argparser().parse_args()
+    main(args.entries, args.repeat)
@@ -0,0 +1,74 @@
+"""Benchmark the per-row ingest statements, prepared or sent as text.
+
+Writes copies of the mock page's entries, each under a new jail ID, a
+row at a time, as `scrape.ingest` does, and rolls back. Needs the
+database given by the POSTGRES_* environment variables. Run from the
+repository root:
+
+    python -m benchmarks.prepared --entries 2000
+"""
+
+from collections import OrderedDict
+
+import argparse
+import json
+import psycopg2
+import time
+
+from benchmarks.parse import MOCK_PAGE
+from bookinglog import config
+from bookinglog import db
+from bookinglog import pipeline
+
+
+def make_records(entries):
+    with open(MOCK_PAGE) as fh:
+        converted = pipeline.convert_fragments("bs4", [fh.read()])[0]
+
+    records = []
+    for i in range(entries):
+        inmate, charges = converted[i % len(converted)]
+        record = dict(inmate, jail_id="BENCH{:04d}".format(i))
+        record["content_hash"] = None
+        record["recorded"] = json.dumps(charges)
+        records.append(record)
+    return records
+
+def execute_text(cursor, name, params):
+    cursor.execute(db.statements[name], params)
+
+def write(records, cursor, execute):
+    for record in records:
+        execute(cursor, "insert_entry", record)
+        record["booking_id"] = cursor.fetchone()[0]
+        execute(cursor, "insert_arrest", record)
+        execute(cursor, "insert_inmate", record)
+        execute(cursor, "insert_charge", record)
+
+def make_argparser():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser
+
+def main(entries, repeat):
+    records = make_records(entries)
+    modes = OrderedDict([("text", execute_text), ("prepared", db.execute)])
+
+    with psycopg2.connect(**config.pg_kwargs) as conn:
+        cursor = conn.cursor()
+        for mode, execute in modes.items():
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                write(records, cursor, execute)
+                best = min(best, time.perf_counter() - start)
+                conn.rollback()
+            print("{:>8}: {:.3f}s ({:.0f} entries/s)".format(
+                mode, best, entries / best))
+    conn.close()
+
+
+if __name__ == "__main__":
+    args = make_argparser().parse_args()
+    main(args.entries, args.repeat)
@@ -0,0 +1,35 @@
+"""Run a bookinglog command:
+
+    python -m bookinglog [scrape] ...
+    python -m bookinglog daemon ...
+    python -m bookinglog crawl ...
+    python -m bookinglog replay ...
+
+Each runs its module, as `python -m bookinglog.<command>`, with the rest
+of the arguments. Without a command, searches are scraped.
+"""
+
+import runpy
+import sys
+
+
+commands = ("scrape", "daemon", "crawl", "replay")
+
+
+def main(argv=None):
+    """Run the command named by the first argument of `argv`, by default
+    `sys.argv`.
+    """
+
+    argv = list(sys.argv if argv is None else argv)
+    if len(argv) > 1 and argv[1] in commands:
+        command = argv.pop(1)
+    else:
+        command = "scrape"
+
+    sys.argv = ["bookinglog " + command] + argv[1:]
+    runpy.run_module("bookinglog." + command, run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""Scrape and ingest searches concurrently with asyncio.
+
+An alternative engine for `scrape.main`. Pages are fetched concurrently,
+up to a limit, and each is split into per-inmate fragments which are
+parsed and converted in chunks in an executor as soon as it arrives,
+so that the process isn't idle while waiting on the network. Entries
+are written by the same ingest functions as the synchronous engine, on
+a dedicated database thread, with each page written and its search
+recorded in its own transaction.
+
+A job is a label, recorded as the search in `scrape_coverage`, and a
+function which fetches a page given an HTTP session, optionally with a
+function to ingest the page's entries with. Searches are jobs, see
+`search_jobs`, and other requests can be run as jobs alongside them.
+"""
+
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from . import config
+from . import db
+from . import pipeline
+from . import pull
+from . import rollups
+from . import scrape
+
+import asyncio
+import logging
+
+
+# Number of pages to fetch at a time.
+CONCURRENCY = 4
+
+
+def search_jobs(search_types):
+    """Make a job for each search."""
+
+    return [
+        (search_type, partial(pull.scrape, search_type, **config.http_kwargs))
+        for search_type in search_types
+    ]
+
+def write_chunk(conn, entries, counts, ingest_fn=scrape.ingest,
+                chunk_size=500):
+    """Ingest a chunk of a page's converted entries, in the page's
+    transaction.
+    """
+
+    pipeline.write(entries, conn.cursor(), ingest_fn, chunk_size, counts)
+
+def commit_page(conn, search_type, on_commit=None):
+    """Record the search and commit the page's transaction, calling
+    `on_commit` if given.
+    """
+
+    rollups.record_coverage(search_type, conn.cursor())
+    conn.commit()
+    if on_commit is not None:
+        on_commit()
+
+def rollback_page(conn, on_rollback=None):
+    """Roll back the page's transaction, calling `on_rollback` if given."""
+
+    conn.rollback()
+    if on_rollback is not None:
+        on_rollback()
+
+async def fetch(loop, executor, sessions, fetch_fn):
+    """Fetch a page with a free session, waiting for one if need be."""
+
+    session = await sessions.get()
+    try:
+        return await loop.run_in_executor(
+            executor, partial(fetch_fn, session=session))
+    finally:
+        sessions.put_nowait(session)
+
+async def write_page(html, label, loop, executors, db_lock, conn,
+                     ingest_fn=scrape.ingest, parser=pull.DEFAULT_ENGINE,
+                     chunk_size=500, window=2, on_commit=None,
+                     on_rollback=None):
+    """Parse, convert and ingest a page in a single transaction.
+
+    As `pipeline.run_parallel`, the page is split into per-inmate
+    fragments, which are parsed and converted in chunks in the parse
+    executor and ingested in page order, with at most `window` chunks
+    in flight. The first chunks are converted while waiting for the
+    database, which is held by one page at a time.
+
+    Returns
+    -------
+    counts : collections.Counter
+        See `pipeline.run`.
+    """
+
+    fetch_executor, parse_executor, db_executor = executors
+    fragments = await loop.run_in_executor(
+        fetch_executor, partial(pull.split, html))
+    tasks = pipeline.chunked(fragments, pipeline.FRAGMENTS_PER_TASK)
+    convert = partial(pipeline.convert_fragments, parser)
+
+    pending = deque()
+
+    def submit():
+        task = next(tasks, None)
+        if task is not None:
+            pending.append(loop.run_in_executor(parse_executor, convert, task))
+
+    for _ in range(window):
+        submit()
+
+    counts = Counter()
+    async with db_lock:
+        try:
+            while pending:
+                entries, task_counts = await pending.popleft()
+                submit()
+                counts.update(task_counts)
+                await loop.run_in_executor(
+                    db_executor,
+                    partial(write_chunk, conn, entries, counts, ingest_fn,
+                            chunk_size))
+            await loop.run_in_executor(
+                db_executor, partial(commit_page, conn, label, on_commit))
+        except Exception:
+            for future in pending:
+                future.cancel()
+            await loop.run_in_executor(
+                db_executor, partial(rollback_page, conn, on_rollback))
+            raise
+
+    return counts
+
+async def run_job(label, fetch_fn, loop, executors, sessions, db_lock, conn,
+                  ingest_fn=scrape.ingest, parser=pull.DEFAULT_ENGINE,
+                  chunk_size=500, archive_dir=None, window=2, on_commit=None,
+                  on_rollback=None):
+    """Fetch, parse and ingest a page.
+
+    Returns
+    -------
+    status : int
+        Zero on success, see `scrape.page_status`.
+    """
+
+    fetch_executor = executors[0]
+    logging.info("Running with search argument: %s", label)
+
+    try:
+        html = await fetch(loop, fetch_executor, sessions, fetch_fn)
+    except Exception as e:
+        logging.critical("Failed scraping %s with %s", label, e)
+        return 1
+
+    if archive_dir is not None:
+        await loop.run_in_executor(
+            fetch_executor,
+            partial(scrape.archive_page, archive_dir, html, label))
+
+    try:
+        counts = await write_page(
+            html, label, loop, executors, db_lock, conn, ingest_fn, parser,
+            chunk_size, window, on_commit, on_rollback)
+    except Exception as e:
+        logging.critical("Failed ingest of %s with %s", label, e)
+        return 1
+
+    scrape.log_counts(counts)
+    return scrape.page_status(counts)
+
+async def run_jobs(jobs, conn, ingest_fn=scrape.ingest,
+                   parser=pull.DEFAULT_ENGINE, chunk_size=500,
+                   archive_dir=None, workers=1,
+                   concurrency=CONCURRENCY, on_commit=None, on_rollback=None,
+                   loop=None):
+    """Run jobs concurrently.
+
+    Parameters
+    ----------
+    jobs : iterable of tuples of (str, callable[, callable])
+        Label and fetch function of each job, and optionally an ingest
+        function to use for its page rather than `ingest_fn`.
+    conn : database connection
+        Only used from the database thread.
+    workers : int
+        Number of processes to parse pages with. Pages are parsed on a
+        thread if 1. At most `2 * workers` chunks of a page are parsed
+        at a time.
+    concurrency : int
+        Number of pages to fetch at a time.
+    on_commit, on_rollback : callable, optional
+        Called from the database thread after each page's transaction
+        is committed or rolled back.
+
+    Returns
+    -------
+    status : int
+        Zero if every job succeeded.
+    """
+
+    if loop is None:
+        loop = asyncio.get_event_loop()
+
+    if workers > 1:
+        parse_executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        parse_executor = ThreadPoolExecutor(max_workers=1)
+    fetch_executor = ThreadPoolExecutor(max_workers=concurrency)
+    db_executor = ThreadPoolExecutor(max_workers=1)
+    executors = (fetch_executor, parse_executor, db_executor)
+
+    sessions = asyncio.Queue()
+    for _ in range(concurrency):
+        sessions.put_nowait(pull.make_session())
+    # Pages are written one at a time, each in its own transaction.
+    db_lock = asyncio.Lock()
+    window = 2 * max(workers, 1)
+
+    def start(label, fetch_fn, job_ingest_fn=ingest_fn):
+        return run_job(
+            label, fetch_fn, loop, executors, sessions, db_lock, conn,
+            job_ingest_fn, parser, chunk_size, archive_dir, window,
+            on_commit, on_rollback)
+
+    try:
+        statuses = await asyncio.gather(*(start(*job) for job in jobs))
+    finally:
+        for executor in executors:
+            executor.shutdown()
+        while not sessions.empty():
+            sessions.get_nowait().close()
+
+    status = 0
+    for job_status in statuses:
+        status |= job_status
+    return status
+
+def run(jobs, conn, **kwargs):
+    """Run jobs concurrently on a new event loop, see `run_jobs`."""
+
+    # Queues and locks find their loop as the current event loop on
+    # older versions of Python.
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(
+            run_jobs(jobs, conn, loop=loop, **kwargs))
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+def main(*search_types, ingest_mode="row", parser=pull.DEFAULT_ENGINE,
+         chunk_size=500, archive_dir=None, workers=1,
+         concurrency=CONCURRENCY):
+    """Run searches concurrently, over the same database connection.
+
+    See `scrape.main`.
+    """
+
+    with db.connection() as conn:
+        return run(
+            search_jobs(search_types),
+            conn,
+            ingest_fn=scrape.ingest_modes[ingest_mode],
+            parser=parser,
+            chunk_size=chunk_size,
+            archive_dir=archive_dir,
+            workers=workers,
+            concurrency=concurrency
+        )
@@ -0,0 +1,133 @@
+"""Archive of fetched Booking Log pages.
+
+Pages are stored gzip compressed under the SHA-256 digest of their
+content, so a page which is identical to an earlier fetch is only stored
+once. Every fetch is recorded in an index, in the order it was made:
+
+    <root>/index.jsonl
+    <root>/objects/<digest[:2]>/<digest>.html.gz
+"""
+
+from datetime import datetime
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+
+INDEX_FILENAME = "index.jsonl"
+OBJECTS_DIRNAME = "objects"
+# Bytes of the index to read at a time, from its end.
+BLOCK_SIZE = 8192
+
+
+def object_path(root, digest):
+    return os.path.join(
+        root, OBJECTS_DIRNAME, digest[:2], digest + ".html.gz")
+
+def store(root, content, search_type, fetched_at=None):
+    """Add a fetched page to the archive.
+
+    Parameters
+    ----------
+    root : str
+        Archive directory, created if it doesn't exist.
+    content : bytes
+        Page source, as returned by `pull.scrape`.
+    search_type : str
+        Search which returned the page.
+    fetched_at : datetime, optional
+        When the page was fetched, in UTC. Defaults to now.
+
+    Returns
+    -------
+    record : dict
+        The index record of the fetch, with the page's "digest" and
+        whether the page was a "duplicate" of the previous fetch of the
+        same search.
+    """
+
+    if fetched_at is None:
+        fetched_at = datetime.utcnow()
+
+    digest = hashlib.sha256(content).hexdigest()
+    path = object_path(root, digest)
+
+    if not os.path.exists(path):
+        dirname = os.path.dirname(path)
+        os.makedirs(dirname, exist_ok=True)
+        # Write to a temporary file first so that a partially written
+        # page is never visible under its digest.
+        fd, tmp_path = tempfile.mkstemp(dir=dirname)
+        with os.fdopen(fd, "wb") as fh:
+            with gzip.GzipFile(fileobj=fh, mode="wb", mtime=0) as gz:
+                gz.write(content)
+        os.replace(tmp_path, path)
+
+    previous = last(root, search_type)
+    record = {
+        "fetched_at": fetched_at.isoformat(),
+        "search": search_type,
+        "digest": digest,
+        "size": len(content),
+        "duplicate": previous is not None and previous["digest"] == digest,
+    }
+    with open(os.path.join(root, INDEX_FILENAME), "a") as fh:
+        fh.write(json.dumps(record, sort_keys=True) + "\n")
+
+    return record
+
+def load(root, digest):
+    """Read an archived page's source."""
+
+    with gzip.open(object_path(root, digest), "rb") as fh:
+        return fh.read()
+
+def index(root):
+    """Iterate over the archive's index records, oldest first."""
+
+    path = os.path.join(root, INDEX_FILENAME)
+    if not os.path.exists(path):
+        return
+
+    with open(path) as fh:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+
+def reverse_index(root, block_size=BLOCK_SIZE):
+    """Iterate over the archive's index records, newest first.
+
+    The index is read in blocks from its end, so recent records are
+    found without reading the whole index.
+    """
+
+    path = os.path.join(root, INDEX_FILENAME)
+    if not os.path.exists(path):
+        return
+
+    with open(path, "rb") as fh:
+        position = fh.seek(0, os.SEEK_END)
+        # Start of the last line read, which may be incomplete.
+        rest = b""
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            fh.seek(position)
+            lines = (fh.read(size) + rest).split(b"\n")
+            rest = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield json.loads(line.decode("utf-8"))
+        if rest.strip():
+            yield json.loads(rest.decode("utf-8"))
+
+def last(root, search_type):
+    """Get the index record of the most recent fetch of a search."""
+
+    for record in reverse_index(root):
+        if record["search"] == search_type:
+            return record
+    return None
@@ -0,0 +1,117 @@
+"""Bulk load booking log entries with COPY.
+
+Entries are copied into a temporary staging table and then merged into
+the booking, arrests, inmates and charges tables with set-based upserts.
+This is much faster than inserting entries one statement at a time, so
+is suited to large backfills.
+"""
+
+from collections import Counter
+from datetime import date
+from tempfile import SpooledTemporaryFile
+
+from . import changes
+from . import queries
+from . import rollups
+
+import json
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Size of staged data to hold in memory before spilling to disk, bytes.
+SPOOL_SIZE = 16 * 2 ** 20
+
+
+def copy_value(value):
+    """Format a value for COPY's text format."""
+
+    if value is None:
+        return "\\N"
+    if isinstance(value, date):
+        return value.isoformat()
+
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+def write_staged(entries, fh):
+    """Write entries as COPY text format rows of the staging table."""
+
+    keys = [key for _, key in queries.staging_columns]
+    n = 0
+    for inmate, charges in entries:
+        record = {
+            **inmate,
+            "content_hash": changes.content_hash(inmate, charges),
+            "recorded": json.dumps(charges),
+        }
+        fh.write("\t".join(copy_value(record[key]) for key in keys))
+        fh.write("\n")
+        n += 1
+    return n
+
+def load(entries, cursor):
+    """Add booking log entries to database using COPY.
+
+    A drop-in replacement for `scrape.ingest`, which should be run
+    inside a transaction.
+
+    Parameters
+    ----------
+    entries : iterable of dicts
+        Iterable of booking log entries to input.
+    cursor : database cursor
+
+    Returns
+    -------
+    counts : collections.Counter
+        Number of distinct bookings "inserted", "updated" and
+        "unchanged".
+    """
+
+    start = time.perf_counter()
+    entries = list(entries)
+    cursor.execute(queries.create_staging)
+
+    with SpooledTemporaryFile(max_size=SPOOL_SIZE, mode="w+") as fh:
+        n = write_staged(entries, fh)
+        fh.seek(0)
+        cursor.copy_expert(queries.copy_staging, fh)
+
+    if not n:
+        return Counter()
+
+    cursor.execute(queries.dedupe_staging)
+    cursor.execute(queries.delete_unchanged_staging)
+    unchanged = cursor.rowcount
+    cursor.execute(queries.count_staging)
+    inserted, changed = cursor.fetchone()
+
+    previous = rollups.stored_booking_dates(entries, cursor)
+    cursor.execute(queries.merge_entries)
+    booking_ids = [row[0] for row in cursor.fetchall()]
+    for query in (queries.merge_arrests, queries.merge_inmates,
+                  queries.merge_charges):
+        cursor.execute(query)
+    cursor.execute(
+        queries.refresh_charge_items, {"booking_ids": booking_ids})
+    rollups.refresh_arrivals(entries, cursor, previous)
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "Bulk loaded %s entries in %.2fs (%.0f rows/s)",
+        n, elapsed, n / elapsed)
+
+    counts = Counter(
+        inserted=inserted,
+        updated=changed - inserted,
+        unchanged=unchanged
+    )
+    return +counts
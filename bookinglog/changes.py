@@ -0,0 +1,78 @@
+"""Detect booking log entries which have changed since last ingested."""
+
+from collections import Counter
+from datetime import date
+
+from . import queries
+
+import hashlib
+import json
+
+
+def serialize(obj):
+    if isinstance(obj, date):
+        return obj.isoformat()
+    raise TypeError("{!r} is not JSON serializable".format(obj))
+
+def content_hash(inmate, charges):
+    """Hash a converted entry.
+
+    Returns
+    -------
+    digest : str
+        Hex digest, which only changes if the entry does.
+    """
+
+    content = json.dumps(
+        [inmate, charges],
+        sort_keys=True,
+        default=serialize
+    )
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+def detect(entries, cursor):
+    """Select entries which are new or differ from the stored version.
+
+    The stored hashes of all entries are fetched in a single query.
+
+    Parameters
+    ----------
+    entries : list of tuples of (dict, list of dicts)
+        Converted booking log entries.
+    cursor : database cursor
+
+    Returns
+    -------
+    changed : list of tuples of (dict, list of dicts)
+        Entries to write, with the entry's hash added to the inmate
+        record under "content_hash".
+    counts : collections.Counter
+        Number of entries to be "inserted" and "updated", and which are
+        "unchanged".
+    """
+
+    if not entries:
+        return [], Counter()
+
+    jail_ids = list({inmate["jail_id"] for inmate, _ in entries})
+    cursor.execute(queries.select_hashes, {"jail_ids": jail_ids})
+    known = dict(cursor.fetchall())
+
+    changed = []
+    counts = Counter()
+    for inmate, charges in entries:
+        jail_id = inmate["jail_id"]
+        digest = content_hash(inmate, charges)
+
+        if jail_id not in known:
+            counts["inserted"] += 1
+        elif known[jail_id] != digest:
+            counts["updated"] += 1
+        else:
+            counts["unchanged"] += 1
+            continue
+
+        known[jail_id] = digest
+        changed.append(({**inmate, "content_hash": digest}, charges))
+
+    return changed, counts
@@ -1,11 +1,10 @@
 """Cast text to native data types."""
 
-from datetime import datetime
-from functools import partial
-from schema import And, Schema, Use
+from schema import SchemaError
+
+from . import dates
 
 import logging
-import pytz
 
 
 logger = logging.getLogger(__name__)
@@ -56,58 +55,136 @@ def parse_height(x):
 
 @catch(ValueError)
 def convert_dob(x):
-    dob = datetime.strptime(x, "%m/%d/%Y")
-    return dob
+    return dates.parse_date(x)
 
 @catch(ValueError)
 def convert_dt(x):
-    # Assume that the time displayed by the website is fixed (California).
-    pacific = pytz.timezone("US/Pacific")
-
-    # NB: %p depends on locale being en_US.
-    dt = datetime.strptime(x, "%m/%d/%Y %I:%M %p")
-    # TODO: determine daylight savings
-    localized = pacific.localize(dt)
-    return localized
+    return dates.parse_datetime(x)
 
 def len_eq(x, n):
     return len(x) == n
 
-len_eq1 = partial(len_eq, n=1)
-len_eq3 = partial(len_eq, n=3)
-
-inmate_schema = Schema({
-    "address": str,
-    "arrest_agency": str,
-    "arrest_date": Use(convert_dt),
-    "arrest_location": str,
-    "date_of_birth": Use(convert_dob),
-    "eye_color": And(str, len_eq3),
-    "hair_color": And(str, len_eq3),
-    "height": Use(parse_height),
-    "jail_id": str,
-    "latest_charge_date": Use(convert_dt),
-    "name": str,
-    "occupation": str,
-    "orig_booking_date": Use(convert_dt),
-    "race": And(str, len_eq1),
-    "sex": And(str, len_eq1),
-    "weight": Use(int)
-}, ignore_extra_keys=True)
-
-charge_schema = Schema([{
-    "bail": Use(parse_bail),
-    "charge": str,
-    "charge_authority": str,
-    "description": str,
-    "level": And(str, len_eq1)
-}], ignore_extra_keys=True)
+# Field converters. Each takes the scraped text for a field and returns
+# its native value, raising an exception if the value is invalid.
+def text(x):
+    if not isinstance(x, str):
+        raise TypeError("{!r} should be instance of 'str'".format(x))
+    return x
+
+def code(n):
+    """Make a converter for fixed-length text codes."""
+
+    def convert_code(x):
+        if not len_eq(text(x), n):
+            raise ValueError("{!r} should have length {}".format(x, n))
+        return x
+    return convert_code
+
+inmate_fields = {
+    "address": text,
+    "arrest_agency": text,
+    "arrest_date": convert_dt,
+    "arrest_location": text,
+    "date_of_birth": convert_dob,
+    "eye_color": code(3),
+    "hair_color": code(3),
+    "height": parse_height,
+    "jail_id": text,
+    "latest_charge_date": convert_dt,
+    "name": text,
+    "occupation": text,
+    "orig_booking_date": convert_dt,
+    "race": code(1),
+    "sex": code(1),
+    "weight": int,
+}
+
+charge_fields = {
+    "bail": parse_bail,
+    "charge": text,
+    "charge_authority": text,
+    "description": text,
+    "level": code(1),
+}
+
+
+def compile_fields(fields):
+    """Compile a table of field converters into a record converter.
+
+    The returned function standardizes the keys of a scraped record,
+    drops keys which aren't in `fields` and converts the values of the
+    rest. Raw keys are standardized once and remembered, so converting
+    a record is a lookup and a function call per field.
+
+    Parameters
+    ----------
+    fields : dict
+        Map of standardized key to converter.
+
+    Returns
+    -------
+    convert_record : callable
+        Converts a record, raising `schema.SchemaError` if the record
+        is missing a field or a value fails to convert.
+    """
+
+    converters = tuple(fields.items())
+    keywords = {}
+
+    def lookup(key):
+        try:
+            return keywords[key]
+        except KeyError:
+            keyword = keywordize(key)
+            keywords[key] = keyword if keyword in fields else None
+            return keywords[key]
+
+    def convert_record(record):
+        if not isinstance(record, dict):
+            raise SchemaError(
+                "{!r} should be instance of 'dict'".format(record))
+
+        values = {}
+        for key, value in record.items():
+            keyword = lookup(key)
+            if keyword is not None:
+                values[keyword] = value
+
+        if len(values) != len(converters):
+            missing = sorted(k for k in fields if k not in values)
+            raise SchemaError("Missing keys: {}".format(
+                ", ".join(map(repr, missing))))
+
+        converted = {}
+        for keyword, fn in converters:
+            try:
+                converted[keyword] = fn(values[keyword])
+            except Exception as e:
+                raise SchemaError(
+                    "Key {!r} error:\n{!r}".format(keyword, e))
+        return converted
+
+    return convert_record
 
+convert_inmate = compile_fields(inmate_fields)
+convert_charge = compile_fields(charge_fields)
 
-def convert(inmate, charges):
-    """Convert data to native objects."""
+def convert_charges(charges):
+    if not isinstance(charges, list):
+        raise SchemaError(
+            "{!r} should be instance of 'list'".format(charges))
+    return [convert_charge(charge) for charge in charges]
 
-    # Standardize keys and coervert/validate data.
-    inmate = inmate_schema.validate(standardize_keys(inmate))
-    charges = charge_schema.validate(list(map(standardize_keys, charges)))
-    return inmate, charges
+def convert(inmate, charges):
+    """Convert data to native objects.
+
+    Raises
+    ------
+    schema.SchemaError
+        If any of the data is missing or invalid.
+    """
+    return convert_inmate(inmate), convert_charges(charges)
+
+def convert_many(entries):
+    """Convert a batch of `(inmate, charges)` entries."""
+    return [convert(inmate, charges) for inmate, charges in entries]
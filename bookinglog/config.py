@@ -11,6 +11,21 @@ pg_kwargs = {
     "password": os.environ.get("POSTGRES_PASSWORD"),
 }
 
+http_kwargs = {
+    "timeout": (
+        float(os.environ.get("BOOKINGLOG_CONNECT_TIMEOUT", 10)),
+        float(os.environ.get("BOOKINGLOG_READ_TIMEOUT", 60)),
+    ),
+    "retries": int(os.environ.get("BOOKINGLOG_RETRIES", 3)),
+    "backoff": float(os.environ.get("BOOKINGLOG_BACKOFF", 1)),
+}
+
+# Directory to archive fetched pages in, see `bookinglog.archive`.
+archive_dir = os.environ.get("BOOKINGLOG_ARCHIVE")
+
+# Prometheus text file to write metrics to, see `bookinglog.metrics`.
+metrics_file = os.environ.get("BOOKINGLOG_METRICS_FILE")
+
 logging_cfg = {
     "stream": sys.stdout,
     "level": logging.INFO,
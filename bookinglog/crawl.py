@@ -0,0 +1,415 @@
+"""Refresh specific inmates with last-name searches.
+
+Rather than downloading the full custody page, search for each of a
+list of last names, or for the last names of known jail IDs, and ingest
+the results with the same parse, conversion and ingest path as
+`bookinglog.scrape`. Searches are run concurrently with the async engine
+(see `bookinglog.aio`), with at most `--concurrency` in flight and no
+more than `--rate` started per second.
+
+Pages which aren't results of the search they were fetched for, e.g.
+because the search wasn't recognized, fail rather than being ingested:
+each inmate is checked as the page is ingested, and the page's
+transaction is rolled back if any doesn't match.
+Inmates who turn up in several searches, e.g. under a shared last name,
+are only ingested once per crawl. The latency of each request and the
+throughput of the crawl are logged when it finishes.
+"""
+
+from collections import Counter
+from functools import partial
+
+from . import aio
+from . import config
+from . import db
+from . import metrics
+from . import pull
+from . import queries
+from . import scrape
+
+import logging
+import math
+import sys
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Most searches to start per second.
+RATE = 2.
+CONCURRENCY = 4
+
+
+class RateLimiter(object):
+    """Space out calls to at most `rate` per second, across threads."""
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1. / rate if rate else 0.
+        self.clock = clock
+        self.sleep = sleep
+        self.next_at = None
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Block until the next call may be made."""
+
+        with self.lock:
+            now = self.clock()
+            start = now if self.next_at is None else max(now, self.next_at)
+            self.next_at = start + self.interval
+        if start > now:
+            self.sleep(start - now)
+
+def normalize_names(names):
+    """Upper case and deduplicate last names, keeping their order."""
+
+    seen = set()
+    normalized = []
+    for name in names:
+        name = name.strip().upper()
+        if name and name not in seen:
+            seen.add(name)
+            normalized.append(name)
+    return normalized
+
+def jail_id_names(jail_ids, cursor):
+    """Look up the last names of inmates by jail ID.
+
+    Names are recorded as "LAST, FIRST MIDDLE".
+    """
+
+    cursor.execute(queries.select_last_names, {"jail_ids": list(jail_ids)})
+    return sorted(name for name, in cursor.fetchall() if name)
+
+def check_names(entries, last_name):
+    """Check that converted entries are results of a search for a last
+    name.
+
+    The search form's fields aren't published, so if the server doesn't
+    recognize them it may answer with another page, e.g. the latest
+    bookings, which mustn't be ingested as the name's results. Every
+    inmate on a results page has a name starting with the last name
+    searched for.
+
+    Raises
+    ------
+    ValueError
+        If an entry doesn't match the search.
+    """
+
+    for inmate, _ in entries:
+        name = inmate["name"] or ""
+        if not name.upper().startswith(last_name):
+            raise ValueError(
+                "{!r} doesn't match a search for {!r}, the search may not "
+                "have been recognized".format(name, last_name))
+
+def searcher(last_name, limiter, latencies):
+    """Make a function which searches for a last name, as a job's fetch
+    function.
+
+    Searches are rate limited and timed: the latency of each request,
+    including any retries, is appended to `latencies` along with the
+    number of bytes received.
+    """
+
+    def fetch(**kwargs):
+        limiter.wait()
+        start = time.perf_counter()
+        html = pull.scrape(
+            pull.last_name_search, last_name=last_name, **kwargs)
+        latencies.append((time.perf_counter() - start, len(html)))
+        return html
+
+    return fetch
+
+def name_jobs(names, limiter, latencies, ingest_fn):
+    """Make a job, as `aio.search_jobs`, for each last name.
+
+    Each is recorded as a "last-name" search, and its page is ingested
+    with `ingest_fn` given the `last_name`, e.g. `Deduper.ingest`.
+    """
+
+    return [
+        (
+            pull.last_name_search,
+            partial(
+                searcher(name, limiter, latencies),
+                **config.http_kwargs
+            ),
+            partial(ingest_fn, last_name=name)
+        )
+        for name in names
+    ]
+
+class Deduper(object):
+    """Skip inmates who were already ingested during a crawl.
+
+    Wraps an ingest function, skipping entries whose jail ID has been
+    ingested by an earlier page. The jail IDs and counts of a page are
+    held until its transaction is committed, so that the inmates of a
+    page which is rolled back are still ingested by later searches.
+
+    Parameters
+    ----------
+    ingest_fn : callable
+        Ingest function, e.g. `scrape.ingest`.
+
+    Attributes
+    ----------
+    seen : set
+        Jail IDs of committed entries.
+    counts : collections.Counter
+        Number of "duplicate" entries skipped, entries "ingested" and
+        the counts returned by `ingest_fn`, of committed pages.
+    """
+
+    def __init__(self, ingest_fn):
+        self.ingest_fn = ingest_fn
+        self.seen = set()
+        self.counts = Counter()
+        self.pending = set()
+        self.pending_counts = Counter()
+
+    def ingest(self, entries, cursor, last_name=None):
+        """Ingest entries, as `ingest_fn`, from the database thread.
+
+        If the entries are the results of a search for `last_name`, they
+        are checked with `check_names` first.
+        """
+
+        if last_name is not None:
+            check_names(entries, last_name)
+
+        new = []
+        for entry in entries:
+            jail_id = entry[0]["jail_id"]
+            if jail_id not in self.seen and jail_id not in self.pending:
+                self.pending.add(jail_id)
+                new.append(entry)
+
+        ingested = Counter(self.ingest_fn(new, cursor)) if new else Counter()
+        ingested["duplicate"] = len(entries) - len(new)
+        self.pending_counts.update(ingested)
+        self.pending_counts["ingested"] += len(new)
+        return ingested
+
+    def commit(self):
+        self.seen.update(self.pending)
+        self.counts.update(self.pending_counts)
+        self.rollback()
+
+    def rollback(self):
+        self.pending = set()
+        self.pending_counts = Counter()
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty sequence of values."""
+
+    ordered = sorted(values)
+    rank = max(1, int(math.ceil(q / 100. * len(ordered))))
+    return ordered[rank - 1]
+
+def summarize(latencies, elapsed, counts):
+    """Summarize the latency of requests and the throughput of a crawl.
+
+    Parameters
+    ----------
+    latencies : list of tuples of (float, int)
+        Seconds taken and bytes received by each successful request.
+    elapsed : float
+        Seconds taken by the crawl.
+    counts : collections.Counter
+        Counts of ingested entries, see `Deduper`.
+
+    Returns
+    -------
+    report : dict
+    """
+
+    seconds = [latency for latency, _ in latencies]
+    report = {
+        "requests": len(latencies),
+        "bytes": sum(n_bytes for _, n_bytes in latencies),
+        "elapsed": elapsed,
+        "requests_per_second": len(latencies) / elapsed if elapsed else 0.,
+        "entries_per_second": counts["ingested"] / elapsed if elapsed else 0.,
+        "ingested": counts["ingested"],
+        "duplicate": counts["duplicate"],
+        "inserted": counts["inserted"],
+        "updated": counts["updated"],
+        "unchanged": counts["unchanged"],
+    }
+    if seconds:
+        report.update({
+            "latency_mean": sum(seconds) / len(seconds),
+            "latency_p50": percentile(seconds, 50),
+            "latency_p95": percentile(seconds, 95),
+            "latency_max": max(seconds),
+        })
+    return report
+
+def log_report(report):
+    logger.info(
+        "Crawled %s pages (%s bytes) in %.1fs: %.2f requests/s, "
+        "%.1f entries/s",
+        report["requests"], report["bytes"], report["elapsed"],
+        report["requests_per_second"], report["entries_per_second"])
+    if report["requests"]:
+        logger.info(
+            "Request latency: mean %.3fs, p50 %.3fs, p95 %.3fs, max %.3fs",
+            report["latency_mean"], report["latency_p50"],
+            report["latency_p95"], report["latency_max"])
+    logger.info(
+        "Ingested %s inmates (%s duplicates skipped): %s inserted, "
+        "%s updated, %s unchanged",
+        report["ingested"], report["duplicate"], report["inserted"],
+        report["updated"], report["unchanged"])
+
+def crawl(names, conn, ingest_fn=scrape.ingest, parser=pull.DEFAULT_ENGINE,
+          chunk_size=500, archive_dir=None, workers=1,
+          concurrency=CONCURRENCY, rate=RATE):
+    """Search for each last name and ingest the results.
+
+    Parameters
+    ----------
+    names : iterable of str
+        Last names to search for.
+    conn : database connection
+    concurrency : int
+        Most searches to have in flight at a time.
+    rate : float
+        Most searches to start per second, or 0 for no limit.
+
+    See `aio.run_jobs` for the rest.
+
+    Returns
+    -------
+    status : int
+        Zero if every search succeeded.
+    report : dict
+        See `summarize`.
+    """
+
+    deduper = Deduper(ingest_fn)
+    latencies = []
+    jobs = name_jobs(
+        normalize_names(names), RateLimiter(rate), latencies, deduper.ingest)
+
+    start = time.perf_counter()
+    status = aio.run(
+        jobs,
+        conn,
+        ingest_fn=deduper.ingest,
+        parser=parser,
+        chunk_size=chunk_size,
+        archive_dir=archive_dir,
+        workers=workers,
+        concurrency=concurrency,
+        on_commit=deduper.commit,
+        on_rollback=deduper.rollback
+    )
+    report = summarize(latencies, time.perf_counter() - start, deduper.counts)
+    log_report(report)
+    return status, report
+
+def read_names(filename):
+    """Read names or jail IDs from a file, one per line."""
+
+    with open(filename, "r") as fh:
+        return [line.strip() for line in fh if line.strip()]
+
+def make_argparser():
+    parser = scrape.make_argparser(engines=False, searches=False)
+    parser.prog = "bookinglog crawl"
+    parser.description = __doc__
+    parser.add_argument(
+        "-n", "--names",
+        help="Last names to search for",
+        type=str,
+        nargs="+",
+        required=False,
+        default=[]
+    )
+    parser.add_argument(
+        "-j", "--jail-ids",
+        help="Jail IDs of known inmates, to search for by last name",
+        type=str,
+        nargs="+",
+        required=False,
+        default=[]
+    )
+    parser.add_argument(
+        "-f", "--names-file",
+        help="File of last names to search for, one per line",
+        type=str,
+        required=False
+    )
+    parser.add_argument(
+        "--concurrency",
+        help="Most searches to have in flight at a time",
+        type=int,
+        required=False,
+        default=CONCURRENCY
+    )
+    parser.add_argument(
+        "--rate",
+        help="Most searches to start per second, 0 for no limit",
+        type=float,
+        required=False,
+        default=RATE
+    )
+    return parser
+
+def main(names=(), jail_ids=(), ingest_mode="row", parser=pull.DEFAULT_ENGINE,
+         chunk_size=500, archive_dir=None, workers=1,
+         concurrency=CONCURRENCY, rate=RATE, metrics_file=None):
+    """Search for last names, and those of known jail IDs.
+
+    Returns
+    -------
+    status : int
+        Zero if every search succeeded.
+    """
+
+    with db.connection() as conn:
+        names = list(names)
+        if jail_ids:
+            with conn.cursor() as cursor:
+                names.extend(jail_id_names(jail_ids, cursor))
+            conn.commit()
+
+        status, _ = crawl(
+            names,
+            conn,
+            ingest_fn=scrape.ingest_modes[ingest_mode],
+            parser=parser,
+            chunk_size=chunk_size,
+            archive_dir=archive_dir,
+            workers=workers,
+            concurrency=concurrency,
+            rate=rate
+        )
+    metrics.report(metrics_file)
+    return status
+
+
+if __name__ == "__main__":
+    args = make_argparser().parse_args()
+    names = list(args.names)
+    if args.names_file is not None:
+        names.extend(read_names(args.names_file))
+    status = main(
+        names,
+        args.jail_ids,
+        ingest_mode=args.ingest,
+        parser=args.parser,
+        chunk_size=args.chunk_size,
+        archive_dir=args.archive,
+        workers=args.workers,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        metrics_file=args.metrics_file
+    )
+    sys.exit(status)
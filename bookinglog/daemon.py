@@ -0,0 +1,301 @@
+"""Poll the Marin County Jail Booking Log continuously.
+
+A long running alternative to scheduling `bookinglog.scrape`. The HTTP
+session and pooled database connections are kept open between polls, and each
+search is polled on its own interval. When a search returns the same
+page as it did last time, the page isn't ingested again and the
+search's interval is lengthened, up to a limit. The interval is reset
+as soon as the page changes.
+
+Counts of polls and ingested entries are logged after each poll, and
+written to a status file if one is given. Metrics are logged and
+written after each poll too, and can be served to Prometheus.
+"""
+
+from collections import Counter
+from datetime import datetime
+
+from . import config
+from . import db
+from . import metrics
+from . import pull
+from . import rollups
+from . import scrape
+
+import hashlib
+import json
+import logging
+import os
+import psycopg2
+import signal
+import tempfile
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between polls of each search, when the page is changing.
+DEFAULT_INTERVALS = {
+    "latest": 300.,
+    "current": 3600.,
+}
+# Factor to lengthen an interval by when a page hasn't changed, and the
+# most it may be lengthened by in total.
+BACKOFF = 2.
+MAX_BACKOFF = 8.
+
+
+def make_schedule(intervals, now):
+    """Make the polling state of each search, all due `now`."""
+
+    return {
+        search_type: {
+            "base_interval": interval,
+            "interval": interval,
+            "due": now,
+            "digest": None,
+            "counts": Counter(),
+        }
+        for search_type, interval in intervals.items()
+    }
+
+def next_due(schedule):
+    """Get the search which is due soonest."""
+
+    return min(schedule, key=lambda search_type: schedule[search_type]["due"])
+
+def reschedule(state, changed, now, backoff=BACKOFF, max_backoff=MAX_BACKOFF):
+    """Set when a search is next due.
+
+    The interval is reset if the page changed, and lengthened otherwise.
+    """
+
+    if changed:
+        state["interval"] = state["base_interval"]
+    else:
+        state["interval"] = min(
+            state["interval"] * backoff,
+            state["base_interval"] * max_backoff
+        )
+    state["due"] = now + state["interval"]
+
+def poll(search_type, state, session, conn, ingest_fn=scrape.ingest,
+         parser=pull.DEFAULT_ENGINE, chunk_size=500, archive_dir=None,
+         workers=1):
+    """Scrape a search, and ingest the page if it has changed.
+
+    The search is recorded as covered either way. Counts of the poll
+    are added to the search's state.
+
+    Returns
+    -------
+    outcome : str
+        One of "changed", "unchanged" or "failed".
+    """
+
+    counts = state["counts"]
+    counts["polls"] += 1
+
+    try:
+        html = pull.scrape(search_type, session=session, **config.http_kwargs)
+    except Exception as e:
+        logger.error("Failed scraping %s with %s", search_type, e)
+        counts["failed"] += 1
+        return "failed"
+
+    counts["bytes"] += len(html)
+    if archive_dir is not None:
+        scrape.archive_page(archive_dir, html, search_type)
+
+    digest = hashlib.sha256(html).hexdigest()
+    try:
+        if digest == state["digest"]:
+            with conn.cursor() as cursor:
+                rollups.record_coverage(search_type, cursor)
+            conn.commit()
+            outcome = "unchanged"
+        else:
+            ingested = scrape.ingest_page(
+                html, search_type, conn, ingest_fn, parser, chunk_size,
+                workers)
+            scrape.log_counts(ingested)
+            counts["inserted"] += ingested["inserted"]
+            counts["updated"] += ingested["updated"]
+            counts["failed_conversion"] += ingested["failed"]
+            state["digest"] = digest
+            outcome = "changed"
+    except Exception as e:
+        logger.error("Failed ingesting %s with %s", search_type, e)
+        if not conn.closed:
+            conn.rollback()
+        counts["failed"] += 1
+        return "failed"
+
+    counts[outcome] += 1
+    return outcome
+
+def status(schedule):
+    """Summarize the state of each search."""
+
+    return {
+        search_type: {
+            "interval": state["interval"],
+            "digest": state["digest"],
+            "counts": dict(state["counts"]),
+        }
+        for search_type, state in schedule.items()
+    }
+
+def write_status(path, schedule):
+    """Write the status of each search to a JSON file, atomically."""
+
+    record = {
+        "updated_at": datetime.utcnow().isoformat(),
+        "searches": status(schedule),
+    }
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=dirname)
+    with os.fdopen(fd, "w") as fh:
+        json.dump(record, fh, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def make_argparser():
+    parser = scrape.make_argparser(engines=False)
+    parser.prog = "bookinglog daemon"
+    parser.description = __doc__
+    parser.set_defaults(search=list(DEFAULT_INTERVALS))
+    for search_type, interval in DEFAULT_INTERVALS.items():
+        parser.add_argument(
+            "--{}-interval".format(search_type),
+            help="Seconds between polls of the {} search".format(
+                search_type),
+            type=float,
+            required=False,
+            default=interval
+        )
+    parser.add_argument(
+        "--backoff",
+        help="Factor to lengthen a search's interval by while unchanged",
+        type=float,
+        required=False,
+        default=BACKOFF
+    )
+    parser.add_argument(
+        "--max-backoff",
+        help="Most a search's interval may be lengthened by, in total",
+        type=float,
+        required=False,
+        default=MAX_BACKOFF
+    )
+    parser.add_argument(
+        "--status-file",
+        help="JSON file to write run counts to after each poll",
+        type=str,
+        required=False
+    )
+    parser.add_argument(
+        "--metrics-port",
+        help="Port to serve Prometheus metrics on, at /metrics",
+        type=int,
+        required=False
+    )
+    return parser
+
+def main(intervals, ingest_mode="row", parser=pull.DEFAULT_ENGINE,
+         chunk_size=500, archive_dir=None, workers=1, backoff=BACKOFF,
+         max_backoff=MAX_BACKOFF, status_file=None, metrics_file=None,
+         metrics_port=None, stop=None, max_polls=None):
+    """Poll searches until stopped.
+
+    Parameters
+    ----------
+    intervals : dict
+        Seconds between polls, by search type.
+    metrics_file : str, optional
+        Prometheus text file to write metrics to after each poll.
+    metrics_port : int, optional
+        Port to serve metrics on while polling, see `metrics.serve`.
+    stop : threading.Event, optional
+        Set to stop polling. SIGINT and SIGTERM set it when given None.
+    max_polls : int, optional
+        Stop after this many polls.
+
+    Returns
+    -------
+    schedule : dict
+        The final polling state of each search.
+    """
+
+    ingest_fn = scrape.ingest_modes[ingest_mode]
+    if stop is None:
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+    schedule = make_schedule(intervals, time.monotonic())
+    n_polls = 0
+    server = None
+    if metrics_port is not None:
+        server = metrics.serve(metrics_port)
+
+    with pull.make_session() as session:
+        while not stop.is_set():
+            search_type = next_due(schedule)
+            state = schedule[search_type]
+            if stop.wait(max(0., state["due"] - time.monotonic())):
+                break
+
+            # Connections are checked out of the shared pool for each
+            # poll, and replaced if they were lost.
+            try:
+                with db.connection() as conn:
+                    outcome = poll(
+                        search_type, state, session, conn, ingest_fn,
+                        parser, chunk_size, archive_dir, workers)
+            except psycopg2.OperationalError as e:
+                logger.error("Failed connecting with %s", e)
+                state["counts"]["failed"] += 1
+                outcome = "failed"
+
+            reschedule(state, outcome == "changed", time.monotonic(),
+                       backoff, max_backoff)
+
+            counts = state["counts"]
+            logger.info(
+                "Polled %s (%s): %s polls, %s changed, %s unchanged, "
+                "%s failed; next in %.0fs",
+                search_type, outcome, counts["polls"], counts["changed"],
+                counts["unchanged"], counts["failed"], state["interval"])
+            if status_file is not None:
+                write_status(status_file, schedule)
+            metrics.report(metrics_file)
+
+            n_polls += 1
+            if max_polls is not None and n_polls >= max_polls:
+                break
+
+    if server is not None:
+        server.shutdown()
+    return schedule
+
+
+if __name__ == "__main__":
+    args = make_argparser().parse_args()
+    intervals = {
+        search_type: getattr(args, "{}_interval".format(search_type))
+        for search_type in args.search
+    }
+    main(
+        intervals,
+        ingest_mode=args.ingest,
+        parser=args.parser,
+        chunk_size=args.chunk_size,
+        archive_dir=args.archive,
+        workers=args.workers,
+        backoff=args.backoff,
+        max_backoff=args.max_backoff,
+        status_file=args.status_file,
+        metrics_file=args.metrics_file,
+        metrics_port=args.metrics_port
+    )
@@ -0,0 +1,87 @@
+"""Parse dates and times displayed by the Booking Log.
+
+The website only uses two formats, `%m/%d/%Y` for dates and
+`%m/%d/%Y %I:%M %p` for times. These are parsed by hand rather than
+with `datetime.strptime`, which is slow and depends on the locale for
+`%p`, and results are cached as many bookings share the same times.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+
+import pytz
+import re
+
+
+# Assume that the time displayed by the website is fixed (California).
+PACIFIC = pytz.timezone("US/Pacific")
+
+CACHE_SIZE = 4096
+
+# Accept the same inputs as the equivalent `strptime` directives.
+_month = r"(1[0-2]|0[1-9]|[1-9])"
+_day = r"(3[01]|[12]\d|0[1-9]|[1-9]| [1-9])"
+_year = r"(\d\d\d\d)"
+_hour = r"(1[0-2]|0[1-9]|[1-9])"
+_minute = r"([0-5]\d|\d)"
+_period = r"(am|pm)"
+
+DATE_PATTERN = re.compile(
+    r"{m}/{d}/{y}".format(m=_month, d=_day, y=_year),
+    flags=re.IGNORECASE
+)
+DATETIME_PATTERN = re.compile(
+    r"{m}/{d}/{y}\s+{H}:{M}\s+{p}".format(
+        m=_month, d=_day, y=_year, H=_hour, M=_minute, p=_period),
+    flags=re.IGNORECASE
+)
+
+
+def localize(dt):
+    """Attach the Pacific timezone to a naive local time.
+
+    Times in the hour repeated when daylight saving time ends are taken
+    to be standard time, and times in the hour skipped when it starts
+    are moved forward to daylight saving time.
+    """
+    return PACIFIC.normalize(PACIFIC.localize(dt, is_dst=False))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_date(x):
+    """Parse a `%m/%d/%Y` date into a naive datetime.
+
+    Raises
+    ------
+    ValueError
+        If the date isn't in the expected format or doesn't exist.
+    """
+
+    match = DATE_PATTERN.fullmatch(x)
+    if match is None:
+        raise ValueError("{!r} does not match format '%m/%d/%Y'".format(x))
+
+    month, day, year = map(int, match.groups())
+    return datetime(year, month, day)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_datetime(x):
+    """Parse a `%m/%d/%Y %I:%M %p` time into a Pacific time.
+
+    Raises
+    ------
+    ValueError
+        If the time isn't in the expected format or doesn't exist.
+    """
+
+    match = DATETIME_PATTERN.fullmatch(x)
+    if match is None:
+        raise ValueError(
+            "{!r} does not match format '%m/%d/%Y %I:%M %p'".format(x))
+
+    month, day, year, hour, minute, period = match.groups()
+    hour = int(hour) % 12
+    if period.lower() == "pm":
+        hour += 12
+
+    dt = datetime(int(year), int(month), int(day), hour, int(minute))
+    return localize(dt)
@@ -0,0 +1,215 @@
+"""Database connections and prepared statements.
+
+Connections are kept in a pool, shared by everything which runs in the
+process, so that the daemon and repeated runs reuse connections rather
+than connecting anew. A connection which has been idle for a while is
+checked before it is handed out, and replaced if it has been lost.
+
+The per-row ingest statements are prepared on each connection the
+first time they're used, and executed by name after that, so that the
+server parses and plans them once per connection rather than once per
+row.
+"""
+
+from contextlib import contextmanager
+from psycopg2.pool import ThreadedConnectionPool
+
+from . import config
+from . import metrics
+from . import queries
+
+import atexit
+import logging
+import psycopg2
+import re
+import threading
+import time
+import weakref
+
+
+logger = logging.getLogger(__name__)
+
+MIN_CONNECTIONS = 1
+MAX_CONNECTIONS = 4
+# Seconds a connection may be idle before it's checked on checkout.
+IDLE_CHECK = 30.
+
+# Statements prepared on each connection as they're first executed.
+statements = {
+    "insert_entry": queries.insert_entry,
+    "insert_arrest": queries.insert_arrest,
+    "insert_inmate": queries.insert_inmate,
+    "insert_charge": queries.insert_charge,
+}
+
+parameter_pattern = re.compile(r"%\((\w+)\)s|%%")
+
+_pool = None
+_pool_lock = threading.Lock()
+# When each pooled connection was last returned, and which statements
+# have been prepared on each connection.
+_returned_at = weakref.WeakKeyDictionary()
+_prepared = weakref.WeakKeyDictionary()
+
+
+def make_pool(minconn=MIN_CONNECTIONS, maxconn=MAX_CONNECTIONS, **pg_kwargs):
+    """Make a connection pool, by default with `config.pg_kwargs`.
+
+    Cursors of pooled connections time their statements, see
+    `metrics.MetricsCursor`.
+    """
+
+    return ThreadedConnectionPool(
+        minconn,
+        maxconn,
+        cursor_factory=metrics.MetricsCursor,
+        **(pg_kwargs or config.pg_kwargs)
+    )
+
+def get_pool():
+    """Get the process's shared connection pool, making it if need be."""
+
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = make_pool()
+        return _pool
+
+def close_pool():
+    """Close every connection of the shared pool."""
+
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+
+atexit.register(close_pool)
+
+def is_healthy(conn):
+    """Check that a connection is open and the server responds."""
+
+    if conn.closed:
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+    except psycopg2.Error:
+        return False
+    return True
+
+def checkout(pool, idle_check=IDLE_CHECK):
+    """Get a healthy connection from a pool.
+
+    Connections which are closed, or which have been idle for longer
+    than `idle_check` seconds and fail a health check, are discarded
+    and replaced by new connections.
+    """
+
+    # Each discarded connection frees a slot, so this ends with a new
+    # connection at the latest once every pooled one has been tried.
+    for _ in range(pool.maxconn):
+        conn = pool.getconn()
+        returned_at = _returned_at.get(conn)
+        idle = returned_at is not None and (
+            time.monotonic() - returned_at > idle_check)
+        if not conn.closed and (not idle or is_healthy(conn)):
+            return conn
+
+        logger.warning("Replacing lost database connection")
+        pool.putconn(conn, close=True)
+
+    return pool.getconn()
+
+def release(pool, conn):
+    """Return a connection to a pool, discarding it if it was lost."""
+
+    if not conn.closed:
+        _returned_at[conn] = time.monotonic()
+    pool.putconn(conn, close=bool(conn.closed))
+
+@contextmanager
+def connection(pool=None):
+    """Borrow a connection from a pool, the shared pool by default.
+
+    As a psycopg2 connection used as a context manager, the transaction
+    is committed if the block succeeds and rolled back otherwise. The
+    connection is then returned to the pool.
+    """
+
+    if pool is None:
+        pool = get_pool()
+
+    conn = checkout(pool)
+    try:
+        yield conn
+        if not conn.closed:
+            conn.commit()
+    except Exception:
+        # Don't hide the original error if the connection was lost.
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error as e:
+                logger.warning("Failed rolling back with %s", e)
+        raise
+    finally:
+        release(pool, conn)
+
+def to_positional(query):
+    """Convert a query's named parameters to positional ones.
+
+    Returns
+    -------
+    query : str
+        The query with `%(name)s` parameters as `$1`, `$2`, ..., for
+        PREPARE.
+    names : list of str
+        Name of each positional parameter.
+    """
+
+    names = []
+
+    def replace(match):
+        name = match.group(1)
+        if name is None:
+            return "%"
+        if name not in names:
+            names.append(name)
+        return "${}".format(names.index(name) + 1)
+
+    return parameter_pattern.sub(replace, query), names
+
+def make_prepared(name, query):
+    """Make the PREPARE and EXECUTE statements of a query."""
+
+    query, names = to_positional(query)
+    prepare = "PREPARE {} AS {}".format(name, query)
+    arguments = ", ".join("%({})s".format(arg) for arg in names)
+    execute = "EXECUTE {} ({})".format(name, arguments)
+
+    metrics.name_query(prepare, "prepare")
+    metrics.name_query(execute, name)
+    return prepare, execute
+
+_prepared_statements = {
+    name: make_prepared(name, query) for name, query in statements.items()
+}
+
+def execute(cursor, name, params):
+    """Execute a statement of `statements` as a prepared statement.
+
+    The statement is prepared on the cursor's connection the first time
+    it's executed there. Prepared statements last as long as their
+    connection, even if the transaction which prepared them is rolled
+    back.
+    """
+
+    prepare, statement = _prepared_statements[name]
+    prepared = _prepared.setdefault(cursor.connection, set())
+    if name not in prepared:
+        cursor.execute(prepare)
+        prepared.add(name)
+
+    cursor.execute(statement, params)
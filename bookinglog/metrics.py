@@ -0,0 +1,348 @@
+"""Timers and counters for the stages of a scrape.
+
+Stages are timed with `timer` (or `timed`, `timed_iter`), which add up
+the wall clock and CPU time spent in each stage and the number of times
+it ran, and events are counted with `increment`. Timers and counters
+accumulate over the life of the process:
+
+    fetch, parse, coerce, ingest
+        Downloading pages, parsing them, converting entries and writing
+        chunks of entries.
+    query.<name>
+        Each statement sent to the database on a pooled connection, by
+        its name in `bookinglog.queries` ("query.other" if it isn't
+        one), see `MetricsCursor`. The multi-row upserts of batch
+        ingests are timed by name around `execute_values`, and their
+        pages are also timed as "query.other".
+
+along with counters of HTTP requests, bytes downloaded, entries parsed,
+converted and ingested, and database round-trips.
+
+Metrics are exported by `report`, as a JSON log line and optionally as
+a file in the Prometheus text format, e.g. for the node exporter's
+textfile collector, or served over HTTP by `serve`.
+
+CPU time is that of the calling thread, or of the whole process on
+Python versions before 3.7, where it also counts time spent by other
+threads, e.g. of the async engine, during a stage. Entries parsed and
+converted in worker processes (`--workers`) are timed in those
+processes, and aren't included.
+"""
+
+from collections import defaultdict
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from . import queries
+
+import json
+import logging
+import os
+import psycopg2.extensions
+import tempfile
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "bookinglog"
+
+_lock = threading.Lock()
+# Calls, wall seconds and CPU seconds, by timer name.
+_timers = defaultdict(lambda: [0, 0., 0.])
+_counters = defaultdict(int)
+_started_at = time.perf_counter()
+
+# CPU time of the calling thread, or of the whole process before Python
+# 3.7, which lacks `time.thread_time`.
+cpu_time = getattr(time, "thread_time", time.process_time)
+
+# Names of the statements in `queries`, by their text.
+query_names = {
+    query: name for name, query in vars(queries).items()
+    if isinstance(query, str) and not name.startswith("_")
+}
+
+
+def add_time(name, wall, cpu, calls=1):
+    with _lock:
+        timer = _timers[name]
+        timer[0] += calls
+        timer[1] += wall
+        timer[2] += cpu
+
+def increment(name, n=1):
+    """Add `n` to a counter."""
+
+    with _lock:
+        _counters[name] += n
+
+class Stopwatch(object):
+    """Accumulate time over many short intervals of a stage.
+
+    Cheaper than a `timer` per interval, as the totals are only added
+    to the stage's timer when flushed.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall = 0.
+        self.cpu = 0.
+
+    def start(self):
+        self.started_wall = time.perf_counter()
+        self.started_cpu = cpu_time()
+
+    def stop(self):
+        self.wall += time.perf_counter() - self.started_wall
+        self.cpu += cpu_time() - self.started_cpu
+        self.calls += 1
+
+    def flush(self):
+        if self.calls:
+            add_time(self.name, self.wall, self.cpu, self.calls)
+        self.calls = 0
+        self.wall = self.cpu = 0.
+
+class Timer(Stopwatch):
+    """Time a block, adding to the stage's timer even if it raises."""
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        self.flush()
+
+def timer(name):
+    """Time a block with the named timer, see `Timer`."""
+
+    return Timer(name)
+
+def timed(name):
+    """Decorate a function to time its calls with the named timer."""
+
+    def decorator(fn):
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            with timer(name):
+                return fn(*args, **kwargs)
+        return inner
+    return decorator
+
+def timed_iter(name, make_iterable):
+    """Time the production of each item of a lazy iterable.
+
+    Only time spent making the iterable and producing its items counts,
+    not time spent by the consumer between items.
+
+    Parameters
+    ----------
+    name : str
+    make_iterable : callable
+        Makes the iterable, called when the first item is requested.
+    """
+
+    stopwatch = Stopwatch(name)
+    try:
+        stopwatch.start()
+        try:
+            iterator = iter(make_iterable())
+        finally:
+            stopwatch.stop()
+
+        while True:
+            stopwatch.start()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                stopwatch.stop()
+            yield item
+    finally:
+        stopwatch.flush()
+
+def reset():
+    """Clear every timer and counter."""
+
+    global _started_at
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+        _started_at = time.perf_counter()
+
+def rate(n, seconds):
+    return n / seconds if seconds else 0.
+
+def snapshot():
+    """Get the current timers and counters.
+
+    Returns
+    -------
+    metrics : dict
+        "timers" with the "calls", "wall_seconds" and "cpu_seconds" of
+        each timer, "counters", the "elapsed_seconds" since the metrics
+        were started and "records_per_second", overall and per stage.
+    """
+
+    with _lock:
+        timers = {
+            name: {
+                "calls": calls,
+                "wall_seconds": wall,
+                "cpu_seconds": cpu,
+            }
+            for name, (calls, wall, cpu) in _timers.items()
+        }
+        counters = dict(_counters)
+        elapsed = time.perf_counter() - _started_at
+
+    def wall(name):
+        return timers.get(name, {}).get("wall_seconds", 0.)
+
+    return {
+        "timers": timers,
+        "counters": counters,
+        "elapsed_seconds": elapsed,
+        "records_per_second": {
+            "overall": rate(counters.get("entries_ingested", 0), elapsed),
+            "parse": rate(counters.get("entries_parsed", 0), wall("parse")),
+            "coerce": rate(
+                counters.get("entries_converted", 0), wall("coerce")),
+            "ingest": rate(
+                counters.get("entries_ingested", 0), wall("ingest")),
+        },
+    }
+
+def to_json(metrics):
+    return json.dumps(metrics, sort_keys=True)
+
+def label_value(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+def to_prometheus(metrics, prefix=PREFIX):
+    """Format metrics, as `snapshot`, in the Prometheus text format."""
+
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append("# HELP {}_{} {}".format(prefix, name, help_text))
+        lines.append("# TYPE {}_{} {}".format(prefix, name, kind))
+        for labels, value in samples:
+            label_text = ",".join(
+                '{}="{}"'.format(key, label_value(str(label)))
+                for key, label in labels)
+            if label_text:
+                label_text = "{" + label_text + "}"
+            lines.append("{}_{}{} {}".format(prefix, name, label_text, value))
+
+    timers = sorted(metrics["timers"].items())
+    family(
+        "stage_calls_total", "counter", "Number of times a stage ran.",
+        [((("stage", name),), timer["calls"]) for name, timer in timers])
+    family(
+        "stage_seconds_total", "counter", "Time spent in a stage.",
+        [
+            ((("stage", name), ("clock", clock)), timer[clock + "_seconds"])
+            for name, timer in timers
+            for clock in ("wall", "cpu")
+        ])
+    for name, value in sorted(metrics["counters"].items()):
+        family(
+            name + "_total", "counter", "Number of {}.".format(
+                name.replace("_", " ")),
+            [((), value)])
+    family(
+        "records_per_second", "gauge", "Entries handled per second.",
+        [
+            ((("stage", stage),), value)
+            for stage, value in sorted(metrics["records_per_second"].items())
+        ])
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path, metrics):
+    """Write metrics to a Prometheus text file, atomically."""
+
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=dirname)
+    with os.fdopen(fd, "w") as fh:
+        fh.write(to_prometheus(metrics))
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+def report(metrics_file=None):
+    """Log the current metrics as a JSON line, and write them to a
+    Prometheus text file if one is given.
+    """
+
+    metrics = snapshot()
+    logger.info("metrics %s", to_json(metrics))
+    if metrics_file is not None:
+        try:
+            write_prometheus(metrics_file, metrics)
+        except OSError as e:
+            logger.error("Failed writing metrics with %s", e)
+    return metrics
+
+class Handler(BaseHTTPRequestHandler):
+    """Serve the current metrics in the Prometheus text format."""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = to_prometheus(snapshot()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+def serve(port, host=""):
+    """Serve metrics at `/metrics` from a background thread.
+
+    Returns
+    -------
+    server : http.server.HTTPServer
+        Call `shutdown` to stop serving.
+    """
+
+    server = HTTPServer((host, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+class MetricsCursor(psycopg2.extensions.cursor):
+    """Cursor which times each statement and counts round-trips.
+
+    Statements are timed as "query.<name>", by their name in `queries`,
+    or as registered with `name_query`.
+    """
+
+    def execute(self, query, vars=None):
+        increment("db_round_trips")
+        with timer("query." + query_name(query)):
+            return super().execute(query, vars)
+
+    def copy_expert(self, sql, file, size=8192):
+        increment("db_round_trips")
+        with timer("query." + query_name(sql)):
+            return super().copy_expert(sql, file, size)
+
+def query_name(query):
+    if not isinstance(query, str):
+        return "other"
+    return query_names.get(query, "other")
+
+def name_query(query, name):
+    """Name a statement which isn't in `queries`, for `MetricsCursor`."""
+
+    query_names[query] = name
@@ -0,0 +1,185 @@
+"""Stream parsed entries through conversion and into the database."""
+
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from schema import SchemaError
+
+from . import coerce
+from . import metrics
+from . import pull
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# Number of inmate fragments to send to a worker process at a time.
+FRAGMENTS_PER_TASK = 50
+
+
+def chunked(iterable, size):
+    """Split an iterable into lists of at most `size` items."""
+
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def convert(entries, counts):
+    """Lazily convert entries to native objects.
+
+    Entries which fail validation are logged and skipped.
+
+    Parameters
+    ----------
+    entries : iterable of tuples of (dict, list of dicts)
+        Parsed booking log entries.
+    counts : collections.Counter
+        Updated with the number of "parsed", "converted" and "failed"
+        entries as they are consumed.
+
+    Yields
+    ------
+    entry : tuple of (dict, list of dicts)
+        Converted booking log entry.
+    """
+
+    stopwatch = metrics.Stopwatch("coerce")
+    parsed = converted = 0
+    try:
+        for inmate, charges in entries:
+            counts["parsed"] += 1
+            parsed += 1
+            stopwatch.start()
+            try:
+                entry = coerce.convert(inmate, charges)
+            except SchemaError as e:
+                counts["failed"] += 1
+                logger.warning(
+                    "Skipping entry %s: %s", inmate.get("Jail Id"), e)
+                continue
+            finally:
+                stopwatch.stop()
+
+            counts["converted"] += 1
+            converted += 1
+            yield entry
+    finally:
+        stopwatch.flush()
+        metrics.increment("entries_parsed", parsed)
+        metrics.increment("entries_converted", converted)
+
+def run(entries, cursor, ingest, chunk_size=500):
+    """Convert and ingest entries in bounded chunks.
+
+    Parameters
+    ----------
+    entries : iterable of tuples of (dict, list of dicts)
+        Parsed booking log entries.
+    cursor : database cursor
+    ingest : callable
+        Ingest function taking a list of converted entries and a
+        cursor, and returning a `Counter` of written bookings, e.g.
+        `scrape.ingest`.
+    chunk_size : int
+        Maximum number of entries to hold in memory and write at once.
+
+    Returns
+    -------
+    counts : collections.Counter
+        Number of entries "parsed", "converted", "failed" and
+        "ingested", along with the counts returned by `ingest`.
+    """
+
+    counts = Counter()
+    write(convert(entries, counts), cursor, ingest, chunk_size, counts)
+    return counts
+
+def write(converted, cursor, ingest, chunk_size=500, counts=None):
+    """Ingest converted entries in bounded chunks.
+
+    See `run`, for entries which have already been converted.
+
+    Returns
+    -------
+    counts : collections.Counter
+        Number of entries "ingested", along with the counts returned
+        by `ingest`. Updates and returns `counts` if given.
+    """
+
+    if counts is None:
+        counts = Counter()
+
+    for chunk in chunked(converted, chunk_size):
+        with metrics.timer("ingest"):
+            counts.update(ingest(chunk, cursor))
+        counts["ingested"] += len(chunk)
+        metrics.increment("entries_ingested", len(chunk))
+    return counts
+
+def convert_fragments(parser, fragments):
+    """Parse and convert page fragments, see `pull.split`.
+
+    Returns
+    -------
+    entries : list of tuples of (dict, list of dicts)
+        Converted entries.
+    counts : collections.Counter
+        See `convert`.
+    """
+
+    counts = Counter()
+    entries = []
+    for fragment in fragments:
+        parsed = pull.iter_parse(fragment, engine=parser)
+        entries.extend(convert(parsed, counts))
+    return entries, counts
+
+def run_parallel(html, cursor, ingest, parser=pull.DEFAULT_ENGINE, workers=1,
+                 chunk_size=500):
+    """Parse, convert and ingest a page using worker processes.
+
+    The page is split into per-inmate fragments, which are parsed and
+    converted by `workers` processes and ingested in page order.
+
+    Returns
+    -------
+    counts : collections.Counter
+        See `run`.
+    """
+
+    counts = Counter()
+    tasks = chunked(pull.split(html), FRAGMENTS_PER_TASK)
+    results = imap(partial(convert_fragments, parser), tasks, workers)
+
+    def converted():
+        for entries, task_counts in results:
+            counts.update(task_counts)
+            yield from entries
+
+    return write(converted(), cursor, ingest, chunk_size, counts)
+
+def imap(fn, iterable, workers=1):
+    """Map a function over an iterable in worker processes.
+
+    Results are yielded in order. At most `2 * workers` items are in
+    flight at a time, so that results don't pile up in memory when
+    they are consumed slower than they are produced.
+    """
+
+    if workers <= 1:
+        yield from map(fn, iterable)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in iterable:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
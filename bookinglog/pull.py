@@ -1,9 +1,21 @@
 """Scrape and parse Booking Log results page."""
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, UnicodeDammit
 from collections import ChainMap
+from functools import partial
 
+from . import metrics
+from . import stream
+
+import logging
+import random
+import re
 import requests
+import time
+import urllib.parse
+
+
+logger = logging.getLogger(__name__)
 
 
 # Each inmate entry has 3 tables:
@@ -59,7 +71,7 @@ def parse_table(table):
     pairs = dict(ChainMap(*parsed))
     return pairs
 
-def parse(html):
+def parse_soup(html):
     soup = BeautifulSoup(html, "html.parser")
 
     # Find data sections. Each inmate has three tables:
@@ -81,19 +93,188 @@ def parse(html):
     )
 
     entries = zip(inmates, charges)
-    return list(entries)
+    return entries
+
+engines = {
+    "bs4": parse_soup,
+    "lxml": stream.parse,
+}
+# The streaming parser, which only holds an inmate's tables at a time,
+# so memory doesn't grow with the number of inmates on a page.
+DEFAULT_ENGINE = "lxml"
+
+# Start of each inmate's top section: a div whose id is exactly "sec1",
+# quoted or not, and not e.g. "sec1-x" or a data-id attribute.
+section_pattern = re.compile(
+    r"""<div[^>]*\sid\s*=\s*(?:"sec1"|'sec1'|sec1(?=[\s/>]))""",
+    re.IGNORECASE
+)
+
+def split(html):
+    """Split page source into per-inmate fragments.
+
+    Each fragment runs from the start of an inmate's top section to the
+    start of the next, and so holds all of that inmate's tables. Parsing
+    the fragments in turn gives the same entries as parsing the page.
+
+    Parameters
+    ----------
+    html : str or bytes
+        Booking Log results page source.
+
+    Returns
+    -------
+    fragments : list of str
+    """
+
+    markup = UnicodeDammit(html).unicode_markup
+    starts = [match.start() for match in section_pattern.finditer(markup)]
+    ends = starts[1:] + [len(markup)]
+    return [markup[start:end] for start, end in zip(starts, ends)]
+
+def iter_parse(html, engine=DEFAULT_ENGINE):
+    """Lazily parse inmate entries from page source.
+
+    Parameters
+    ----------
+    html : str or bytes
+        Booking Log results page source.
+    engine : str
+        Parser to use, one of ("bs4", "lxml"). Both give the same
+        output, the lxml parser (the default) is faster on large pages
+        and emits entries as it reads the page, while BeautifulSoup
+        builds a tree of the whole page first.
+
+    Returns
+    -------
+    entries : iterator of tuples of (dict, list of dicts)
+        Inmate information and the inmate's charges.
+    """
+
+    return metrics.timed_iter("parse", partial(engines[engine], html))
+
+def parse(html, engine=DEFAULT_ENGINE):
+    """Parse inmate entries from page source into a list.
+
+    See `iter_parse`.
+    """
+    return list(iter_parse(html, engine=engine))
+
+searches = {
+    "latest": "DisplayLatestBookings=Last+48+Hours",
+    "current": "DisplayAllBookings=Currently+In+Custody",
+}
 
-def scrape(search_type):
-    """Download Booking Log page source."""
+# Searches for a specific inmate by last name. The form's field names
+# aren't published, these follow the naming of the other searches.
+last_name_search = "last-name"
+last_name_fields = {
+    "LastName": None,
+    "SearchByLastName": "Search",
+}
+
+def search_body(search_type, last_name=None):
+    """Make the form body of a search.
+
+    Parameters
+    ----------
+    search_type : str
+        One of `searches`, or "last-name".
+    last_name : str, optional
+        Last name to search for, required by "last-name" searches.
+
+    Returns
+    -------
+    body : str
+    """
+
+    if search_type != last_name_search:
+        return searches[search_type]
+
+    if not last_name:
+        raise ValueError("last-name search requires a last name")
+    fields = dict(last_name_fields, LastName=last_name)
+    return urllib.parse.urlencode(fields)
+
+def make_session():
+    """Make an HTTP session to reuse connections across requests."""
+
+    session = requests.Session()
+    session.headers.update({
+        "Content-Type": "application/x-www-form-urlencoded",
+        "Accept-Encoding": "gzip, deflate",
+    })
+    return session
+
+def backoff_delay(attempt, backoff):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, backoff * 2 ** attempt)
+
+@metrics.timed("fetch")
+def scrape(search_type, session=None, timeout=(10, 60), retries=3,
+           backoff=1., last_name=None):
+    """Download Booking Log page source.
+
+    Requests which fail with a connection error, time out or get a
+    server error response are retried.
+
+    Searches are form POSTs, to which conditional requests
+    (If-None-Match, If-Modified-Since) don't apply, so every request
+    downloads the page. Unchanged pages are detected by their digest
+    instead, see `bookinglog.daemon`.
+
+    Parameters
+    ----------
+    search_type : str
+        Search to perform, one of ("latest", "current", "last-name").
+    session : requests.Session, optional
+        Session to make the request with. A new session is made, and
+        closed afterwards, if not given, see `make_session`.
+    timeout : float or tuple of (float, float)
+        Connect and read timeouts, in seconds.
+    retries : int
+        Number of times to retry a failed request.
+    backoff : float
+        Base delay between retries, in seconds. The delay doubles after
+        each retry and is randomized.
+    last_name : str, optional
+        Last name to search for, for "last-name" searches.
+
+    Returns
+    -------
+    content : bytes
+        Page source.
+    """
+
+    body = search_body(search_type, last_name)
+    if session is not None:
+        return post(session, body, timeout, retries, backoff)
+
+    with make_session() as session:
+        return post(session, body, timeout, retries, backoff)
+
+def post(session, body, timeout, retries, backoff):
+    """Post a search form, retrying failures, see `scrape`."""
 
     url = "https://apps.marincounty.org/BookingLog/Booking/Action"
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    body = {
-        "latest": "DisplayLatestBookings=Last+48+Hours",
-        "current": "DisplayAllBookings=Currently+In+Custody",
-    }[search_type]
-    response = requests.post(url, headers=headers, data=body)
+    for attempt in range(retries + 1):
+        metrics.increment("http_requests")
+        try:
+            response = session.post(url, data=body, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries:
+                raise
+            logger.warning("Request failed with %s, retrying", e)
+        else:
+            if response.status_code < 500 or attempt == retries:
+                break
+            logger.warning(
+                "Request failed with status %s, retrying",
+                response.status_code)
+
+        time.sleep(backoff_delay(attempt, backoff))
 
     if not response.ok:
         response.raise_for_status()
+    metrics.increment("bytes_downloaded", len(response.content))
     return response.content
@@ -1,11 +1,12 @@
 insert_entry = (
     "INSERT INTO booking "
-    "(jail_id, orig_booking_date, latest_charge_date) "
-    "VALUES (%(jail_id)s, %(orig_booking_date)s, %(latest_charge_date)s) "
+    "(jail_id, orig_booking_date, latest_charge_date, content_hash) "
+    "VALUES (%(jail_id)s, %(orig_booking_date)s, %(latest_charge_date)s, %(content_hash)s) "
     "ON CONFLICT (jail_id) DO UPDATE "
     "SET jail_id = EXCLUDED.jail_id, "
     "  orig_booking_date = EXCLUDED.orig_booking_date, "
-    "  latest_charge_date = EXCLUDED.latest_charge_date "
+    "  latest_charge_date = EXCLUDED.latest_charge_date, "
+    "  content_hash = EXCLUDED.content_hash "
     "RETURNING id"
 )
 
@@ -42,3 +43,257 @@ insert_charge = (
     "ON CONFLICT (booking_id) DO UPDATE "
     "SET recorded = EXCLUDED.recorded"
 )
+
+# Rewrite the expanded charges of bookings from their recorded charges.
+refresh_charge_items = (
+    "DELETE FROM charge_items "
+    "WHERE booking_id = ANY(%(booking_ids)s); "
+    "INSERT INTO charge_items "
+    "(booking_id, position, charge, description, level, bail, charge_authority) "
+    "SELECT charges.booking_id, item.position, "
+    "  lower(item.record ->> 'charge'), "
+    "  lower(item.record ->> 'description'), "
+    "  lower(item.record ->> 'level'), "
+    "  CAST(item.record ->> 'bail' AS integer), "
+    "  lower(item.record ->> 'charge_authority') "
+    "FROM charges, "
+    "  jsonb_array_elements(charges.recorded) "
+    "    WITH ORDINALITY AS item(record, position) "
+    "WHERE charges.booking_id = ANY(%(booking_ids)s)"
+)
+
+# Recount arrivals on the given (Pacific) dates. Booking times are
+# stored in the session time zone, so each day is converted to a range
+# of stored times to make use of the index on orig_booking_date.
+refresh_daily_arrivals = (
+    "INSERT INTO daily_arrivals (booking_date, n) "
+    "SELECT d.booking_date, ("
+    "  SELECT count(*) FROM booking "
+    "  WHERE orig_booking_date >= "
+    "      (d.booking_date::timestamp AT TIME ZONE 'US/Pacific') "
+    "      AT TIME ZONE current_setting('TimeZone') "
+    "    AND orig_booking_date < "
+    "      ((d.booking_date + 1)::timestamp AT TIME ZONE 'US/Pacific') "
+    "      AT TIME ZONE current_setting('TimeZone')"
+    ") "
+    "FROM unnest(CAST(%(dates)s AS date[])) AS d(booking_date) "
+    "ON CONFLICT (booking_date) DO UPDATE "
+    "SET n = EXCLUDED.n"
+)
+
+# Current (Pacific) booking dates of existing bookings, to recount
+# arrivals on the dates they're moved from.
+select_booking_dates = (
+    "SELECT DISTINCT CAST("
+    "  (orig_booking_date AT TIME ZONE current_setting('TimeZone')) "
+    "  AT TIME ZONE 'US/Pacific' AS date) "
+    "FROM booking "
+    "WHERE jail_id = ANY(%(jail_ids)s) "
+    "  AND orig_booking_date IS NOT NULL"
+)
+
+insert_coverage = (
+    "INSERT INTO scrape_coverage "
+    "(scrape_date, search, runs, first_scraped_at, last_scraped_at) "
+    "VALUES (%(scrape_date)s, %(search)s, 1, %(scraped_at)s, %(scraped_at)s) "
+    "ON CONFLICT (scrape_date, search) DO UPDATE "
+    "SET runs = scrape_coverage.runs + 1, "
+    "  first_scraped_at = least(scrape_coverage.first_scraped_at, EXCLUDED.first_scraped_at), "
+    "  last_scraped_at = greatest(scrape_coverage.last_scraped_at, EXCLUDED.last_scraped_at)"
+)
+
+select_hashes = (
+    "SELECT jail_id, content_hash "
+    "FROM booking "
+    "WHERE jail_id = ANY(%(jail_ids)s)"
+)
+
+select_last_names = (
+    "SELECT DISTINCT split_part(inmates.name, ',', 1) "
+    "FROM inmates "
+    "JOIN booking ON booking.id = inmates.booking_id "
+    "WHERE booking.jail_id = ANY(%(jail_ids)s)"
+)
+
+# Multi-row variants of the above, for use with
+# `psycopg2.extras.execute_values`. Each `*_values` template renders a
+# single row of the `VALUES %s` list.
+insert_entries = (
+    "INSERT INTO booking "
+    "(jail_id, orig_booking_date, latest_charge_date, content_hash) "
+    "VALUES %s "
+    "ON CONFLICT (jail_id) DO UPDATE "
+    "SET jail_id = EXCLUDED.jail_id, "
+    "  orig_booking_date = EXCLUDED.orig_booking_date, "
+    "  latest_charge_date = EXCLUDED.latest_charge_date, "
+    "  content_hash = EXCLUDED.content_hash "
+    "RETURNING jail_id, id"
+)
+
+entry_values = "(%(jail_id)s, %(orig_booking_date)s, %(latest_charge_date)s, %(content_hash)s)"
+
+insert_arrests = (
+    "INSERT INTO arrests "
+    "(booking_id, arrest_date, agency, location) "
+    "VALUES %s "
+    "ON CONFLICT (booking_id) DO UPDATE "
+    "SET arrest_date = EXCLUDED.arrest_date, "
+    "  agency = EXCLUDED.agency, "
+    "  location = EXCLUDED.location"
+)
+
+arrest_values = "(%(booking_id)s, %(arrest_date)s, %(arrest_agency)s, %(arrest_location)s)"
+
+insert_inmates = (
+    "INSERT INTO inmates "
+    "(booking_id, name, dob, eye_color, hair_color, height, weight, race, sex, occupation) "
+    "VALUES %s "
+    "ON CONFLICT (booking_id) DO UPDATE "
+    "SET name = EXCLUDED.name, "
+    "  dob = EXCLUDED.dob, "
+    "  eye_color = EXCLUDED.eye_color, "
+    "  hair_color = EXCLUDED.hair_color, "
+    "  height = EXCLUDED.height, "
+    "  weight = EXCLUDED.weight, "
+    "  race = EXCLUDED.race, "
+    "  sex = EXCLUDED.sex, "
+    "  occupation = EXCLUDED.occupation"
+)
+
+inmate_values = "(%(booking_id)s, %(name)s, %(date_of_birth)s, %(eye_color)s, %(hair_color)s, %(height)s, %(weight)s, %(race)s, %(sex)s, %(occupation)s)"
+
+insert_charges = (
+    "INSERT INTO charges "
+    "(booking_id, recorded) "
+    "VALUES %s "
+    "ON CONFLICT (booking_id) DO UPDATE "
+    "SET recorded = EXCLUDED.recorded"
+)
+
+charge_values = "(%(booking_id)s, %(recorded)s)"
+
+# Bulk loading via COPY into a staging table, which is then merged into
+# the tables above with set-based upserts. Staging columns are mapped to
+# the keys of ingested records as in the statements above.
+staging_columns = (
+    ("jail_id", "jail_id"),
+    ("orig_booking_date", "orig_booking_date"),
+    ("latest_charge_date", "latest_charge_date"),
+    ("content_hash", "content_hash"),
+    ("arrest_date", "arrest_date"),
+    ("agency", "arrest_agency"),
+    ("location", "arrest_location"),
+    ("name", "name"),
+    ("dob", "date_of_birth"),
+    ("eye_color", "eye_color"),
+    ("hair_color", "hair_color"),
+    ("height", "height"),
+    ("weight", "weight"),
+    ("race", "race"),
+    ("sex", "sex"),
+    ("occupation", "occupation"),
+    ("recorded", "recorded"),
+)
+
+create_staging = (
+    "CREATE TEMP TABLE IF NOT EXISTS staging_entries ("
+    "  position serial, "
+    "  jail_id varchar(9), "
+    "  orig_booking_date timestamptz, "
+    "  latest_charge_date timestamptz, "
+    "  content_hash char(40), "
+    "  arrest_date timestamptz, "
+    "  agency varchar(256), "
+    "  location varchar(256), "
+    "  name varchar(256), "
+    "  dob date, "
+    "  eye_color char(3), "
+    "  hair_color char(3), "
+    "  height varchar(8), "
+    "  weight integer, "
+    "  race char(1), "
+    "  sex char(1), "
+    "  occupation varchar(256), "
+    "  recorded jsonb"
+    "); "
+    "TRUNCATE staging_entries"
+)
+
+copy_staging = (
+    "COPY staging_entries ({}) FROM STDIN"
+    .format(", ".join(column for column, _ in staging_columns))
+)
+
+# Keep the last entry for each jail id, as the row-wise path would.
+dedupe_staging = (
+    "DELETE FROM staging_entries AS s "
+    "USING staging_entries AS t "
+    "WHERE s.jail_id = t.jail_id "
+    "  AND s.position < t.position"
+)
+
+delete_unchanged_staging = (
+    "DELETE FROM staging_entries AS s "
+    "USING booking "
+    "WHERE s.jail_id = booking.jail_id "
+    "  AND s.content_hash = booking.content_hash"
+)
+
+count_staging = (
+    "SELECT count(*) FILTER (WHERE booking.id IS NULL), count(*) "
+    "FROM staging_entries AS s "
+    "LEFT JOIN booking ON booking.jail_id = s.jail_id"
+)
+
+merge_entries = (
+    "INSERT INTO booking "
+    "(jail_id, orig_booking_date, latest_charge_date, content_hash) "
+    "SELECT jail_id, orig_booking_date, latest_charge_date, content_hash "
+    "FROM staging_entries "
+    "ON CONFLICT (jail_id) DO UPDATE "
+    "SET jail_id = EXCLUDED.jail_id, "
+    "  orig_booking_date = EXCLUDED.orig_booking_date, "
+    "  latest_charge_date = EXCLUDED.latest_charge_date, "
+    "  content_hash = EXCLUDED.content_hash "
+    "RETURNING id"
+)
+
+merge_arrests = (
+    "INSERT INTO arrests "
+    "(booking_id, arrest_date, agency, location) "
+    "SELECT booking.id, s.arrest_date, s.agency, s.location "
+    "FROM staging_entries AS s "
+    "JOIN booking ON booking.jail_id = s.jail_id "
+    "ON CONFLICT (booking_id) DO UPDATE "
+    "SET arrest_date = EXCLUDED.arrest_date, "
+    "  agency = EXCLUDED.agency, "
+    "  location = EXCLUDED.location"
+)
+
+merge_inmates = (
+    "INSERT INTO inmates "
+    "(booking_id, name, dob, eye_color, hair_color, height, weight, race, sex, occupation) "
+    "SELECT booking.id, s.name, s.dob, s.eye_color, s.hair_color, s.height, s.weight, s.race, s.sex, s.occupation "
+    "FROM staging_entries AS s "
+    "JOIN booking ON booking.jail_id = s.jail_id "
+    "ON CONFLICT (booking_id) DO UPDATE "
+    "SET name = EXCLUDED.name, "
+    "  dob = EXCLUDED.dob, "
+    "  eye_color = EXCLUDED.eye_color, "
+    "  hair_color = EXCLUDED.hair_color, "
+    "  height = EXCLUDED.height, "
+    "  weight = EXCLUDED.weight, "
+    "  race = EXCLUDED.race, "
+    "  sex = EXCLUDED.sex, "
+    "  occupation = EXCLUDED.occupation"
+)
+
+merge_charges = (
+    "INSERT INTO charges "
+    "(booking_id, recorded) "
+    "SELECT booking.id, s.recorded "
+    "FROM staging_entries AS s "
+    "JOIN booking ON booking.jail_id = s.jail_id "
+    "ON CONFLICT (booking_id) DO UPDATE "
+    "SET recorded = EXCLUDED.recorded"
+)
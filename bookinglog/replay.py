@@ -0,0 +1,245 @@
+"""Replay archived Marin County Jail Booking Log pages.
+
+Parse, convert and ingest pages from a page archive, in the order they
+were fetched. Pages are parsed and converted in worker processes, and
+each page is written to the database in its own transaction.
+"""
+
+import argparse
+import logging
+import sys
+import time
+
+from . import archive
+from . import config
+from . import db
+from . import metrics
+from . import pipeline
+from . import pull
+from . import rollups
+from .scrape import ingest_modes
+from collections import Counter
+from datetime import datetime
+from functools import partial
+
+
+def select(records, search_types=None, since=None, until=None,
+           duplicates=False):
+    """Filter archive index records.
+
+    Parameters
+    ----------
+    records : iterable of dicts
+        Archive index records.
+    search_types : collection of str, optional
+        Searches to keep, defaults to all.
+    since, until : str, optional
+        Keep pages fetched on or after `since` and before `until`, as
+        ISO 8601 dates or times (UTC).
+    duplicates : bool
+        Whether to keep pages identical to the previous fetch of the
+        same search.
+    """
+
+    for record in records:
+        if search_types and record["search"] not in search_types:
+            continue
+        if since is not None and record["fetched_at"] < since:
+            continue
+        if until is not None and record["fetched_at"] >= until:
+            continue
+        if record["duplicate"] and not duplicates:
+            continue
+        yield record
+
+def parse_fetched_at(fetched_at):
+    """Parse the (UTC) time of an archived fetch."""
+
+    fmt = "%Y-%m-%dT%H:%M:%S.%f" if "." in fetched_at else "%Y-%m-%dT%H:%M:%S"
+    return datetime.strptime(fetched_at, fmt)
+
+def convert_page(root, parser, record):
+    """Parse and convert an archived page.
+
+    Returns
+    -------
+    record : dict
+        The page's index record.
+    entries : list of tuples of (dict, list of dicts), or None
+        Converted entries, or None if the page couldn't be parsed.
+    counts : collections.Counter
+        See `pipeline.convert`.
+    """
+
+    counts = Counter()
+    try:
+        html = archive.load(root, record["digest"])
+        entries = pull.iter_parse(html, engine=parser)
+        converted = list(pipeline.convert(entries, counts))
+    except Exception as e:
+        logging.error("Failed parsing %s with %s", record["digest"], e)
+        converted = None
+    return record, converted, counts
+
+def make_argparser():
+    parser = argparse.ArgumentParser(
+        prog="bookinglog replay",
+        description=__doc__
+    )
+    parser.add_argument(
+        "-a", "--archive",
+        help="Page archive directory",
+        type=str,
+        required=config.archive_dir is None,
+        default=config.archive_dir
+    )
+    parser.add_argument(
+        "-s", "--search",
+        help="Only replay pages from these searches",
+        type=str,
+        nargs="+",
+        required=False,
+        choices=tuple(pull.searches)
+    )
+    parser.add_argument(
+        "--since",
+        help="Only replay pages fetched on or after this UTC date",
+        type=str,
+        required=False
+    )
+    parser.add_argument(
+        "--until",
+        help="Only replay pages fetched before this UTC date",
+        type=str,
+        required=False
+    )
+    parser.add_argument(
+        "--duplicates",
+        help="Also replay pages identical to the previous fetch",
+        action="store_true"
+    )
+    parser.add_argument(
+        "-w", "--workers",
+        help="Number of processes to parse pages with",
+        type=int,
+        required=False,
+        default=1
+    )
+    parser.add_argument(
+        "-p", "--parser",
+        help="Page parser to use",
+        type=str,
+        required=False,
+        choices=tuple(pull.engines),
+        default=pull.DEFAULT_ENGINE
+    )
+    parser.add_argument(
+        "-i", "--ingest",
+        help=(
+            "How to write entries: a statement per row, multi-row upserts "
+            "or COPY"
+        ),
+        type=str,
+        required=False,
+        choices=tuple(ingest_modes),
+        default="row"
+    )
+    parser.add_argument(
+        "-b", "--batch",
+        help="Write entries using multi-row upserts, same as --ingest=batch",
+        dest="ingest",
+        action="store_const",
+        const="batch"
+    )
+    parser.add_argument(
+        "-c", "--chunk-size",
+        help="Number of entries to write at a time",
+        type=int,
+        required=False,
+        default=500
+    )
+    parser.add_argument(
+        "-m", "--metrics-file",
+        help="Prometheus text file to write timings and counts to",
+        type=str,
+        required=False,
+        default=config.metrics_file
+    )
+    return parser
+
+def main(root, search_types=None, since=None, until=None, duplicates=False,
+         workers=1, ingest_mode="row", parser=pull.DEFAULT_ENGINE,
+         chunk_size=500, metrics_file=None):
+    ingest_fn = ingest_modes[ingest_mode]
+    records = select(
+        archive.index(root),
+        search_types=search_types,
+        since=since,
+        until=until,
+        duplicates=duplicates
+    )
+    convert = partial(convert_page, root, parser)
+
+    status = 0
+    totals = Counter()
+    start = time.perf_counter()
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        pages = pipeline.imap(convert, records, workers=workers)
+        for record, entries, counts in pages:
+            if entries is None:
+                status = 1
+                continue
+
+            try:
+                pipeline.write(entries, cursor, ingest_fn, chunk_size, counts)
+                rollups.record_coverage(
+                    record["search"],
+                    cursor,
+                    scraped_at=parse_fetched_at(record["fetched_at"])
+                )
+            except Exception as e:
+                logging.critical(
+                    "Failed ingest of %s with %s", record["digest"], e)
+                conn.rollback()
+                status = 1
+                continue
+
+            conn.commit()
+            totals.update(counts)
+            totals["pages"] += 1
+            logging.info(
+                "Replayed %s page fetched at %s: %s entries, "
+                "%s inserted, %s updated",
+                record["search"], record["fetched_at"], counts["parsed"],
+                counts["inserted"], counts["updated"])
+
+    elapsed = time.perf_counter() - start
+    logging.info(
+        "Replayed %s pages: %s entries (%s failed conversion), "
+        "%s inserted, %s updated, %s unchanged",
+        totals["pages"], totals["parsed"], totals["failed"],
+        totals["inserted"], totals["updated"], totals["unchanged"])
+    logging.info(
+        "Replayed in %.1fs (%.0f entries/s)",
+        elapsed, totals["ingested"] / elapsed)
+    metrics.report(metrics_file)
+    return status
+
+
+if __name__ == "__main__":
+    parser = make_argparser()
+    args = parser.parse_args()
+    status = main(
+        args.archive,
+        search_types=args.search,
+        since=args.since,
+        until=args.until,
+        duplicates=args.duplicates,
+        workers=args.workers,
+        ingest_mode=args.ingest,
+        parser=args.parser,
+        chunk_size=args.chunk_size,
+        metrics_file=args.metrics_file
+    )
+    sys.exit(status)
@@ -0,0 +1,68 @@
+"""Maintain summary tables alongside ingested entries."""
+
+from datetime import datetime
+
+from . import dates
+from . import queries
+
+import pytz
+
+
+def booking_dates(entries):
+    """Get the (Pacific) dates of original booking of entries."""
+
+    return {
+        inmate["orig_booking_date"].astimezone(dates.PACIFIC).date()
+        for inmate, _ in entries
+        if inmate["orig_booking_date"] is not None
+    }
+
+def stored_booking_dates(entries, cursor):
+    """Get the (Pacific) dates of original booking of entries as they're
+    stored, before they're written.
+    """
+
+    jail_ids = [inmate["jail_id"] for inmate, _ in entries]
+    if not jail_ids:
+        return set()
+    cursor.execute(queries.select_booking_dates, {"jail_ids": jail_ids})
+    return {day for day, in cursor.fetchall()}
+
+def refresh_arrivals(entries, cursor, previous=()):
+    """Recount daily arrivals on the booking dates of entries.
+
+    Parameters
+    ----------
+    entries : list
+    cursor : database cursor
+    previous : iterable of dates
+        Booking dates of the entries before they were written, see
+        `stored_booking_dates`, which are recounted as well so that
+        bookings whose date changed aren't still counted on their old
+        date.
+    """
+
+    days = sorted(booking_dates(entries) | set(previous))
+    if days:
+        cursor.execute(queries.refresh_daily_arrivals, {"dates": days})
+
+def record_coverage(search_type, cursor, scraped_at=None):
+    """Record that a search was scraped.
+
+    Parameters
+    ----------
+    search_type : str
+    cursor : database cursor
+    scraped_at : datetime, optional
+        When the search was scraped, in UTC. Defaults to now.
+    """
+
+    if scraped_at is None:
+        scraped_at = datetime.utcnow()
+    scraped_at = pytz.utc.localize(scraped_at)
+
+    cursor.execute(queries.insert_coverage, {
+        "scrape_date": scraped_at.astimezone(dates.PACIFIC).date(),
+        "search": search_type,
+        "scraped_at": scraped_at,
+    })
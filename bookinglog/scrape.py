@@ -5,21 +5,30 @@ results. Valid searches are:
 
     latest : entries in the last 48 hours.
     current : all inmates currently in custody.
+
+Entries which fail conversion are logged and skipped, and the rest of
+the page is still ingested, but the scrape then exits with a non-zero
+status so that the failures aren't missed.
+
+Searches for specific inmates by last name are run by `bookinglog.crawl`.
 """
-# Not supported:
-# last-name : search for a specific inmate by last name.
 
 import argparse
 import json
 import logging
-import psycopg2
 import sys
 
-from . import coerce
+from . import archive
+from . import bulk
+from . import changes
 from . import config
+from . import db
+from . import metrics
+from . import pipeline
 from . import queries
 from . import pull
-from itertools import starmap
+from . import rollups
+from psycopg2.extras import execute_values
 
 
 logging.basicConfig(**config.logging_cfg)
@@ -28,6 +37,9 @@ logging.basicConfig(**config.logging_cfg)
 def ingest(entries, cursor):
     """Add booking log entries to database.
 
+    Entries which are unchanged since they were last ingested are
+    skipped.
+
     Parameters
     ----------
     entries : iterable of dicts
@@ -36,69 +48,367 @@ def ingest(entries, cursor):
 
     Returns
     -------
-    None
+    counts : collections.Counter
+        Number of bookings "inserted", "updated" and "unchanged".
     """
 
+    entries, counts = changes.detect(list(entries), cursor)
+    previous = rollups.stored_booking_dates(entries, cursor)
+    booking_ids = []
+
     for inmate_table, charges in entries:
         record = inmate_table.copy()
-        cursor.execute(queries.insert_entry, record)
+        db.execute(cursor, "insert_entry", record)
         booking_id = cursor.fetchone()[0]
         record["booking_id"] = booking_id
+        booking_ids.append(booking_id)
 
         charges_record = {
             "booking_id": booking_id,
             "recorded": json.dumps(charges),
         }
 
-        cursor.execute(queries.insert_arrest, record)
-        cursor.execute(queries.insert_inmate, record)
-        cursor.execute(queries.insert_charge, charges_record)
+        db.execute(cursor, "insert_arrest", record)
+        db.execute(cursor, "insert_inmate", record)
+        db.execute(cursor, "insert_charge", charges_record)
+
+    if booking_ids:
+        cursor.execute(
+            queries.refresh_charge_items, {"booking_ids": booking_ids})
+        rollups.refresh_arrivals(entries, cursor, previous)
+
+    return counts
+
+def ingest_batch(entries, cursor):
+    """Add booking log entries to database using multi-row upserts.
+
+    Equivalent to `ingest`, but each table is written with a single
+    statement so that the number of round-trips to the database does
+    not depend on the number of entries.
+
+    Parameters
+    ----------
+    entries : iterable of dicts
+        Iterable of booking log entries to input.
+    cursor : database cursor
+
+    Returns
+    -------
+    counts : collections.Counter
+        Number of bookings "inserted", "updated" and "unchanged".
+    """
+
+    entries, counts = changes.detect(list(entries), cursor)
+
+    # An upsert can't touch the same row twice, so keep only the last
+    # entry for each jail id - as the row-wise path would.
+    records = {}
+    for inmate_table, charges in entries:
+        record = inmate_table.copy()
+        record["recorded"] = json.dumps(charges)
+        records[record["jail_id"]] = record
+
+    if not records:
+        return counts
+
+    rows = list(records.values())
+    page_size = len(rows)
+    previous = rollups.stored_booking_dates(entries, cursor)
 
-    return
+    # execute_values sends its pages as bytes, which the cursor can't
+    # name, so each statement is timed here.
+    with metrics.timer("query.insert_entries"):
+        returned = execute_values(
+            cursor,
+            queries.insert_entries,
+            rows,
+            template=queries.entry_values,
+            page_size=page_size,
+            fetch=True
+        )
+    booking_ids = dict(returned)
+    for record in rows:
+        record["booking_id"] = booking_ids[record["jail_id"]]
+
+    tables = (
+        ("insert_arrests", queries.insert_arrests, queries.arrest_values),
+        ("insert_inmates", queries.insert_inmates, queries.inmate_values),
+        ("insert_charges", queries.insert_charges, queries.charge_values),
+    )
+    for name, query, template in tables:
+        with metrics.timer("query." + name):
+            execute_values(
+                cursor,
+                query,
+                rows,
+                template=template,
+                page_size=page_size
+            )
+
+    cursor.execute(
+        queries.refresh_charge_items,
+        {"booking_ids": list(booking_ids.values())}
+    )
+    rollups.refresh_arrivals(entries, cursor, previous)
+
+    return counts
+
+ingest_modes = {
+    "row": ingest,
+    "batch": ingest_batch,
+    "copy": bulk.load,
+}
+
+def make_argparser(engines=True, searches=True):
+    """Make the command line parser, with the choice of engine unless
+    `engines` is false and of searches unless `searches` is false.
+    """
 
-def make_argparser():
     parser = argparse.ArgumentParser(prog="bookinglog", description=__doc__)
+    if searches:
+        parser.add_argument(
+            "-s", "--search",
+            help="Type of search to perform, several may be given",
+            type=str,
+            nargs="+",
+            required=False,
+            choices=tuple(pull.searches),
+            default=["latest"]
+        )
+    parser.add_argument(
+        "-p", "--parser",
+        help="Page parser to use",
+        type=str,
+        required=False,
+        choices=tuple(pull.engines),
+        default=pull.DEFAULT_ENGINE
+    )
     parser.add_argument(
-        "-s", "--search",
-        help="Type of search to perform",
+        "-i", "--ingest",
+        help=(
+            "How to write entries: a statement per row, multi-row upserts "
+            "or COPY"
+        ),
         type=str,
         required=False,
-        choices=("latest", "current"),
-        default="latest"
+        choices=tuple(ingest_modes),
+        default="row"
+    )
+    parser.add_argument(
+        "-b", "--batch",
+        help="Write entries using multi-row upserts, same as --ingest=batch",
+        dest="ingest",
+        action="store_const",
+        const="batch"
+    )
+    parser.add_argument(
+        "-c", "--chunk-size",
+        help="Number of entries to write at a time",
+        type=int,
+        required=False,
+        default=500
+    )
+    parser.add_argument(
+        "-a", "--archive",
+        help="Directory to archive fetched pages in",
+        type=str,
+        required=False,
+        default=config.archive_dir
+    )
+    parser.add_argument(
+        "-w", "--workers",
+        help="Number of processes to parse pages with",
+        type=int,
+        required=False,
+        default=1
+    )
+    parser.add_argument(
+        "-m", "--metrics-file",
+        help="Prometheus text file to write timings and counts to",
+        type=str,
+        required=False,
+        default=config.metrics_file
+    )
+    if not engines:
+        return parser
+
+    parser.add_argument(
+        "-e", "--engine",
+        help=(
+            "Run searches one after another, or concurrently with asyncio"
+        ),
+        type=str,
+        required=False,
+        choices=("sync", "async"),
+        default="sync"
+    )
+    parser.add_argument(
+        "--concurrency",
+        help="Number of pages to fetch at a time with the async engine",
+        type=int,
+        required=False,
+        default=4
     )
     return parser
 
-def main(search_type):
-    logging.info("Running with search argument: %s", search_type)
+def archive_page(archive_dir, html, search_type):
+    """Add a page to the archive, logging rather than raising errors."""
 
-    with psycopg2.connect(**config.pg_kwargs) as conn:
-        try:
-            logging.info("Starting ingest")
-            html = pull.scrape(search_type)
-            entries = pull.parse(html)
-            converted_entries = starmap(coerce.convert, entries)
-        except Exception as e:
-            logging.critical("Failed scraping with %s", e)
-            return 1
-        else:
-            logging.info("Scraped %s entries", len(entries))
-
-        try:
-            cursor = conn.cursor()
-            ingest(converted_entries, cursor)
-        except Exception as e:
-            logging.critical("Failed ingest with %s", e)
-            conn.rollback()
-            return 1
+    try:
+        record = archive.store(archive_dir, html, search_type)
+    except OSError as e:
+        logging.error("Failed archiving page with %s", e)
+    else:
+        logging.info("Archived page as %s", record["digest"])
+
+def ingest_page(html, search_type, conn, ingest_fn=ingest,
+                parser=pull.DEFAULT_ENGINE, chunk_size=500, workers=1):
+    """Ingest a page in a single transaction, and record the search.
+
+    With more than one worker, the page is parsed and converted in
+    worker processes, see `pipeline.run_parallel`. The transaction is
+    rolled back if ingest fails.
+
+    Returns
+    -------
+    counts : collections.Counter
+        Number of entries "parsed", which "failed" conversion, and
+        were "ingested", "inserted", "updated" and "unchanged".
+    """
+
+    # Entries are parsed, converted and written as the page is
+    # read, so parse errors surface during ingest.
+    try:
+        cursor = conn.cursor()
+        if workers > 1:
+            counts = pipeline.run_parallel(
+                html, cursor, ingest_fn, parser, workers, chunk_size)
         else:
-            logging.info("Ingested to db")
-            conn.commit()
+            entries = pull.iter_parse(html, engine=parser)
+            counts = pipeline.run(entries, cursor, ingest_fn, chunk_size)
+        rollups.record_coverage(search_type, cursor)
+    except Exception:
+        conn.rollback()
+        raise
+
+    conn.commit()
+    return counts
 
+def log_counts(counts):
+    logging.info(
+        "Scraped %s entries (%s failed conversion)",
+        counts["parsed"], counts["failed"])
+    logging.info(
+        "Ingested %s entries to db: %s inserted, %s updated, "
+        "%s unchanged",
+        counts["ingested"], counts["inserted"], counts["updated"],
+        counts["unchanged"])
+
+def page_status(counts):
+    """Status of an ingested page, non-zero if any entry failed
+    conversion.
+    """
+
+    if counts["failed"]:
+        logging.error(
+            "%s entries failed conversion and weren't ingested",
+            counts["failed"])
+        return 1
     return 0
 
+def run(search_type, session, conn, ingest_fn=ingest,
+        parser=pull.DEFAULT_ENGINE, chunk_size=500, archive_dir=None,
+        workers=1):
+    """Scrape a search and ingest the results in a single transaction.
+
+    The page is added to the archive at `archive_dir`, if given. See
+    `ingest_page` for how it is ingested.
+
+    Returns
+    -------
+    status : int
+        Zero on success, see `page_status`.
+    """
+
+    logging.info("Running with search argument: %s", search_type)
+
+    try:
+        logging.info("Starting ingest")
+        html = pull.scrape(search_type, session=session, **config.http_kwargs)
+    except Exception as e:
+        logging.critical("Failed scraping with %s", e)
+        return 1
+
+    if archive_dir is not None:
+        archive_page(archive_dir, html, search_type)
+
+    try:
+        counts = ingest_page(
+            html, search_type, conn, ingest_fn, parser, chunk_size, workers)
+    except Exception as e:
+        logging.critical("Failed ingest with %s", e)
+        return 1
+
+    log_counts(counts)
+    return page_status(counts)
+
+def main(*search_types, ingest_mode="row", parser=pull.DEFAULT_ENGINE,
+         chunk_size=500, archive_dir=None, workers=1, engine="sync",
+         concurrency=4, metrics_file=None):
+    """Run each search in turn, over the same HTTP session and
+    database connection.
+
+    With the "async" engine, searches are run concurrently instead,
+    see `aio.main`. Metrics of the run are logged, and written to
+    `metrics_file` if given, see `metrics.report`.
+    """
+
+    if engine == "async":
+        from . import aio
+        status = aio.main(
+            *search_types,
+            ingest_mode=ingest_mode,
+            parser=parser,
+            chunk_size=chunk_size,
+            archive_dir=archive_dir,
+            workers=workers,
+            concurrency=concurrency
+        )
+        metrics.report(metrics_file)
+        return status
+
+    ingest_fn = ingest_modes[ingest_mode]
+    status = 0
+
+    with pull.make_session() as session, db.connection() as conn:
+        for search_type in search_types:
+            status |= run(
+                search_type,
+                session,
+                conn,
+                ingest_fn=ingest_fn,
+                parser=parser,
+                chunk_size=chunk_size,
+                archive_dir=archive_dir,
+                workers=workers
+            )
+
+    metrics.report(metrics_file)
+    return status
+
 
 if __name__ == "__main__":
     parser = make_argparser()
     args = parser.parse_args()
-    status = main(args.search)
+    status = main(
+        *args.search,
+        ingest_mode=args.ingest,
+        parser=args.parser,
+        chunk_size=args.chunk_size,
+        archive_dir=args.archive,
+        workers=args.workers,
+        engine=args.engine,
+        concurrency=args.concurrency,
+        metrics_file=args.metrics_file
+    )
     sys.exit(status)
@@ -0,0 +1,125 @@
+"""Streaming parser for the Booking Log results page.
+
+An alternative to the BeautifulSoup based parser in `pull`, built on
+lxml's incremental HTML parser. Inmate sections are parsed and emitted
+as soon as they have been read, and discarded afterwards, rather than
+building and searching a tree of the whole document.
+
+Output is the same `(inmate, charges)` pairs as `pull.parse`.
+"""
+
+from bs4 import UnicodeDammit
+from itertools import chain
+from lxml import etree
+
+
+# Characters of the page to feed the parser at a time.
+FEED_SIZE = 2 ** 16
+
+
+def text(element):
+    """Get the stripped text content of an element."""
+    return "".join(element.itertext()).strip()
+
+# Parse charge tables (columns)
+def parse_columns(table):
+    """Extract column names and return as an ordered list."""
+
+    return [
+        text(col) for col in table.iter("th")
+        if col.get("scope") == "col"
+    ]
+
+def parse_charges(table):
+    """Extract charge entries and return as a list of maps."""
+
+    columns = parse_columns(table)
+
+    processed = []
+    for row in table.iter("tr"):
+        entries = [text(entry) for entry in row.iter("td")]
+        # The first row gives the column names and does not have
+        # td children -- skip it.
+        if entries:
+            processed.append(dict(zip(columns, entries)))
+
+    return processed
+
+# Parse arrest and personal tables (key-values pairs displayed columnwise)
+def parse_row(row):
+    """Extract key-value pair from a row."""
+
+    key = text(next(row.iter("th"))).strip(":")
+    value = text(next(row.iter("td")))
+    return key, value
+
+def parse_table(table):
+    """Extract key-values from table."""
+
+    pairs = {}
+    for row in table.iter("tr"):
+        key, value = parse_row(row)
+        # Keep the first value seen for a key, as `pull.parse_table`.
+        pairs.setdefault(key, value)
+    return pairs
+
+def release(element):
+    """Free a parsed element, and anything parsed before it."""
+
+    element.clear()
+    for node in chain([element], element.iterancestors()):
+        parent = node.getparent()
+        while parent is not None and node.getprevious() is not None:
+            del parent[0]
+
+def iter_events(markup, feed_size=FEED_SIZE):
+    """Parse page source incrementally, yielding the end of each div."""
+
+    parser = etree.HTMLPullParser(events=("end",), tag="div")
+    for start in range(0, len(markup), feed_size):
+        parser.feed(markup[start:start + feed_size])
+        for event in parser.read_events():
+            yield event
+    parser.close()
+    for event in parser.read_events():
+        yield event
+
+def parse(html):
+    """Parse inmate entries from page source.
+
+    Parameters
+    ----------
+    html : str or bytes
+        Booking Log results page source.
+
+    Yields
+    ------
+    entry : tuple of (dict, list of dicts)
+        Inmate information and the inmate's charges.
+    """
+
+    # Decode as BeautifulSoup would, so that both parsers agree on
+    # the text of pages which don't declare an encoding. The decoded
+    # page is fed to the parser in slices, rather than copied again.
+    markup = UnicodeDammit(html).unicode_markup
+    events = iter_events(markup, FEED_SIZE)
+
+    # Each inmate has three tables:
+    # Arrest | Personal
+    # -----------------
+    #      Charges
+    inmate = None
+    for _, element in events:
+        section = element.get("id")
+        if section == "sec1":
+            arrest_table, personal_table = element.iter("table")
+            inmate = {
+                **parse_table(arrest_table),
+                **parse_table(personal_table),
+            }
+            release(element)
+        elif section == "sec2" and inmate is not None:
+            charges = parse_charges(element)
+            release(element)
+            yield inmate, charges
+            inmate = None
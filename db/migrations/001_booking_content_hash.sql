@@ -0,0 +1,4 @@
+/* Store a hash of each ingested entry, so that unchanged bookings can be
+ * skipped. Existing bookings have no hash and are rewritten the next time
+ * they are scraped. */
+alter table booking add column content_hash char(40);
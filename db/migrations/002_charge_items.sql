@@ -0,0 +1,47 @@
+/* Expand charges into a table with a row per charge, so that the charges_t
+ * view no longer expands every jsonb array when read. */
+begin;
+
+create table charge_items (
+    id serial primary key,
+    booking_id integer not null,
+    position integer not null,
+    charge varchar(256),
+    description text,
+    level varchar(1),
+    bail integer,
+    charge_authority varchar(256),
+    unique (booking_id, position),
+    foreign key (booking_id) references booking(id)
+);
+
+insert into charge_items
+(booking_id, position, charge, description, level, bail, charge_authority)
+select
+    charges.booking_id,
+    item.position,
+    lower(item.record ->> 'charge'),
+    lower(item.record ->> 'description'),
+    lower(item.record ->> 'level'),
+    cast(item.record ->> 'bail' as integer),
+    lower(item.record ->> 'charge_authority')
+from charges,
+    jsonb_array_elements(charges.recorded) with ordinality as item(record, position);
+
+create index charge_items_booking_fk_idx on charge_items (booking_id);
+create index charge_items_level_idx on charge_items (level);
+create index charge_items_charge_idx on charge_items (charge);
+
+drop view if exists charges_t;
+create view charges_t as (
+    select
+        booking_id,
+        bail,
+        level,
+        charge,
+        description,
+        charge_authority
+    from charge_items
+);
+
+commit;
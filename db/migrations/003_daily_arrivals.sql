@@ -0,0 +1,31 @@
+/* Add a daily arrivals rollup, backfilled from existing bookings, and a
+ * record of scrape coverage. Booking times are stored in the session time
+ * zone they were written with, and are converted to Pacific dates. */
+begin;
+
+create table daily_arrivals (
+    booking_date date primary key,
+    n integer not null
+);
+
+create table scrape_coverage (
+    scrape_date date not null,
+    search varchar(16) not null,
+    runs integer not null,
+    first_scraped_at timestamp,
+    last_scraped_at timestamp,
+    primary key (scrape_date, search)
+);
+
+create index booking_orig_booking_date_idx on booking (orig_booking_date);
+
+insert into daily_arrivals (booking_date, n)
+select
+    cast((orig_booking_date at time zone current_setting('TimeZone'))
+         at time zone 'US/Pacific' as date) as booking_date,
+    count(*)
+from booking
+where orig_booking_date is not null
+group by 1;
+
+commit;
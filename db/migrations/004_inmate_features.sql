@@ -0,0 +1,28 @@
+/* Add a table of precomputed inmate features. It is filled by running
+ * model/feature_store.py, which computes features for every booking the
+ * first time it is run. */
+begin;
+
+create table inmate_features (
+    booking_id integer primary key,
+    version integer not null,
+    content_hash char(40),
+    age integer,
+    race char(1),
+    sex char(1),
+    occupation varchar(256),
+    male boolean,
+    unemployed boolean,
+    felonies integer not null,
+    misdemeanors integer not null,
+    infractions integer not null,
+    level_unknowns integer not null,
+    n_charges integer not null,
+    total_bail bigint,
+    drug boolean not null,
+    violent boolean not null,
+    updated_at timestamp not null default now(),
+    foreign key (booking_id) references booking(id)
+);
+
+commit;
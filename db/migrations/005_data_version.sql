@@ -0,0 +1,38 @@
+/* Add a data version, bumped by every statement which writes to the tables
+ * analyses read, so that model/loader.py can tell whether cached results
+ * are stale without scanning the tables. A sequence rather than a counter
+ * row, so that concurrent writers don't wait on each other. */
+begin;
+
+create sequence data_version;
+
+create function bump_data_version() returns trigger as $$
+begin
+    perform nextval('data_version');
+    return null;
+end;
+$$ language plpgsql;
+
+create trigger booking_data_version
+    after insert or update or delete or truncate on booking
+    for each statement execute procedure bump_data_version();
+create trigger arrests_data_version
+    after insert or update or delete or truncate on arrests
+    for each statement execute procedure bump_data_version();
+create trigger inmates_data_version
+    after insert or update or delete or truncate on inmates
+    for each statement execute procedure bump_data_version();
+create trigger charges_data_version
+    after insert or update or delete or truncate on charges
+    for each statement execute procedure bump_data_version();
+create trigger charge_items_data_version
+    after insert or update or delete or truncate on charge_items
+    for each statement execute procedure bump_data_version();
+create trigger inmate_features_data_version
+    after insert or update or delete or truncate on inmate_features
+    for each statement execute procedure bump_data_version();
+create trigger scrape_coverage_data_version
+    after insert or update or delete or truncate on scrape_coverage
+    for each statement execute procedure bump_data_version();
+
+commit;
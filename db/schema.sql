@@ -2,7 +2,8 @@ create table booking (
     id serial primary key,
     jail_id varchar(9) unique, /* natural key */
     orig_booking_date timestamp,
-    latest_charge_date timestamp
+    latest_charge_date timestamp,
+    content_hash char(40) /* sha1 of the ingested entry */
 );
 
 create table arrests (
@@ -44,8 +45,105 @@ create table charges (
     foreign key (booking_id) references booking(id)
 );
 
+/* Charges expanded to a row per charge, in the order they are listed.
+ * Written from charges.recorded on ingest, with text lower cased. */
+create table charge_items (
+    id serial primary key,
+    booking_id integer not null,
+    position integer not null,
+    charge varchar(256),
+    description text,
+    level varchar(1),
+    bail integer,
+    charge_authority varchar(256),
+    unique (booking_id, position),
+    foreign key (booking_id) references booking(id)
+);
+
+/* Number of bookings by date of original booking, in Pacific time.
+ * Maintained on ingest for the dates of ingested bookings. */
+create table daily_arrivals (
+    booking_date date primary key,
+    n integer not null
+);
+
+/* Days (Pacific time) on which each search was scraped, so that days
+ * without arrivals can be told apart from days without data. */
+create table scrape_coverage (
+    scrape_date date not null,
+    search varchar(16) not null,
+    runs integer not null,
+    first_scraped_at timestamp,
+    last_scraped_at timestamp,
+    primary key (scrape_date, search)
+);
+
+
+/* Inmate features for analysis, derived from the tables above by
+ * model/feature_store.py. Rows record the version of the derivation and the
+ * booking's content hash they were derived from, so only new or changed
+ * bookings need to be recomputed. */
+create table inmate_features (
+    booking_id integer primary key,
+    version integer not null,
+    content_hash char(40),
+    age integer,
+    race char(1),
+    sex char(1),
+    occupation varchar(256),
+    male boolean,
+    unemployed boolean,
+    felonies integer not null,
+    misdemeanors integer not null,
+    infractions integer not null,
+    level_unknowns integer not null,
+    n_charges integer not null,
+    total_bail bigint,
+    drug boolean not null,
+    violent boolean not null,
+    updated_at timestamp not null default now(),
+    foreign key (booking_id) references booking(id)
+);
 
 create index jail_id_idx on booking (jail_id);
+create index booking_orig_booking_date_idx on booking (orig_booking_date);
 create index arrests_booking_fk_idx on arrests (booking_id);
 create index inmates_booking_fk_idx on inmates (booking_id);
 create index charges_booking_fk_idx on charges (booking_id);
+create index charge_items_booking_fk_idx on charge_items (booking_id);
+create index charge_items_level_idx on charge_items (level);
+create index charge_items_charge_idx on charge_items (charge);
+
+/* Bumped by every statement which writes to the tables above, so that
+ * model/loader.py can tell whether cached results are stale without
+ * scanning them. */
+create sequence data_version;
+
+create function bump_data_version() returns trigger as $$
+begin
+    perform nextval('data_version');
+    return null;
+end;
+$$ language plpgsql;
+
+create trigger booking_data_version
+    after insert or update or delete or truncate on booking
+    for each statement execute procedure bump_data_version();
+create trigger arrests_data_version
+    after insert or update or delete or truncate on arrests
+    for each statement execute procedure bump_data_version();
+create trigger inmates_data_version
+    after insert or update or delete or truncate on inmates
+    for each statement execute procedure bump_data_version();
+create trigger charges_data_version
+    after insert or update or delete or truncate on charges
+    for each statement execute procedure bump_data_version();
+create trigger charge_items_data_version
+    after insert or update or delete or truncate on charge_items
+    for each statement execute procedure bump_data_version();
+create trigger inmate_features_data_version
+    after insert or update or delete or truncate on inmate_features
+    for each statement execute procedure bump_data_version();
+create trigger scrape_coverage_data_version
+    after insert or update or delete or truncate on scrape_coverage
+    for each statement execute procedure bump_data_version();
@@ -1,29 +1,21 @@
 """EDA on number of daily arrivals."""
 
-from datetime import date, timedelta
+from datetime import date
 import matplotlib.pyplot as plt
 import numpy as np
+import loader
 import pandas as pd
-import psycopg2
-
-from config import pg_kwargs
 
 with open("arrivals.sql", "r") as fh:
     query = fh.read()
 
-# NB: can't differentiate between no arrivals on a given day and
-# missing data - should be possible to cross reference with scraper
-# logs to do this later.
-with psycopg2.connect(**pg_kwargs) as conn:
-    x = pd.read_sql(query, con=conn)
+# NB: days without arrivals have zero counts when the scraper ran, and
+# missing counts when it didn't. Dates are already in California time.
+with loader.connect() as conn:
+    x = loader.load(conn, "arrivals", query)
     x.rename(columns={"n": "counts"}, inplace=True)
 
 
-# Get dates for California.
-offset = timedelta(hours=8)
-pst_dates = x.booking_date - offset
-x.booking_date = pst_dates.dt.date
-
 # Use data that has been collected regularly.
 start_date = date(2016, 8, 1)
 y = x.loc[x.booking_date >= start_date]
@@ -1,22 +1,27 @@
 -- name: query-arrivals
--- Get daily arrival counts.
-with counts as (
-    select
-        orig_booking_date::date as booking_date,
-        count(*) as n
-    from booking
-    group by orig_booking_date::date
-    order by orig_booking_date::date
+-- Get daily arrival counts (Pacific dates). Days without arrivals have a
+-- count of zero if the booking log was scraped for the last 48 hours on the
+-- following day, and a missing count otherwise.
+with coverage as (
+    select distinct scrape_date - 1 as booking_date
+    from scrape_coverage
+    where search = 'latest'
 )
 select
-    t.series as booking_date,
-    counts.n
+    t.series::date as booking_date,
+    case
+        when coverage.booking_date is not null then coalesce(daily_arrivals.n, 0)
+        else daily_arrivals.n
+    end as n,
+    coverage.booking_date is not null as covered
 from (
     select
         generate_series(
-            min(counts.booking_date),
-            max(counts.booking_date),
+            min(booking_date),
+            max(booking_date),
             '1 day'::interval) as series
-    from counts
+    from daily_arrivals
 ) as t
-left outer join counts on t.series = counts.booking_date;
+left outer join daily_arrivals on daily_arrivals.booking_date = t.series::date
+left outer join coverage on coverage.booking_date = t.series::date
+order by t.series;
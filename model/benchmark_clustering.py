@@ -0,0 +1,90 @@
+"""Benchmark scalable clustering against the precomputed distance path.
+
+Inmates are synthesized with the clustering variables of
+`clustering.py`, from a few groups so that there are clusters to find.
+The precomputed path (pairwise distances, HDBSCAN* and metric MDS) is
+only run up to `--max-exact` inmates. Peak memory is as traced by
+`tracemalloc`:
+
+    python benchmark_clustering.py --sizes 1000 2000 4000 20000 50000
+"""
+
+from cluster import cluster, landmark_mds
+from hdbscan import HDBSCAN
+from scipy.spatial import distance
+from sklearn.manifold import MDS
+from sklearn.metrics import adjusted_rand_score
+from sklearn.preprocessing import scale
+
+import argparse
+import numpy as np
+import time
+import tracemalloc
+
+
+def synthesize(n, seed=13):
+    """Make scaled clustering variables of `n` inmates."""
+
+    rng = np.random.RandomState(seed)
+    group = rng.choice(3, size=n, p=[.5, .3, .2])
+    X = np.column_stack([
+        rng.normal([45, 30, 25][0], 12, size=n) + 10 * group,   # age
+        rng.rand(n) < np.array([.1, .6, .2])[group],           # drug
+        rng.poisson(np.array([.2, 1., 2.])[group]),            # felonies
+        rng.poisson(.1, size=n),                               # infractions
+        rng.rand(n) < .8,                                      # male
+        rng.poisson(np.array([1.5, .5, .3])[group]),           # misdemeanors
+        rng.rand(n) < np.array([.3, .5, .2])[group],           # unemployed
+        rng.rand(n) < np.array([.05, .1, .6])[group],          # violent
+    ])
+    return scale(X.astype(float))
+
+def exact(Z):
+    dist = distance.squareform(distance.pdist(Z, "braycurtis"))
+    coords = MDS(
+        n_components=2, dissimilarity="precomputed", max_iter=1000,
+        random_state=13).fit_transform(dist)
+    clusterer = HDBSCAN(min_cluster_size=50, metric="precomputed")
+    return clusterer.fit_predict(dist), coords
+
+def scalable(Z):
+    coords = landmark_mds(Z, random_state=13)
+    return cluster(Z).labels_, coords
+
+def measure(fn, Z):
+    tracemalloc.start()
+    start = time.perf_counter()
+    labels, _ = fn(Z)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return labels, elapsed, peak / 2 ** 20
+
+def make_argparser():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 2000, 4000, 20000])
+    parser.add_argument("--max-exact", type=int, default=4000)
+    return parser
+
+def main(sizes, max_exact):
+    for n in sizes:
+        Z = synthesize(n)
+        candidates = [("scalable", scalable)]
+        if n <= max_exact:
+            candidates.insert(0, ("exact", exact))
+
+        labels = {}
+        for name, fn in candidates:
+            labels[name], elapsed, peak = measure(fn, Z)
+            print("{:>6} {:>8}: {:7.2f}s {:8.1f} MiB peak, {} clusters"
+                  .format(n, name, elapsed, peak, labels[name].max() + 1))
+
+        if "exact" in labels:
+            print("{:>6} adjusted rand index: {:.3f}".format(
+                n, adjusted_rand_score(labels["exact"], labels["scalable"])))
+
+
+if __name__ == "__main__":
+    args = make_argparser().parse_args()
+    main(args.sizes, args.max_exact)
@@ -0,0 +1,90 @@
+"""Benchmark the charge rollup against the per-booking loop it replaced.
+
+Charges are synthesized with a similar shape to the booking log, a few
+charges per booking with some missing levels and bail, and scaled up
+from a base number of charges:
+
+    python benchmark_rollup.py --charges 20000 --scales 1 10 100
+"""
+
+from features import LEVEL_MAPPING, LEVELS, ROLLUP_COLUMNS, rollup_charges
+
+import argparse
+import numpy as np
+import pandas as pd
+import timeit
+
+
+def rollup_charges_loop(charges):
+    """The previous implementation of `features.rollup_charges`."""
+
+    levels = charges.level.map(lambda s: LEVEL_MAPPING.get(s))
+
+    rows = []
+    for booking_id, group in charges.groupby("booking_id"):
+        rows.append({
+            **dict.fromkeys(LEVELS, 0),
+            **levels[group.index].value_counts().to_dict(),
+            "n_charges":  group.shape[0],
+            "total_bail": group.bail.sum(),
+            "drug":       np.any(group.drug),
+            "violent":    np.any(group.violent),
+            "booking_id": booking_id,
+        })
+
+    rollup = pd.DataFrame(rows, columns=["booking_id"] + ROLLUP_COLUMNS)
+    return rollup.set_index("booking_id")
+
+def synthesize(n, seed=13):
+    """Make `n` charges of about n / 3 bookings."""
+
+    rng = np.random.RandomState(seed)
+    levels = np.array(["f", "m", "i", "x", ""], dtype=object)
+    bail = rng.choice([0, 500, 2500, 10000, 50000], size=n).astype(float)
+    bail[rng.rand(n) < 0.05] = np.nan
+    return pd.DataFrame({
+        "booking_id": np.sort(rng.randint(0, max(1, n // 3), size=n)),
+        "level": rng.choice(levels, size=n, p=[.3, .4, .1, .1, .1]),
+        "bail": bail,
+        "drug": rng.rand(n) < 0.2,
+        "violent": rng.rand(n) < 0.1,
+    })
+
+def make_argparser():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--charges", type=int, default=20000)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--skip-loop", type=int, default=100,
+        help="don't time the loop at this scale or larger")
+    return parser
+
+def main(charges, scales, repeat, skip_loop):
+    small = synthesize(1000)
+    pd.testing.assert_frame_equal(
+        rollup_charges(small), rollup_charges_loop(small))
+
+    for scale in scales:
+        n = charges * scale
+        x = synthesize(n)
+
+        candidates = [("vectorized", rollup_charges)]
+        if scale < skip_loop:
+            candidates.insert(0, ("loop", rollup_charges_loop))
+
+        timings = {}
+        for name, fn in candidates:
+            timings[name] = min(timeit.repeat(
+                lambda: fn(x), number=1, repeat=repeat))
+            print("{:>4}x {:>10}: {:.3f}s ({:.0f} charges/s)".format(
+                scale, name, timings[name], n / timings[name]))
+
+        if "loop" in timings:
+            print("{:>4}x    speedup: {:.1f}x".format(
+                scale, timings["loop"] / timings["vectorized"]))
+
+
+if __name__ == "__main__":
+    args = make_argparser().parse_args()
+    main(args.charges, args.scales, args.repeat, args.skip_loop)
@@ -0,0 +1,164 @@
+"""Label charge descriptions as drug and violent crimes.
+
+Both crime classifiers are loaded once, and label batches of descriptions
+together. From Python:
+
+    models = load_models()
+    labels = classify(models, descriptions)
+
+or as a service, which reads requests as a JSON object per line, such as
+`{"descriptions": ["poss cntl sub"]}`, and replies with a line of labels,
+`{"drug": [true], "violent": [false]}`, over stdin and stdout or a unix
+socket, serving each connection on its own thread:
+
+    python classify.py
+    python classify.py --socket /tmp/classify.sock
+
+Use `request` to label descriptions with a running socket service.
+"""
+
+from features_text import load_model, predict
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+
+
+MODEL_NAMES = ("drug", "violent")
+
+
+def load_models(directory=".", mmap_mode=None):
+    """Load the crime classifiers, by name."""
+
+    return {
+        name: load_model(name, directory=directory, mmap_mode=mmap_mode)
+        for name in MODEL_NAMES
+    }
+
+def classify(models, descriptions):
+    """Label descriptions with each model.
+
+    Parameters
+    ----------
+    models : dict
+        Fitted crime classifiers, by name, as given by `load_models`.
+    descriptions : array-like of str
+
+    Returns
+    -------
+    labels : dict
+        The label of each description, by model name.
+    """
+
+    return {
+        name: predict(model, descriptions)
+        for name, model in models.items()
+    }
+
+def respond(models, line):
+    """Label the descriptions of a request line, giving a reply line."""
+
+    try:
+        descriptions = json.loads(line)["descriptions"]
+        if not (isinstance(descriptions, list) and
+                all(isinstance(d, str) for d in descriptions)):
+            raise ValueError("descriptions must be a list of strings")
+        labels = classify(models, descriptions)
+        reply = {name: labels[name].tolist() for name in labels}
+    except (KeyError, TypeError, ValueError) as e:
+        reply = {"error": "{}: {}".format(type(e).__name__, e)}
+
+    return json.dumps(reply) + "\n"
+
+def serve(models, infile, outfile):
+    """Reply to each request line of a file."""
+
+    for line in infile:
+        if line.strip():
+            outfile.write(respond(models, line))
+            outfile.flush()
+
+class Handler(socketserver.StreamRequestHandler):
+    """Reply to the requests of a socket connection."""
+
+    def handle(self):
+        for line in self.rfile:
+            if line.strip():
+                reply = respond(self.server.models, line.decode("utf-8"))
+                self.wfile.write(reply.encode("utf-8"))
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serve each socket connection on its own thread."""
+
+    daemon_threads = True
+
+def make_server(models, path):
+    """Make a server for requests on a unix socket.
+
+    Connections are served concurrently, sharing the models. Any
+    existing file at `path` is replaced.
+    """
+
+    if os.path.exists(path):
+        os.remove(path)
+    server = Server(path, Handler)
+    server.models = models
+    return server
+
+def request(path, descriptions):
+    """Label descriptions with the service listening on a unix socket.
+
+    Returns
+    -------
+    labels : dict
+        The labels of the descriptions, as lists, by model name.
+
+    Raises
+    ------
+    ValueError
+        If the service couldn't label the descriptions.
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        with sock.makefile("rw", encoding="utf-8") as fh:
+            fh.write(json.dumps({"descriptions": list(descriptions)}) + "\n")
+            fh.flush()
+            reply = json.loads(fh.readline())
+
+    if "error" in reply:
+        raise ValueError(reply["error"])
+    return reply
+
+def make_argparser():
+    parser = argparse.ArgumentParser(
+        description="Label charge descriptions as drug and violent crimes.")
+    parser.add_argument(
+        "-m", "--models", default=".",
+        help="directory of the saved models (default: %(default)s)")
+    parser.add_argument(
+        "--mmap", action="store_true",
+        help="memory map the models' arrays")
+    parser.add_argument(
+        "-s", "--socket",
+        help="serve on a unix socket rather than stdin")
+    return parser
+
+
+if __name__ == "__main__":
+    args = make_argparser().parse_args()
+    models = load_models(args.models, mmap_mode="r" if args.mmap else None)
+
+    if args.socket is None:
+        serve(models, sys.stdin, sys.stdout)
+    else:
+        with make_server(models, args.socket) as server:
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.remove(args.socket)
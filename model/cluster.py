@@ -0,0 +1,109 @@
+"""Clustering of inmates which scales to large numbers of inmates.
+
+`clustering.py` computes the full matrix of pairwise distances between
+inmates, for HDBSCAN* and for an MDS embedding to visualize the
+clusters, which takes quadratic time and memory. Here HDBSCAN* finds
+neighbors with a ball tree instead, approximately for Bray-Curtis
+dissimilarity, and the embedding is computed from distances to a sample
+of landmark inmates only (landmark MDS, de Silva and Tenenbaum, 2004),
+so memory grows linearly with the number of inmates.
+"""
+
+from hdbscan import HDBSCAN
+from scipy.spatial import distance
+from sklearn.utils import check_random_state
+
+import numpy as np
+
+
+N_LANDMARKS = 500
+CHUNK_SIZE = 10000
+
+
+def cluster(Z, metric="braycurtis", min_cluster_size=50,
+            algorithm="boruvka_balltree", **kwargs):
+    """Cluster with HDBSCAN*, using a ball tree to find neighbors.
+
+    The ball tree prunes its search with the triangle inequality, which
+    Bray-Curtis dissimilarity doesn't satisfy, so with it the neighbors
+    found, and so the clusters, are approximate. Pass
+    `algorithm="generic"` for exact clusters, which computes every
+    pairwise distance, as `clustering.py` does.
+
+    Parameters
+    ----------
+    Z : numpy.ndarray
+        Scaled clustering variables of each inmate.
+    metric : str
+    min_cluster_size : int
+    algorithm : str
+        HDBSCAN* algorithm, see `hdbscan.HDBSCAN`.
+    **kwargs
+        Passed on to `hdbscan.HDBSCAN`.
+
+    Returns
+    -------
+    clusterer : hdbscan.HDBSCAN
+        The fitted clusterer, with `labels_` and `probabilities_`.
+    """
+
+    clusterer = HDBSCAN(
+        min_cluster_size=min_cluster_size,
+        metric=metric,
+        algorithm=algorithm,
+        core_dist_n_jobs=1,
+        **kwargs
+    )
+    return clusterer.fit(Z)
+
+def landmark_mds(Z, metric="braycurtis", n_components=2,
+                 n_landmarks=N_LANDMARKS, chunk_size=CHUNK_SIZE,
+                 random_state=None):
+    """Embed points with landmark MDS.
+
+    Classical MDS of a random sample of landmark points, onto which the
+    rest are placed by their distances to the landmarks.
+
+    Parameters
+    ----------
+    Z : numpy.ndarray
+        Points, a row per point.
+    metric : str
+        Distance metric, as `scipy.spatial.distance.cdist`.
+    n_components : int
+        Number of dimensions to embed in.
+    n_landmarks : int
+        Number of landmarks to sample.
+    chunk_size : int
+        Number of points to compute distances to landmarks for at once.
+    random_state : int or numpy.random.RandomState, optional
+
+    Returns
+    -------
+    coords : numpy.ndarray
+        Embedding, a row per point.
+    """
+
+    rng = check_random_state(random_state)
+    n = Z.shape[0]
+    landmarks = Z[rng.choice(n, size=min(n, n_landmarks), replace=False)]
+
+    # Classical MDS of the landmarks.
+    sq_dist = distance.cdist(landmarks, landmarks, metric) ** 2
+    mean_sq_dist = sq_dist.mean(axis=0)
+    k = sq_dist.shape[0]
+    centering = np.eye(k) - np.ones((k, k)) / k
+    b = -0.5 * centering @ sq_dist @ centering
+    eigenvalues, eigenvectors = np.linalg.eigh(b)
+    top = np.argsort(eigenvalues)[::-1][:n_components]
+    eigenvalues = np.clip(eigenvalues[top], 1e-12, None)
+    eigenvectors = eigenvectors[:, top]
+
+    # Place points by their distances to the landmarks.
+    pseudoinverse = eigenvectors / np.sqrt(eigenvalues)
+    coords = np.empty((n, n_components))
+    for i in range(0, n, chunk_size):
+        sq = distance.cdist(Z[i:i + chunk_size], landmarks, metric) ** 2
+        coords[i:i + chunk_size] = -0.5 * (sq - mean_sq_dist) @ pseudoinverse
+
+    return coords
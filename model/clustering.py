@@ -1,11 +1,11 @@
 """Cluster Analysis of inmates."""
 
-from config import pg_kwargs
-import features
+import cluster
+import feature_store
+import loader
 
 from collections import Counter
 from scipy.spatial import distance
-from features_text import load_model
 from sklearn.manifold import MDS
 from sklearn.preprocessing import scale
 from hdbscan import HDBSCAN
@@ -13,7 +13,10 @@ from hdbscan import HDBSCAN
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import psycopg2
+
+
+# Most inmates to cluster with a precomputed distance matrix.
+MAX_PRECOMPUTED = 5000
 
 
 def dist(x, metric):
@@ -32,64 +35,12 @@ def scatter(x, y, labels, ax=None, palette="Accent"):
     return ax
 
 
-with open("read.sql", "r") as fh:
-    queries = fh.read().split("\n\n")
-    queries = [query.strip() for query in queries]
-    inmate_query, charge_query = filter(None, queries)
-
-with psycopg2.connect(**pg_kwargs) as conn:
-    df = pd.read_sql(inmate_query, con=conn)
-    charges = pd.read_sql(charge_query, con=conn)
-
+# Features are precomputed by `feature_store.py`. Only consider inmates
+# with charges.
+with loader.connect() as conn:
+    x = feature_store.load(conn)
 
-# Clean empty strings.
-# TODO: fix this in the scraper or create a view
-charges.level[charges.level == ""] = None
-
-# Create indicators.
-df["male"] = df.sex.map(features.is_male)
-df["unemployed"] = df.occupation.map(features.is_unemployed)
-
-# Set severity level names.
-level_mapping = {
-    "f": "felonies",
-    "m": "misdemeanors",
-    "i": "infractions",
-    "x": "level_unknowns",
-}
-charges["level"] = charges.level.map(lambda s: level_mapping.get(s))
-
-# Get features from charges.
-drug_classifier = load_model("drug")
-violent_classifier = load_model("violent")
-
-charges["drug"] = drug_classifier.predict(charges.description)
-charges["violent"] = violent_classifier.predict(charges.description)
-
-# Roll-up charges and merge with inmates data.
-rows = []
-for booking_id, group in charges.groupby("booking_id"):
-    rows.append({
-        **group.level.value_counts().to_dict(),
-        "n_charges":  group.shape[0],
-        "total_bail": group.bail.sum(),
-        "drug":       np.any(group.drug),
-        "violent":    np.any(group.violent),
-        "booking_id": booking_id,
-    })
-
-rollup = pd.DataFrame(rows).set_index("booking_id")
-int_cols = list(level_mapping.values())
-rollup[int_cols] = rollup[int_cols].fillna(0).astype(int)
-
-# Join onto inmates.
-del df["jail_id"]
-x = rollup.merge(
-    df,
-    how="inner",
-    left_index=True,
-    right_on="booking_id"
-)
+x = x[x.n_charges > 0]
 
 
 # Cluster.
@@ -111,15 +62,27 @@ pd.scatter_matrix(X)
 # Visualize using MDS, as we use a distance based clustering method.
 # https://datascience.stackexchange.com/questions/22/k-means-clustering-for-mixed-numeric-and-categorical-data
 Z = scale(X.astype(float))
-scale_dist = dist(Z, "braycurtis")
 
-mds_scale = MDS(n_components=2, dissimilarity="precomputed", max_iter=1000)
-coords_scale = mds_scale.fit_transform(scale_dist)
+# Pairwise distances take quadratic memory, so with many inmates use
+# landmark MDS and find neighbors with a ball tree instead (`cluster.py`).
+scalable = Z.shape[0] > MAX_PRECOMPUTED
+
+if scalable:
+    coords_scale = cluster.landmark_mds(Z, "braycurtis", random_state=13)
+else:
+    scale_dist = dist(Z, "braycurtis")
+    mds_scale = MDS(
+        n_components=2, dissimilarity="precomputed", max_iter=1000)
+    coords_scale = mds_scale.fit_transform(scale_dist)
 plt.scatter(*coords_scale.T)
 
-# Run HDSCAN* over precomputed distances.
-clusterer = HDBSCAN(min_cluster_size=50, metric="precomputed")
-labels = clusterer.fit_predict(scale_dist)
+# Run HDSCAN*.
+if scalable:
+    clusterer = cluster.cluster(Z, "braycurtis", min_cluster_size=50)
+    labels = clusterer.labels_
+else:
+    clusterer = HDBSCAN(min_cluster_size=50, metric="precomputed")
+    labels = clusterer.fit_predict(scale_dist)
 
 # Cursory diagnostics.
 Counter(labels)
@@ -0,0 +1,196 @@
+"""Store of precomputed inmate features.
+
+Features are derived from the booking tables and persisted in the
+`inmate_features` table, a row per booking. Each row records the
+version of the derivation and the booking's content hash it was derived
+from, so that `update` only recomputes features for bookings which are
+new, have changed, or were derived by an older version. Run it after
+ingest to bring the store up to date:
+
+    python feature_store.py
+"""
+
+from features_text import load_model, predict
+import features
+import loader
+
+from psycopg2.extras import execute_values
+
+
+# Increment when the derivation of features changes, to recompute them.
+FEATURES_VERSION = 1
+BATCH_SIZE = 5000
+
+COLUMNS = [
+    "booking_id",
+    "version",
+    "content_hash",
+    "age",
+    "race",
+    "sex",
+    "occupation",
+    "male",
+    "unemployed",
+] + features.ROLLUP_COLUMNS
+
+select_stale = """
+select booking.id
+from booking
+left join inmate_features as f on f.booking_id = booking.id
+where f.booking_id is null
+    or f.version <> %(version)s
+    or f.content_hash is distinct from booking.content_hash
+order by booking.id;
+"""
+
+select_hashes = """
+select id as booking_id, content_hash
+from booking
+where id = any(%(booking_ids)s);
+"""
+
+upsert_features = """
+insert into inmate_features ({columns}) values %s
+on conflict (booking_id) do update set
+    {updates},
+    updated_at = now();
+""".format(
+    columns=", ".join(COLUMNS),
+    updates=",\n    ".join(
+        "{0} = excluded.{0}".format(column) for column in COLUMNS[1:])
+)
+
+select_features = """
+select {columns}
+from inmate_features
+where version = %(version)s;
+""".format(columns=", ".join(COLUMNS))
+
+
+def restrict(query):
+    """Restrict a query of `read.sql` to a set of bookings."""
+
+    restricted = "select * from (\n{}\n) as t\n" \
+        "where t.booking_id = any(%(booking_ids)s);"
+    return restricted.format(query.rstrip(";"))
+
+def build_features(inmates, charges, drug_classifier, violent_classifier):
+    """Derive features of inmates.
+
+    Parameters
+    ----------
+    inmates : pandas.DataFrame
+        Inmates, as given by the "query-inmates" query.
+    charges : pandas.DataFrame
+        Charges of the inmates, as given by the "query-charges" query.
+    drug_classifier, violent_classifier : sklearn.pipeline.Pipeline
+        Crime classifiers of charge descriptions.
+
+    Returns
+    -------
+    x : pandas.DataFrame
+        Features of each inmate, with zero counts for inmates without
+        charges.
+    """
+
+    x = inmates.drop(columns="jail_id")
+    x["male"] = x.sex.map(features.is_male)
+    x["unemployed"] = x.occupation.map(features.is_unemployed)
+
+    charges = charges.copy()
+    charges["drug"] = predict(drug_classifier, charges.description)
+    charges["violent"] = predict(violent_classifier, charges.description)
+
+    rollup = features.rollup_charges(charges)
+    x = x.merge(rollup, how="left", left_on="booking_id", right_index=True)
+
+    counts = features.LEVELS + ["n_charges"]
+    x[counts] = x[counts].fillna(0).astype(int)
+    x[["drug", "violent"]] = x[["drug", "violent"]].fillna(False).astype(bool)
+    return x
+
+def records(x):
+    """Convert a frame to tuples of Python values, with None for nulls."""
+
+    x = x[COLUMNS].astype(object)
+    x = x.where(x.notnull(), None)
+    return list(x.itertuples(index=False, name=None))
+
+def update(conn, drug_classifier=None, violent_classifier=None,
+           batch_size=BATCH_SIZE, read_sql="read.sql"):
+    """Compute and store features of new and changed bookings.
+
+    Each batch of bookings is committed as it is stored.
+
+    Parameters
+    ----------
+    conn : database connection
+    drug_classifier, violent_classifier : sklearn.pipeline.Pipeline, optional
+        Crime classifiers, loaded from disk if not given.
+    batch_size : int
+        Number of bookings to compute features of at once.
+    read_sql : str
+        Path of the inmate and charge queries.
+
+    Returns
+    -------
+    n : int
+        Number of bookings updated.
+    """
+
+    with conn.cursor() as cursor:
+        cursor.execute(select_stale, {"version": FEATURES_VERSION})
+        stale = [row[0] for row in cursor.fetchall()]
+    if not stale:
+        return 0
+
+    if drug_classifier is None:
+        drug_classifier = load_model("drug")
+    if violent_classifier is None:
+        violent_classifier = load_model("violent")
+    queries = loader.read_queries(read_sql)
+    inmate_query = restrict(queries["query-inmates"])
+    charge_query = restrict(queries["query-charges"])
+
+    n = 0
+    for i in range(0, len(stale), batch_size):
+        params = {"booking_ids": stale[i:i + batch_size]}
+        # Read hashes first, so that a booking changed while it is read
+        # is stored with an old hash and recomputed next time.
+        hashes = loader.read(conn, select_hashes, params)
+        inmates = loader.read(conn, inmate_query, params)
+        charges = loader.read(conn, charge_query, params)
+
+        x = build_features(
+            inmates, charges, drug_classifier, violent_classifier)
+        x = x.merge(hashes, how="left", on="booking_id")
+        x["version"] = FEATURES_VERSION
+
+        with conn.cursor() as cursor:
+            execute_values(cursor, upsert_features, records(x))
+        conn.commit()
+        n += len(x)
+
+    return n
+
+def load(conn, **kwargs):
+    """Read the stored features of all bookings in one scan.
+
+    Keyword arguments are passed on to `loader.load`.
+
+    Returns
+    -------
+    x : pandas.DataFrame
+        Features of each inmate, as given by `build_features`.
+    """
+
+    x = loader.load(
+        conn, "features", select_features,
+        params={"version": FEATURES_VERSION}, **kwargs)
+    return x.drop(columns=["version", "content_hash"])
+
+
+if __name__ == "__main__":
+    with loader.connect() as conn:
+        n = update(conn)
+    print("Updated features of {} bookings".format(n))
@@ -1,11 +1,20 @@
 """Derive features."""
 
+import numpy as np
+import pandas as pd
 import re
 
 
-def match(pattern, string):
-    result = re.search(pattern, string, flags=re.IGNORECASE)
-    return result is not None
+# Names of charge severity levels.
+LEVEL_MAPPING = {
+    "f": "felonies",
+    "m": "misdemeanors",
+    "i": "infractions",
+    "x": "level_unknowns",
+}
+LEVELS = list(LEVEL_MAPPING.values())
+ROLLUP_COLUMNS = LEVELS + ["n_charges", "total_bail", "drug", "violent"]
+
 
 def is_unemployed(occupation):
     """Determine employment status based on recorded occupation.
@@ -28,56 +37,76 @@ def is_unemployed(occupation):
 def is_male(s):
     return s.lower() == "m"
 
+# Violent crimes, by description or penal code. Reference:
+# http://www.cdcr.ca.gov/parole/non_revocable_parole/violent_offenses_defined.html
+VIOLENT_NAMES = (
+    'murder',                   # 1
+    'voluntary manslaughter',   # 1
+    'mayhem',                   # 2
+    'rape',                     # 3
+    'sodomy',                   # 4
+    'oral copulation',          # 5
+    'lewd/lascivious|l/l act',  # 6
+    'robbery',                  # 9
+    'arson',                    # 10
+    'penetration',              # 11
+    'attempted murder',         # 12
+    'kidnapping',               # 14
+    'carjacking',               # 17
+    'extortion'                 # 19
+)
+
+VIOLENT_PENAL_CODES = (
+    '^261[^0-9]',               # 3*
+    '^262[^0-9]',               # 3*
+    '^288[ab].*?',              # 5*, 6*, 16
+    '^12022.7[^0-9]',           # 8
+    '^12022.8[^0-9]',           # 8
+    '^12022.9[^0-9]',           # 8
+    '^451[^0-9]',               # 10*
+    '^289[^0-9]',               # 11*
+    '^12308[^0-9]',             # 13
+    '^12309[^0-9]',             # 13
+    '^12310[^0-9]',             # 13
+    '^220[^0-9]',               # 15
+    '^215[^0-9]',               # 17*
+    '^264.1[^0-9]',             # 18
+    '^136.1[^0-9]',             # 20
+    '^182.66[^0-9]',            # 20
+    '^460[^0-9]',               # 21
+    '^12022.53[^0-9]',          # 22
+    r'^11418\(B\)',             # 23
+    r'^11418\(C\)'              # 23
+)
+
+# Drug crimes, by description or penal code.
+DRUG_NAMES = ('cntl|cntrd|contld|contrld|controlled|substance',)
+
+DRUG_PENAL_CODES = (
+    '113[0-9]{2}.+?',           # 11350 (A), 11377, etc
+    '381B.+?'                   # Poss. nitrous oxide
+)
+
+def compile_rules(patterns):
+    """Compile patterns into a single case insensitive regex, which
+    matches wherever any one of the patterns does.
+    """
+    alternation = "|".join("(?:{})".format(p) for p in patterns)
+    return re.compile(alternation, flags=re.IGNORECASE)
+
+violent_name_rules = compile_rules(VIOLENT_NAMES)
+violent_code_rules = compile_rules(VIOLENT_PENAL_CODES)
+drug_name_rules = compile_rules(DRUG_NAMES)
+drug_code_rules = compile_rules(DRUG_PENAL_CODES)
+
 def is_violentcrime(charge, description):
     """Determine if a charge is for a violent crime, based on either
     the description or penal code.
     """
 
-    # Reference:
-    # http://www.cdcr.ca.gov/parole/non_revocable_parole/violent_offenses_defined.html
-    names = (
-        'murder',                   # 1
-        'voluntary manslaughter',   # 1
-        'mayhem',                   # 2
-        'rape',                     # 3
-        'sodomy',                   # 4
-        'oral copulation',          # 5
-        'lewd/lascivious|l/l act',  # 6
-        'robbery',                  # 9
-        'arson',                    # 10
-        'penetration',              # 11
-        'attempted murder',         # 12
-        'kidnapping',               # 14
-        'carjacking',               # 17
-        'extortion'                 # 19
-    )
-
-    penal_codes = (
-        '^261[^0-9]',               # 3*
-        '^262[^0-9]',               # 3*
-        '^288[ab].*?',              # 5*, 6*, 16
-        '^12022.7[^0-9]',           # 8
-        '^12022.8[^0-9]',           # 8
-        '^12022.9[^0-9]',           # 8
-        '^451[^0-9]',               # 10*
-        '^289[^0-9]',               # 11*
-        '^12308[^0-9]',             # 13
-        '^12309[^0-9]',             # 13
-        '^12310[^0-9]',             # 13
-        '^220[^0-9]',               # 15
-        '^215[^0-9]',               # 17*
-        '^264.1[^0-9]',             # 18
-        '^136.1[^0-9]',             # 20
-        '^182.66[^0-9]',            # 20
-        '^460[^0-9]',               # 21
-        '^12022.53[^0-9]',          # 22
-        '^11418\(B\)',              # 23
-        '^11418\(C\)'               # 23
-    )
-
     return (
-        any(match(pattern, description) for pattern in names) or
-        any(match(pattern, charge) for pattern in penal_codes)
+        violent_name_rules.search(description) is not None or
+        violent_code_rules.search(charge) is not None
     )
 
 def is_drugcrime(charge, description):
@@ -85,12 +114,86 @@ def is_drugcrime(charge, description):
     description or penal code.
     """
 
-    name_pattern = 'cntl|cntrd|contld|contrld|controlled|substance'
-    penal_codes = ('113[0-9]{2}.+?',       # 11350 (A), 11377, etc
-                   '381B.+?')              # Poss. nitrous oxide
+    return (
+        drug_name_rules.search(description) is not None or
+        drug_code_rules.search(charge) is not None
+    )
+
+def contains(rules, strings):
+    """Determine which of an array of strings match compiled rules.
+    Missing strings don't match.
+    """
+
+    search = rules.search
+    strings = np.asarray(strings, dtype=object)
+    matches = (
+        isinstance(s, str) and search(s) is not None for s in strings)
+    return np.fromiter(matches, dtype=bool, count=len(strings))
+
+def label_violentcrimes(charges, descriptions):
+    """Label arrays of charges as violent crimes, as `is_violentcrime`.
+
+    Parameters
+    ----------
+    charges, descriptions : array-like of str
+        Penal codes and descriptions of the charges.
+
+    Returns
+    -------
+    labels : numpy.ndarray of bool
+    """
+
+    return (
+        contains(violent_name_rules, descriptions) |
+        contains(violent_code_rules, charges)
+    )
+
+def label_drugcrimes(charges, descriptions):
+    """Label arrays of charges as drug crimes, as `is_drugcrime`.
+
+    Parameters
+    ----------
+    charges, descriptions : array-like of str
+        Penal codes and descriptions of the charges.
+
+    Returns
+    -------
+    labels : numpy.ndarray of bool
+    """
 
     return (
-        match(name_pattern, description) or
-        any(match(pattern, charge) for pattern in penal_codes)
+        contains(drug_name_rules, descriptions) |
+        contains(drug_code_rules, charges)
+    )
+
+def rollup_charges(charges):
+    """Summarize charges by booking.
+
+    Parameters
+    ----------
+    charges : pandas.DataFrame
+        Charges with "booking_id", "level", "bail", and boolean "drug"
+        and "violent" columns.
+
+    Returns
+    -------
+    rollup : pandas.DataFrame
+        Indexed by booking_id, with the number of charges of each
+        severity level, total number of charges and bail, and whether
+        any charge is for a drug or violent crime.
+    """
+
+    levels = pd.get_dummies(charges.level.map(LEVEL_MAPPING))
+    levels = levels.reindex(columns=LEVELS, fill_value=0).astype(int)
+    counts = levels.groupby(charges.booking_id).sum()
+
+    totals = charges.groupby("booking_id").agg(
+        n_charges=("booking_id", "size"),
+        total_bail=("bail", "sum"),
+        drug=("drug", "any"),
+        violent=("violent", "any"),
     )
 
+    rollup = counts.join(totals)[ROLLUP_COLUMNS]
+    rollup.columns.name = None
+    return rollup
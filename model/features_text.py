@@ -9,15 +9,21 @@ from sklearn.feature_extraction.text import (
 )
 from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import Pipeline
+from collections import OrderedDict
 import joblib
+import numpy as np
+import pandas as pd
 
+import os
 import re
 import string
+import threading
 
 
 DRUG_MODEL_FILENAME = "drug_crime_classifier.skmodel"
 VIOLENT_MODEL_FILENAME = "violent_crime_classifier.skmodel"
 NUMBER_TOKEN = " num "
+TOKEN_CACHE_SIZE = 2 ** 16
 
 def preprocess(text):
     lowered = text.lower()
@@ -42,6 +48,37 @@ def tokenize(text):
     ]
     return [stemmer.stem(token) for token in tokens]
 
+# Descriptions are highly repetitive, so cache their tokens, most
+# recently used last. The cache is shared by the threads of the
+# classification service, see `classify.py`.
+token_cache = OrderedDict()
+token_cache_lock = threading.Lock()
+
+def analyze(text):
+    """Preprocess and tokenize a description."""
+    return tuple(tokenize(preprocess(text)))
+
+def tokens(text):
+    """Get the tokens of a raw description, as `analyze`, caching
+    the tokens of up to `TOKEN_CACHE_SIZE` descriptions.
+    """
+
+    with token_cache_lock:
+        result = token_cache.get(text)
+        if result is not None:
+            token_cache.move_to_end(text)
+            return result
+
+    # Analyze outside the lock, so that threads only wait on each other
+    # for cache lookups.
+    result = analyze(text)
+    with token_cache_lock:
+        token_cache[text] = result
+        token_cache.move_to_end(text)
+        if len(token_cache) > TOKEN_CACHE_SIZE:
+            token_cache.popitem(last=False)
+    return result
+
 def prepare_stop_words(stop_words):
     prepared_stop_words = set()
     for w in ENGLISH_STOP_WORDS:
@@ -53,11 +90,14 @@ def prepare_stop_words(stop_words):
 
 def make_pipeline():
     stop_words = prepare_stop_words(ENGLISH_STOP_WORDS)
+    # Tokens are looked up by raw description, so don't preprocess
+    # (or lower case) descriptions separately.
     vectorizer = CountVectorizer(
         analyzer="word",
-        preprocessor=preprocess,
-        tokenizer=tokenize,
-        stop_words=stop_words,
+        lowercase=False,
+        tokenizer=tokens,
+        token_pattern=None,
+        stop_words=sorted(stop_words),
         max_features=500
     )
     weighter = TfidfTransformer(norm=None)
@@ -73,18 +113,15 @@ def train_and_save_models():
     current working directory under `*_crime_classifier.skmodel`.
     """
     # Hidden imports - only used to get training data.
-    from config import pg_kwargs
-    from features import is_drugcrime, is_violentcrime
-    import pandas as pd
-    import psycopg2
+    from features import label_drugcrimes, label_violentcrimes
+    import loader
 
-    with psycopg2.connect(**pg_kwargs) as conn:
-        charges = pd.read_sql("select * from charges_t", con=conn)
+    with loader.connect() as conn:
+        charges = loader.load(conn, "charges", "select * from charges_t")
 
-    drug = map(is_drugcrime, charges.charge, charges.description)
-    violent = map(is_violentcrime, charges.charge, charges.description)
-    charges["drug"] = list(drug)
-    charges["violent"] = list(violent)
+    charges["drug"] = label_drugcrimes(charges.charge, charges.description)
+    charges["violent"] = label_violentcrimes(
+        charges.charge, charges.description)
 
     drug_pipeline = make_pipeline()
     violent_pipeline = make_pipeline()
@@ -96,13 +133,18 @@ def train_and_save_models():
     joblib.dump(violent_pipeline, VIOLENT_MODEL_FILENAME)
     return
 
-def load_model(model_name):
+def load_model(model_name, directory=".", mmap_mode=None):
     """Load a trained crime text classifier from disk.
 
     Parameters
     ----------
     model_name : str
         The model name, one of ("drug", "violent").
+    directory : str
+        Directory the model was saved in.
+    mmap_mode : str, optional
+        Memory map the model's arrays rather than reading them, see
+        `joblib.load`.
 
     Returns
     -------
@@ -114,5 +156,26 @@ def load_model(model_name):
         "drug": DRUG_MODEL_FILENAME,
         "violent": VIOLENT_MODEL_FILENAME,
     }[model_name]
-    return joblib.load(model_filename)
+    return joblib.load(
+        os.path.join(directory, model_filename), mmap_mode=mmap_mode)
+
+def predict(model, descriptions):
+    """Classify descriptions, only classifying each distinct one once.
+
+    Parameters
+    ----------
+    model : sklearn.pipeline.Pipeline
+        A fitted crime classifier.
+    descriptions : array-like of str
+
+    Returns
+    -------
+    labels : numpy.ndarray
+        The label of each description.
+    """
 
+    codes, uniques = pd.factorize(
+        pd.Series(descriptions, dtype=object), use_na_sentinel=False)
+    if not len(uniques):
+        return np.array([], dtype=model.classes_.dtype)
+    return model.predict(uniques)[codes]
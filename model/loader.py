@@ -0,0 +1,201 @@
+"""Load data for analysis from the database.
+
+Query results are streamed from a server-side cursor in chunks, which
+are converted to compact dtypes as they arrive, so loading doesn't hold
+every row as Python objects at once. Results can be cached as Parquet
+files, keyed by the query and a watermark of the data, so that repeated
+runs of an analysis only hit the database once the data has changed:
+
+    with loader.connect() as conn:
+        charges = loader.load(conn, "charges", "select * from charges_t")
+"""
+
+from pandas.api.types import union_categoricals
+import pandas as pd
+
+from itertools import count
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+
+CACHE_DIR = ".cache"
+CHUNK_SIZE = 50000
+
+# Compact dtypes of columns, wherever they appear.
+DTYPES = {
+    "booking_id": "int32",
+    "age": "Int16",
+    "race": "category",
+    "sex": "category",
+    "level": "category",
+    "bail": "Int32",
+    "felonies": "int16",
+    "misdemeanors": "int16",
+    "infractions": "int16",
+    "level_unknowns": "int16",
+    "n_charges": "int16",
+    "male": "boolean",
+    "unemployed": "boolean",
+    "drug": "bool",
+    "violent": "bool",
+}
+
+# Changes whenever data is written to the tables analyses read, as
+# kept by triggers (see db/migrations/005_data_version.sql), so checking
+# it doesn't scan the tables.
+WATERMARK_QUERY = """
+select last_value, is_called from data_version;
+"""
+
+_cursor_ids = count()
+
+
+def connect():
+    """Connect to the database with the parameters in `config.py`."""
+
+    from config import pg_kwargs
+    import psycopg2
+
+    return psycopg2.connect(**pg_kwargs)
+
+def read_queries(filename):
+    """Read the queries of an SQL file, by name.
+
+    Each query is preceded by a `-- name: <name>` comment, and runs to
+    the next one.
+    """
+
+    with open(filename, "r") as fh:
+        sql = fh.read()
+
+    parts = re.split(r"^--\s*name:\s*(\S+)[ \t]*$", sql, flags=re.MULTILINE)
+    return {
+        name: query.strip()
+        for name, query in zip(parts[1::2], parts[2::2])
+    }
+
+def apply_dtypes(frame, dtypes=DTYPES):
+    """Convert the columns of a frame which have compact dtypes."""
+
+    present = {
+        column: dtype for column, dtype in dtypes.items()
+        if column in frame
+    }
+    return frame.astype(present)
+
+def stream(conn, query, params=None, chunk_size=CHUNK_SIZE, dtypes=DTYPES):
+    """Iterate over the results of a query in chunks.
+
+    Parameters
+    ----------
+    conn : database connection
+    query : str
+    params : dict, optional
+        Query parameters.
+    chunk_size : int
+        Number of rows to fetch at a time.
+    dtypes : dict
+        Dtypes of columns, by name.
+
+    Yields
+    ------
+    chunk : pandas.DataFrame
+        Up to `chunk_size` rows. A single empty frame is given if there
+        are no results.
+    """
+
+    name = "loader_{}".format(next(_cursor_ids))
+    with conn.cursor(name=name) as cursor:
+        cursor.itersize = chunk_size
+        cursor.execute(query, params)
+
+        first = True
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows and not first:
+                break
+
+            columns = [column[0] for column in cursor.description]
+            chunk = pd.DataFrame.from_records(rows, columns=columns)
+            yield apply_dtypes(chunk, dtypes)
+
+            first = False
+            if len(rows) < chunk_size:
+                break
+
+def concat(chunks):
+    """Concatenate chunks, keeping categorical columns categorical."""
+
+    chunks = list(chunks)
+    head = chunks[0]
+    for column in head:
+        if isinstance(head[column].dtype, pd.CategoricalDtype):
+            categories = union_categoricals(
+                [chunk[column] for chunk in chunks]).categories
+            for chunk in chunks:
+                chunk[column] = chunk[column].cat.set_categories(categories)
+
+    return pd.concat(chunks, ignore_index=True)
+
+def read(conn, query, params=None, chunk_size=CHUNK_SIZE, dtypes=DTYPES):
+    """Read the results of a query, as `stream`, into a single frame."""
+
+    return concat(stream(conn, query, params, chunk_size, dtypes))
+
+def watermark(conn, watermark_query=WATERMARK_QUERY):
+    with conn.cursor() as cursor:
+        cursor.execute(watermark_query)
+        return [str(value) for value in cursor.fetchone()]
+
+def cache_key(query, params, mark):
+    key = json.dumps([query, params, mark], sort_keys=True, default=str)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+def load(conn, name, query, params=None, cache_dir=CACHE_DIR,
+         watermark_query=WATERMARK_QUERY, **kwargs):
+    """Read the results of a query, from the cache if the data hasn't
+    changed since they were cached.
+
+    Parameters
+    ----------
+    conn : database connection
+    name : str
+        Name of the results, used to name cache files.
+    query : str
+    params : dict, optional
+        Query parameters.
+    cache_dir : str or None
+        Directory of cached results, or None not to cache.
+    watermark_query : str
+        Query which gives different results whenever the data changes.
+    **kwargs
+        Passed on to `read`.
+
+    Returns
+    -------
+    frame : pandas.DataFrame
+    """
+
+    if cache_dir is None:
+        return read(conn, query, params, **kwargs)
+
+    key = cache_key(query, params, watermark(conn, watermark_query))
+    path = os.path.join(cache_dir, "{}-{}.parquet".format(name, key))
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+
+    frame = read(conn, query, params, **kwargs)
+
+    # Replace results cached before the data changed.
+    os.makedirs(cache_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(cache_dir, name + "-*.parquet")):
+        os.remove(stale)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    os.close(fd)
+    frame.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return frame
@@ -0,0 +1,293 @@
+"""Incremental training of the crime text classifiers.
+
+An alternative to `features_text.train_and_save_models`, which refits
+both models on every charge. These models hash tokens into a fixed
+number of features, which needs no fitting, and are trained with
+stochastic gradient descent, so they can be updated with only the
+charges added since they were last trained.
+
+Each training run is saved as a new version, along with a checkpoint
+recording the last charge trained on:
+
+    <directory>/v0001/drug_crime_classifier.skmodel
+    <directory>/v0001/violent_crime_classifier.skmodel
+    <directory>/v0001/checkpoint.json
+
+Train, or compare holdout accuracy against the full refit models, with:
+
+    python online.py
+    python online.py --compare
+"""
+
+from features import label_drugcrimes, label_violentcrimes
+from features_text import (
+    DRUG_MODEL_FILENAME,
+    VIOLENT_MODEL_FILENAME,
+    make_pipeline,
+    predict,
+    prepare_stop_words,
+    tokens
+)
+from sklearn.feature_extraction.text import (
+    ENGLISH_STOP_WORDS,
+    HashingVectorizer
+)
+from sklearn.linear_model import SGDClassifier
+from sklearn.model_selection import StratifiedShuffleSplit
+from sklearn.pipeline import Pipeline
+
+from datetime import datetime
+import joblib
+import loader
+import numpy as np
+import pandas as pd
+
+import argparse
+import json
+import os
+import re
+import shutil
+import tempfile
+
+
+ONLINE_DIRNAME = "online_models"
+CHECKPOINT_FILENAME = "checkpoint.json"
+CHUNK_SIZE = 10000
+N_FEATURES = 2 ** 18
+
+MODEL_FILENAMES = {
+    "drug": DRUG_MODEL_FILENAME,
+    "violent": VIOLENT_MODEL_FILENAME,
+}
+LABELLERS = {
+    "drug": label_drugcrimes,
+    "violent": label_violentcrimes,
+}
+CLASSES = np.array([False, True])
+
+# Charge items are rewritten when their booking changes, so charges of
+# changed bookings are trained on again.
+select_charges = """
+select id, charge, description
+from charge_items
+where id > %(watermark)s
+order by id;
+"""
+
+
+def make_online_pipeline():
+    vectorizer = HashingVectorizer(
+        analyzer="word",
+        lowercase=False,
+        tokenizer=tokens,
+        token_pattern=None,
+        stop_words=sorted(prepare_stop_words(ENGLISH_STOP_WORDS)),
+        n_features=N_FEATURES,
+        alternate_sign=False
+    )
+    classifier = SGDClassifier(loss="log_loss", random_state=13)
+    return Pipeline([
+        ("vectorize", vectorizer),
+        ("classify", classifier)
+    ])
+
+def partial_fit(model, descriptions, y):
+    """Update an online pipeline with a batch of labelled descriptions."""
+
+    vectorizer = model.named_steps["vectorize"]
+    classifier = model.named_steps["classify"]
+    classifier.partial_fit(
+        vectorizer.transform(descriptions), y, classes=CLASSES)
+    return model
+
+def version_path(directory, version):
+    return os.path.join(directory, "v{:04d}".format(version))
+
+def latest_version(directory):
+    """Get the latest saved version, or 0 if none has been saved."""
+
+    if not os.path.isdir(directory):
+        return 0
+
+    versions = [
+        int(name[1:]) for name in os.listdir(directory)
+        if re.fullmatch(r"v\d+", name)
+    ]
+    return max(versions, default=0)
+
+def load_models(directory=ONLINE_DIRNAME, version=None):
+    """Load a saved version of the online models.
+
+    Parameters
+    ----------
+    directory : str
+        Directory of saved versions.
+    version : int, optional
+        Version to load, defaults to the latest. If no version has been
+        saved, new untrained models are returned.
+
+    Returns
+    -------
+    models : dict
+        Online pipelines by name, as `classify.load_models`.
+    checkpoint : dict
+        Checkpoint of the version, with the "watermark" charge id trained
+        up to.
+    """
+
+    if version is None:
+        version = latest_version(directory)
+    if not version:
+        models = {name: make_online_pipeline() for name in MODEL_FILENAMES}
+        return models, {"version": 0, "watermark": 0, "n_trained": 0}
+
+    path = version_path(directory, version)
+    with open(os.path.join(path, CHECKPOINT_FILENAME)) as fh:
+        checkpoint = json.load(fh)
+    models = {
+        name: joblib.load(os.path.join(path, filename))
+        for name, filename in MODEL_FILENAMES.items()
+    }
+    return models, checkpoint
+
+def save_models(directory, models, checkpoint):
+    """Save models as the next version, returning its path."""
+
+    os.makedirs(directory, exist_ok=True)
+    # Write to a temporary directory first, so that a partially written
+    # version is never loaded.
+    tmp_path = tempfile.mkdtemp(dir=directory)
+    try:
+        for name, filename in MODEL_FILENAMES.items():
+            joblib.dump(models[name], os.path.join(tmp_path, filename))
+        with open(os.path.join(tmp_path, CHECKPOINT_FILENAME), "w") as fh:
+            json.dump(checkpoint, fh, indent=2, sort_keys=True)
+        path = version_path(directory, checkpoint["version"])
+        os.rename(tmp_path, path)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    return path
+
+def train(conn, directory=ONLINE_DIRNAME, chunk_size=CHUNK_SIZE):
+    """Train the latest online models on charges added since their
+    checkpoint, and save them as a new version.
+
+    Parameters
+    ----------
+    conn : database connection
+    directory : str
+        Directory of saved versions.
+    chunk_size : int
+        Number of charges to train on at once.
+
+    Returns
+    -------
+    checkpoint : dict
+        Checkpoint of the saved version, or of the latest version if
+        there were no new charges to train on.
+    """
+
+    models, checkpoint = load_models(directory)
+    chunks = loader.stream(
+        conn,
+        select_charges,
+        params={"watermark": checkpoint["watermark"]},
+        chunk_size=chunk_size
+    )
+
+    n = 0
+    watermark = checkpoint["watermark"]
+    for charges in chunks:
+        if charges.empty:
+            continue
+        for name, model in models.items():
+            y = LABELLERS[name](charges.charge, charges.description)
+            partial_fit(model, charges.description, y)
+        n += len(charges)
+        watermark = int(charges.id.max())
+
+    if not n:
+        return checkpoint
+
+    checkpoint = {
+        "version": latest_version(directory) + 1,
+        "watermark": watermark,
+        "n_trained": checkpoint["n_trained"] + n,
+        "trained_at": datetime.utcnow().isoformat(),
+    }
+    save_models(directory, models, checkpoint)
+    return checkpoint
+
+def compare(charges, chunk_size=CHUNK_SIZE):
+    """Compare holdout accuracy of the online and full refit models.
+
+    Each label is split 70 / 30 into training and test charges, with
+    the stratified shuffle split of `text_eda.py`. The online models are
+    trained on the training charges a chunk at a time, as they would be
+    incrementally.
+
+    Parameters
+    ----------
+    charges : pandas.DataFrame
+        Charges with "charge" and "description" columns.
+    chunk_size : int
+        Number of charges the online models are trained on at once.
+
+    Returns
+    -------
+    scores : pandas.DataFrame
+        Accuracy of the "full" and "online" models, by label.
+    """
+
+    descriptions = charges.description.to_numpy(dtype=object)
+    scores = {}
+    for name, labeller in LABELLERS.items():
+        y = labeller(charges.charge, charges.description)
+        sss = StratifiedShuffleSplit(
+            n_splits=2,
+            test_size=.3,
+            random_state=13)
+        train_idx, test_idx = next(sss.split(descriptions, y))
+
+        full = make_pipeline().fit(descriptions[train_idx], y[train_idx])
+        online = make_online_pipeline()
+        for i in range(0, len(train_idx), chunk_size):
+            idx = train_idx[i:i + chunk_size]
+            partial_fit(online, descriptions[idx], y[idx])
+
+        y_test = y[test_idx]
+        scores[name] = {
+            "full": np.mean(
+                predict(full, descriptions[test_idx]) == y_test),
+            "online": np.mean(
+                predict(online, descriptions[test_idx]) == y_test),
+        }
+
+    return pd.DataFrame(scores).T
+
+def make_argparser():
+    parser = argparse.ArgumentParser(
+        description="Incrementally train the crime text classifiers.")
+    parser.add_argument(
+        "-d", "--directory", default=ONLINE_DIRNAME,
+        help="directory of saved versions (default: %(default)s)")
+    parser.add_argument(
+        "-c", "--chunk-size", type=int, default=CHUNK_SIZE,
+        help="number of charges to train on at once (default: %(default)s)")
+    parser.add_argument(
+        "--compare", action="store_true",
+        help="compare holdout accuracy with the full refit models")
+    return parser
+
+
+if __name__ == "__main__":
+    args = make_argparser().parse_args()
+    with loader.connect() as conn:
+        if args.compare:
+            charges = loader.load(conn, "charges", "select * from charges_t")
+            print(compare(charges, args.chunk_size))
+        else:
+            checkpoint = train(conn, args.directory, args.chunk_size)
+            print("Trained version {version} on {n_trained} charges, "
+                  "up to charge {watermark}".format(**checkpoint))
@@ -1,6 +1,5 @@
 """Explore feature engineering on charges."""
 
-from config import pg_kwargs
 from features_text import tokenize
 from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
 from sklearn.linear_model import LogisticRegression
@@ -8,18 +7,18 @@ from sklearn.metrics import confusion_matrix
 from sklearn.model_selection import StratifiedShuffleSplit
 
 import features
+import loader
 import pandas as pd
-import psycopg2
 
 
-with psycopg2.connect(**pg_kwargs) as conn:
-    charges = pd.read_sql("select * from charges_t", con=conn)
+with loader.connect() as conn:
+    charges = loader.load(conn, "charges", "select * from charges_t")
 
 
-drug = map(features.is_drugcrime, charges.charge, charges.description)
-violent = map(features.is_violentcrime, charges.charge, charges.description)
-charges["drug"] = list(drug)
-charges["violent"] = list(violent)
+charges["drug"] = features.label_drugcrimes(
+    charges.charge, charges.description)
+charges["violent"] = features.label_violentcrimes(
+    charges.charge, charges.description)
 
 
 vectorizer = CountVectorizer(
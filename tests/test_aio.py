@@ -0,0 +1,131 @@
+import psycopg2
+import pytest
+import responses
+
+from bookinglog import aio
+from bookinglog import config
+from bookinglog import pipeline
+from bookinglog import scrape
+
+
+URL = "https://apps.marincounty.org/BookingLog/Booking/Action"
+
+
+@pytest.fixture
+def cursor():
+    with psycopg2.connect(**config.pg_kwargs) as conn:
+        cursor = conn.cursor()
+        yield cursor
+
+        cursor.execute("delete from arrests")
+        cursor.execute("delete from inmates")
+        cursor.execute("delete from charge_items")
+        cursor.execute("delete from charges")
+        cursor.execute("delete from booking cascade")
+        cursor.execute("delete from daily_arrivals")
+        cursor.execute("delete from scrape_coverage")
+        conn.commit()
+
+@pytest.fixture(scope="module")
+def html():
+    with open("tests/data/mock.html") as fh:
+        mock_html = fh.read()
+    return mock_html
+
+def snapshot(cursor):
+    cursor.execute(
+        "select booking.jail_id, booking.content_hash, charges.recorded "
+        "from booking "
+        "join charges on charges.booking_id = booking.id "
+        "order by booking.jail_id"
+    )
+    return cursor.fetchall()
+
+
+class TestAsyncEngine(object):
+    @pytest.mark.integration
+    @responses.activate
+    def test_matches_sync_engine(self, html, cursor):
+        responses.add(method="POST", url=URL, body=html)
+
+        assert scrape.main("latest") == 0
+        expected = snapshot(cursor)
+        cursor.execute("delete from arrests")
+        cursor.execute("delete from inmates")
+        cursor.execute("delete from charge_items")
+        cursor.execute("delete from charges")
+        cursor.execute("delete from booking")
+        cursor.connection.commit()
+
+        status = scrape.main("latest", "current", engine="async")
+
+        assert status == 0
+        assert len(responses.calls) == 3
+        assert snapshot(cursor) == expected
+
+        cursor.execute("select search, runs from scrape_coverage")
+        runs = dict(cursor.fetchall())
+        assert runs == {"latest": 2, "current": 1}
+
+    @pytest.mark.integration
+    @responses.activate
+    def test_failed_search(self, html, cursor):
+        responses.add(method="POST", url=URL, body=html)
+
+        def fail(session=None):
+            raise ValueError("Unavailable")
+
+        jobs = aio.search_jobs(["latest"]) + [("current", fail)]
+        with psycopg2.connect(**config.pg_kwargs) as conn:
+            status = aio.run(jobs, conn)
+
+        assert status == 1
+        cursor.execute("select count(*) from booking")
+        assert cursor.fetchone()[0] == 2
+
+    @pytest.mark.integration
+    @pytest.mark.parametrize("workers", [1, 2])
+    @responses.activate
+    def test_chunked_page(self, html, cursor, monkeypatch, workers):
+        responses.add(method="POST", url=URL, body=html)
+
+        assert scrape.main("latest") == 0
+        expected = snapshot(cursor)
+        cursor.execute("delete from arrests")
+        cursor.execute("delete from inmates")
+        cursor.execute("delete from charge_items")
+        cursor.execute("delete from charges")
+        cursor.execute("delete from booking")
+        cursor.connection.commit()
+
+        monkeypatch.setattr(pipeline, "FRAGMENTS_PER_TASK", 1)
+        with psycopg2.connect(**config.pg_kwargs) as conn:
+            status = aio.run(
+                aio.search_jobs(["latest"]), conn, workers=workers)
+
+        assert status == 0
+        assert snapshot(cursor) == expected
+
+    @pytest.mark.integration
+    @responses.activate
+    def test_failed_chunk(self, html, cursor, monkeypatch):
+        responses.add(method="POST", url=URL, body=html)
+        chunks = []
+
+        def ingest(entries, cursor):
+            chunks.append(entries)
+            if len(chunks) > 1:
+                raise ValueError("Failed")
+            return scrape.ingest(entries, cursor)
+
+        monkeypatch.setattr(pipeline, "FRAGMENTS_PER_TASK", 1)
+        with psycopg2.connect(**config.pg_kwargs) as conn:
+            status = aio.run(
+                aio.search_jobs(["latest"]), conn, ingest_fn=ingest)
+
+        assert status == 1
+        assert len(chunks) == 2
+        cursor.execute("select count(*) from booking")
+        assert cursor.fetchone()[0] == 0
+        cursor.execute("select count(*) from scrape_coverage")
+        assert cursor.fetchone()[0] == 0
@@ -0,0 +1,85 @@
+from datetime import datetime
+import gzip
+import os
+import pytest
+
+from bookinglog import archive
+
+
+@pytest.fixture
+def root(tmpdir):
+    return str(tmpdir.join("archive"))
+
+
+class TestStore(object):
+    def test_round_trip(self, root):
+        content = b"<p>something</p>"
+
+        record = archive.store(root, content, "latest")
+
+        assert archive.load(root, record["digest"]) == content
+        assert record["search"] == "latest"
+        assert record["size"] == len(content)
+        assert not record["duplicate"]
+
+    def test_compressed(self, root):
+        content = b"<p>something</p>" * 100
+
+        record = archive.store(root, content, "latest")
+
+        path = archive.object_path(root, record["digest"])
+        assert os.path.getsize(path) < len(content)
+        with gzip.open(path) as fh:
+            assert fh.read() == content
+
+    def test_deduplicates(self, root):
+        first = archive.store(root, b"<p>a</p>", "latest")
+        second = archive.store(root, b"<p>a</p>", "latest")
+        third = archive.store(root, b"<p>a</p>", "current")
+
+        assert first["digest"] == second["digest"] == third["digest"]
+        assert second["duplicate"]
+        # Identical to a fetch of a different search.
+        assert not third["duplicate"]
+
+        objects = os.path.join(root, archive.OBJECTS_DIRNAME)
+        stored = [f for _, _, files in os.walk(objects) for f in files]
+        assert len(stored) == 1
+
+    def test_changed_page_is_not_duplicate(self, root):
+        archive.store(root, b"<p>a</p>", "latest")
+        archive.store(root, b"<p>b</p>", "latest")
+        record = archive.store(root, b"<p>a</p>", "latest")
+
+        assert not record["duplicate"]
+
+class TestIndex(object):
+    def test_empty(self, root):
+        assert list(archive.index(root)) == []
+        assert archive.last(root, "latest") is None
+
+    def test_order(self, root):
+        times = [datetime(2016, 7, day) for day in (13, 14, 15)]
+        for i, fetched_at in enumerate(times):
+            content = "<p>{}</p>".format(i).encode()
+            archive.store(root, content, "current", fetched_at=fetched_at)
+
+        out = [record["fetched_at"] for record in archive.index(root)]
+        assert out == [t.isoformat() for t in times]
+
+    def test_last(self, root):
+        archive.store(root, b"<p>a</p>", "latest")
+        archive.store(root, b"<p>b</p>", "current")
+        record = archive.store(root, b"<p>c</p>", "latest")
+        archive.store(root, b"<p>d</p>", "current")
+
+        assert archive.last(root, "latest") == record
+
+    @pytest.mark.parametrize("block_size", [1, 7, 8192])
+    def test_reverse_index(self, root, block_size):
+        for i in range(5):
+            content = "<p>{}</p>".format(i).encode()
+            archive.store(root, content, "latest")
+
+        out = list(archive.reverse_index(root, block_size=block_size))
+        assert out == list(archive.index(root))[::-1]
@@ -0,0 +1,40 @@
+import json
+import pytest
+
+from bookinglog import changes
+from bookinglog import coerce
+
+
+@pytest.fixture(scope="module")
+def entry():
+    with open("tests/data/mock.json") as fh:
+        data = json.load(fh)
+    return coerce.convert(*data)
+
+
+class TestContentHash(object):
+    def test_stable(self, entry):
+        inmate, charges = entry
+        reordered = dict(reversed(list(inmate.items())))
+
+        out = changes.content_hash(reordered, charges)
+        assert out == changes.content_hash(inmate, charges)
+        assert len(out) == 40
+
+    def test_inmate_changes(self, entry):
+        inmate, charges = entry
+        changed = {**inmate, "weight": inmate["weight"] + 1}
+
+        out = changes.content_hash(changed, charges)
+        assert out != changes.content_hash(inmate, charges)
+
+    def test_charges_change(self, entry):
+        inmate, charges = entry
+
+        out = changes.content_hash(inmate, charges[:1])
+        assert out != changes.content_hash(inmate, charges)
+
+class TestDetect(object):
+    def test_empty(self):
+        out = changes.detect([], cursor=None)
+        assert out == ([], {})
@@ -1,9 +1,18 @@
 from datetime import datetime
+from schema import SchemaError
 import json
+import pytest
 
 from bookinglog import coerce
 
 
+@pytest.fixture
+def entry():
+    with open("tests/data/mock.json") as fh:
+        data = json.load(fh)
+    return tuple(data)
+
+
 class TestKeywordize(object):
     def test_lowercases(self):
         value = "FooBar"
@@ -146,12 +155,40 @@ class TestConvertDT(object):
         out = coerce.convert_dt(dt)
         assert out is None
 
-class TestConvert(object):
-    def test_mock_data(self):
-        with open("tests/data/mock.json") as fh:
-            data = json.load(fh)
+class TestCompileFields(object):
+    def test_converts(self):
+        convert = coerce.compile_fields({"foo_bar": int, "baz": str})
+
+        out = convert({"Foo Bar": "1", "Baz": "x"})
+        assert out == {"foo_bar": 1, "baz": "x"}
+
+    def test_ignores_extra_keys(self):
+        convert = coerce.compile_fields({"foo": int})
+
+        out = convert({"Foo": "1", "Bar": "2"})
+        assert out == {"foo": 1}
 
-        inmate, charges = coerce.convert(*data)
+    def test_missing_key(self):
+        convert = coerce.compile_fields({"foo": int, "bar": int})
+
+        with pytest.raises(SchemaError):
+            convert({"Foo": "1", "Baz": "2"})
+
+    def test_invalid_value(self):
+        convert = coerce.compile_fields({"foo": int})
+
+        with pytest.raises(SchemaError):
+            convert({"Foo": "one"})
+
+    def test_not_a_record(self):
+        convert = coerce.compile_fields({"foo": int})
+
+        with pytest.raises(SchemaError):
+            convert([("Foo", "1")])
+
+class TestConvert(object):
+    def test_mock_data(self, entry):
+        inmate, charges = coerce.convert(*entry)
 
         assert inmate["jail_id"] == "PJAILID12"
         assert inmate["weight"] == 200
@@ -159,3 +196,47 @@ class TestConvert(object):
         assert len(charges) == 2
         assert charges[0]["bail"] == 0
         assert charges[1]["bail"] is None
+
+    def test_keys(self, entry):
+        inmate, charges = coerce.convert(*entry)
+
+        assert set(inmate) == set(coerce.inmate_fields)
+        assert all(set(charge) == set(coerce.charge_fields)
+                   for charge in charges)
+
+    @pytest.mark.parametrize("key, value", [
+        ("Weight", "heavy"),
+        ("Eye Color", "BL"),
+        ("Sex", None),
+        ("Height", 76),
+    ])
+    def test_invalid_inmate(self, entry, key, value):
+        inmate, charges = entry
+        inmate = {**inmate, key: value}
+
+        with pytest.raises(SchemaError):
+            coerce.convert(inmate, charges)
+
+    def test_missing_field(self, entry):
+        inmate, charges = entry
+        inmate = {k: v for k, v in inmate.items() if k != "Jail Id"}
+
+        with pytest.raises(SchemaError):
+            coerce.convert(inmate, charges)
+
+    def test_invalid_charge(self, entry):
+        inmate, charges = entry
+        charges = [{**charges[0], "Level": "MM"}]
+
+        with pytest.raises(SchemaError):
+            coerce.convert(inmate, charges)
+
+    def test_charges_not_list(self, entry):
+        inmate, charges = entry
+
+        with pytest.raises(SchemaError):
+            coerce.convert(inmate, tuple(charges))
+
+    def test_convert_many(self, entry):
+        out = coerce.convert_many([entry, entry])
+        assert out == [coerce.convert(*entry)] * 2
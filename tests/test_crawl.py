@@ -0,0 +1,217 @@
+from collections import Counter
+from urllib.parse import parse_qs
+import psycopg2
+import pytest
+import responses
+
+from bookinglog import coerce
+from bookinglog import config
+from bookinglog import crawl
+from bookinglog import pull
+from bookinglog import scrape
+
+
+URL = "https://apps.marincounty.org/BookingLog/Booking/Action"
+
+
+@pytest.fixture
+def cursor():
+    with psycopg2.connect(**config.pg_kwargs) as conn:
+        cursor = conn.cursor()
+        yield cursor
+
+        cursor.execute("delete from arrests")
+        cursor.execute("delete from inmates")
+        cursor.execute("delete from charge_items")
+        cursor.execute("delete from charges")
+        cursor.execute("delete from booking cascade")
+        cursor.execute("delete from daily_arrivals")
+        cursor.execute("delete from scrape_coverage")
+        conn.commit()
+
+@pytest.fixture(scope="module")
+def html():
+    with open("tests/data/mock.html") as fh:
+        mock_html = fh.read()
+    return mock_html
+
+
+class TestRateLimiter(object):
+    def test_spaces_out_calls(self):
+        now = [0.]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        limiter = crawl.RateLimiter(2., clock=lambda: now[0], sleep=sleep)
+        for _ in range(3):
+            limiter.wait()
+
+        assert sleeps == [.5, .5]
+
+    def test_no_limit(self):
+        sleeps = []
+        limiter = crawl.RateLimiter(0, clock=lambda: 0., sleep=sleeps.append)
+        limiter.wait()
+        limiter.wait()
+
+        assert sleeps == []
+
+class TestCrawl(object):
+    def test_normalize_names(self):
+        names = ["smith ", "Jones", "SMITH", ""]
+        assert crawl.normalize_names(names) == ["SMITH", "JONES"]
+
+    def test_dedupe(self):
+        calls = []
+
+        def ingest(entries, cursor):
+            calls.append([inmate["jail_id"] for inmate, _ in entries])
+            return Counter(inserted=len(entries))
+
+        deduper = crawl.Deduper(ingest)
+        deduper.ingest([({"jail_id": "1"}, []), ({"jail_id": "2"}, [])], None)
+        deduper.commit()
+        out = deduper.ingest(
+            [({"jail_id": "2"}, []), ({"jail_id": "3"}, [])], None)
+        deduper.commit()
+
+        assert calls == [["1", "2"], ["3"]]
+        assert out == {"inserted": 1, "duplicate": 1}
+        assert deduper.counts["ingested"] == 3
+        assert deduper.counts["inserted"] == 3
+        assert deduper.counts["duplicate"] == 1
+
+    def test_dedupe_rolled_back(self):
+        calls = []
+
+        def ingest(entries, cursor):
+            calls.append([inmate["jail_id"] for inmate, _ in entries])
+            return Counter(inserted=len(entries))
+
+        deduper = crawl.Deduper(ingest)
+        deduper.ingest([({"jail_id": "1"}, [])], None)
+        deduper.rollback()
+        deduper.ingest([({"jail_id": "1"}, [])], None)
+        deduper.commit()
+
+        assert calls == [["1"], ["1"]]
+        assert deduper.seen == {"1"}
+        assert deduper.counts["ingested"] == 1
+
+    def test_summarize(self):
+        latencies = [(.1, 10), (.4, 20), (.2, 30), (.3, 40)]
+        report = crawl.summarize(latencies, 2., Counter(ingested=10))
+
+        assert report["requests"] == 4
+        assert report["bytes"] == 100
+        assert report["requests_per_second"] == 2.
+        assert report["entries_per_second"] == 5.
+        assert report["latency_p50"] == .2
+        assert report["latency_max"] == .4
+
+    def test_check_names(self, html):
+        entries = [coerce.convert(*entry) for entry in pull.parse(html)]
+        crawl.check_names(entries[:1], "DUNLOP")
+        crawl.check_names(entries[:1], "DUN")
+
+        with pytest.raises(ValueError):
+            crawl.check_names(entries, "DUNLOP")
+
+    def test_dedupe_checks_names(self):
+        calls = []
+
+        def ingest(entries, cursor):
+            calls.append(entries)
+            return Counter(inserted=len(entries))
+
+        deduper = crawl.Deduper(ingest)
+        entries = [({"jail_id": "1", "name": "SMITH, JOHN"}, [])]
+        with pytest.raises(ValueError):
+            deduper.ingest(entries, None, last_name="JONES")
+        deduper.rollback()
+        deduper.ingest(entries, None, last_name="SMITH")
+
+        assert len(calls) == 1
+
+    @pytest.mark.integration
+    @responses.activate
+    def test_searches_names(self, html, cursor):
+        # Pages of results for each last name.
+        pages = {
+            inmate["Name"].split(",")[0]: fragment
+            for fragment in pull.split(html)
+            for inmate, _ in pull.parse(fragment)
+        }
+        bodies = []
+
+        def cb(request):
+            bodies.append(request.body)
+            last_name = parse_qs(request.body)["LastName"][0]
+            results = [
+                page for name, page in pages.items()
+                if name.startswith(last_name)
+            ]
+            return (200, {}, "".join(results))
+
+        responses.add_callback(responses.POST, URL, callback=cb)
+
+        with psycopg2.connect(**config.pg_kwargs) as conn:
+            status, report = crawl.crawl(
+                ["Dunlop", "dun", "rodriguez", "DUNLOP"], conn, rate=0)
+
+        assert status == 0
+        assert sorted(bodies) == [
+            "LastName=DUN&SearchByLastName=Search",
+            "LastName=DUNLOP&SearchByLastName=Search",
+            "LastName=RODRIGUEZ&SearchByLastName=Search",
+        ]
+        # DUNLOP turns up in two searches, and is ingested once.
+        assert report["requests"] == 3
+        assert report["ingested"] == 2
+        assert report["duplicate"] == 1
+        assert report["inserted"] == 2
+
+        cursor.execute("select count(*) from booking")
+        assert cursor.fetchone()[0] == 2
+        cursor.execute("select search, runs from scrape_coverage")
+        assert cursor.fetchall() == [("last-name", 3)]
+
+    @pytest.mark.integration
+    @responses.activate
+    def test_unrecognized_search(self, html, cursor):
+        # The full page, as if the search's fields were ignored.
+        responses.add(responses.POST, URL, body=html)
+
+        with psycopg2.connect(**config.pg_kwargs) as conn:
+            status, report = crawl.crawl(["DUNLOP"], conn, rate=0)
+
+        assert status == 1
+        assert report["ingested"] == 0
+
+        cursor.execute("select count(*) from booking")
+        assert cursor.fetchone()[0] == 0
+
+    @pytest.mark.integration
+    @responses.activate
+    def test_jail_id_names(self, html, cursor):
+        responses.add(responses.POST, URL, body=html)
+
+        assert scrape.main("latest") == 0
+
+        cursor.execute("select jail_id from booking order by jail_id")
+        jail_ids = [jail_id for jail_id, in cursor.fetchall()]
+        assert crawl.jail_id_names(jail_ids, cursor) == ["DUNLOP", "RODRIGUEZ"]
+
+    @pytest.mark.external
+    def test_last_name_search(self):
+        current = pull.parse(pull.scrape("current"))
+        last_name = current[0][0]["Name"].split(",")[0]
+
+        html = pull.scrape("last-name", last_name=last_name)
+
+        entries = [coerce.convert(*entry) for entry in pull.parse(html)]
+        assert entries
+        crawl.check_names(entries, last_name)
@@ -0,0 +1,147 @@
+from contextlib import contextmanager
+import json
+import psycopg2
+import pytest
+import responses
+import threading
+
+from bookinglog import config
+from bookinglog import daemon
+from bookinglog import metrics
+
+
+URL = "https://apps.marincounty.org/BookingLog/Booking/Action"
+
+
+@pytest.fixture
+def cursor():
+    with psycopg2.connect(**config.pg_kwargs) as conn:
+        cursor = conn.cursor()
+        yield cursor
+
+        cursor.execute("delete from arrests")
+        cursor.execute("delete from inmates")
+        cursor.execute("delete from charge_items")
+        cursor.execute("delete from charges")
+        cursor.execute("delete from booking cascade")
+        cursor.execute("delete from daily_arrivals")
+        cursor.execute("delete from scrape_coverage")
+        conn.commit()
+
+@pytest.fixture(scope="module")
+def html():
+    with open("tests/data/mock.html") as fh:
+        mock_html = fh.read()
+    return mock_html
+
+
+class TestSchedule(object):
+    def test_next_due(self):
+        schedule = daemon.make_schedule({"latest": 10., "current": 60.}, 0.)
+        schedule["latest"]["due"] = 5.
+
+        assert daemon.next_due(schedule) == "current"
+
+    def test_backs_off_while_unchanged(self):
+        schedule = daemon.make_schedule({"latest": 10.}, 0.)
+        state = schedule["latest"]
+
+        daemon.reschedule(state, False, 100., backoff=2., max_backoff=3.)
+        assert state["interval"] == 20.
+        assert state["due"] == 120.
+
+        daemon.reschedule(state, False, 120., backoff=2., max_backoff=3.)
+        assert state["interval"] == 30.
+
+        daemon.reschedule(state, True, 150., backoff=2., max_backoff=3.)
+        assert state["interval"] == 10.
+        assert state["due"] == 160.
+
+
+class TestPoll(object):
+    @pytest.mark.integration
+    @responses.activate
+    def test_skips_unchanged_pages(self, html, cursor):
+        responses.add(method="POST", url=URL, body=html)
+        state = daemon.make_schedule({"latest": 10.}, 0.)["latest"]
+
+        with psycopg2.connect(**config.pg_kwargs) as conn:
+            outcomes = [
+                daemon.poll("latest", state, None, conn) for _ in range(2)]
+
+        assert outcomes == ["changed", "unchanged"]
+        assert state["counts"]["polls"] == 2
+        assert state["counts"]["inserted"] == 2
+
+        cursor.execute("select count(*) from booking")
+        assert cursor.fetchone()[0] == 2
+        cursor.execute("select sum(runs) from scrape_coverage")
+        assert cursor.fetchone()[0] == 2
+
+    @pytest.mark.integration
+    @responses.activate
+    def test_failed_scrape(self, cursor):
+        responses.add(method="POST", url=URL, status=404)
+        state = daemon.make_schedule({"latest": 10.}, 0.)["latest"]
+
+        with psycopg2.connect(**config.pg_kwargs) as conn:
+            outcome = daemon.poll("latest", state, None, conn)
+
+        assert outcome == "failed"
+        assert state["counts"]["failed"] == 1
+        assert state["digest"] is None
+
+
+class TestMain(object):
+    @pytest.mark.integration
+    @responses.activate
+    def test_polls_each_search(self, html, cursor, tmpdir):
+        responses.add(method="POST", url=URL, body=html)
+        status_file = str(tmpdir.join("status.json"))
+
+        schedule = daemon.main(
+            {"latest": 0., "current": 0.},
+            stop=threading.Event(),
+            max_polls=2,
+            status_file=status_file
+        )
+
+        assert len(responses.calls) == 2
+        assert schedule["latest"]["counts"]["changed"] == 1
+        assert schedule["current"]["counts"]["changed"] == 1
+
+        with open(status_file) as fh:
+            status = json.load(fh)
+        assert status["searches"]["latest"]["counts"]["polls"] == 1
+
+    @responses.activate
+    def test_failed_connection(self, html, tmpdir, monkeypatch):
+        responses.add(method="POST", url=URL, body=html)
+        metrics_file = str(tmpdir.join("bookinglog.prom"))
+
+        @contextmanager
+        def connection():
+            raise psycopg2.OperationalError("Connection refused")
+            yield
+
+        monkeypatch.setattr(daemon.db, "connection", connection)
+        metrics.increment("http_requests")
+
+        schedule = daemon.main(
+            {"latest": 0.},
+            stop=threading.Event(),
+            max_polls=1,
+            metrics_file=metrics_file
+        )
+
+        assert schedule["latest"]["counts"]["failed"] == 1
+        with open(metrics_file) as fh:
+            assert "bookinglog_http_requests_total" in fh.read()
+
+    def test_stops(self):
+        stop = threading.Event()
+        stop.set()
+
+        schedule = daemon.main({"latest": 0.}, stop=stop)
+
+        assert schedule["latest"]["counts"]["polls"] == 0
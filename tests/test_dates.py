@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+import pytest
+
+from bookinglog import dates
+
+
+class TestParseDate(object):
+    @pytest.mark.parametrize("value", [
+        "9/5/1987",
+        "09/05/1987",
+        "12/31/1999",
+        "2/29/2016",
+    ])
+    def test_matches_strptime(self, value):
+        expected = datetime.strptime(value, "%m/%d/%Y")
+
+        out = dates.parse_date(value)
+        assert out == expected
+
+    @pytest.mark.parametrize("value", [
+        "9/150/1987",
+        "13/1/1987",
+        "2/30/2016",
+        "9/15/87",
+        "9/15/1987 ",
+        "9/15/1987\n",
+        "",
+    ])
+    def test_invalid(self, value):
+        with pytest.raises(ValueError):
+            dates.parse_date(value)
+
+class TestParseDatetime(object):
+    @pytest.mark.parametrize("value", [
+        "9/15/2016 4:15 AM",
+        "9/15/2016 4:15 PM",
+        "09/15/2016 04:05 pm",
+        "1/1/2017 12:00 AM",
+        "1/1/2017 12:30 PM",
+        "1/1/2017 11:59 PM",
+    ])
+    def test_matches_strptime(self, value):
+        naive = datetime.strptime(value, "%m/%d/%Y %I:%M %p")
+        expected = dates.PACIFIC.localize(naive)
+
+        out = dates.parse_datetime(value)
+        assert out == expected
+        assert out.replace(tzinfo=None) == naive
+
+    @pytest.mark.parametrize("value", [
+        "9/15/2016 0:15 AM",
+        "9/15/2016 13:15 PM",
+        "9/15/2016 4:60 PM",
+        "9/15/2016 4:15",
+        "9/15/2016 4:15 PM EST",
+        "Sept. 15, 2016 4:15 PM",
+    ])
+    def test_invalid(self, value):
+        with pytest.raises(ValueError):
+            dates.parse_datetime(value)
+
+    def test_standard_time(self):
+        out = dates.parse_datetime("1/15/2016 9:00 AM")
+        assert out.utcoffset() == timedelta(hours=-8)
+
+    def test_daylight_saving_time(self):
+        out = dates.parse_datetime("7/15/2016 9:00 AM")
+        assert out.utcoffset() == timedelta(hours=-7)
+
+    def test_skipped_hour(self):
+        # Clocks went forward from 2:00 to 3:00 on 3/13/2016.
+        out = dates.parse_datetime("3/13/2016 2:30 AM")
+        assert out.hour == 3
+        assert out.minute == 30
+        assert out.utcoffset() == timedelta(hours=-7)
+
+    def test_repeated_hour(self):
+        # Clocks went back from 2:00 to 1:00 on 11/6/2016.
+        out = dates.parse_datetime("11/6/2016 1:30 AM")
+        assert out.hour == 1
+        assert out.utcoffset() == timedelta(hours=-8)
+
+    def test_cached(self):
+        value = "6/1/2016 1:23 PM"
+        first = dates.parse_datetime(value)
+        hits = dates.parse_datetime.cache_info().hits
+
+        out = dates.parse_datetime(value)
+        assert out is first
+        assert dates.parse_datetime.cache_info().hits == hits + 1
@@ -0,0 +1,115 @@
+import psycopg2
+import pytest
+
+from bookinglog import config
+from bookinglog import db
+
+
+@pytest.fixture
+def pool():
+    pool = db.make_pool(1, 2)
+    yield pool
+    pool.closeall()
+
+
+class TestPrepared(object):
+    def test_to_positional(self):
+        query = "SELECT %(a)s, %(b)s, %(a)s, '100%%'"
+
+        out, names = db.to_positional(query)
+        assert out == "SELECT $1, $2, $1, '100%'"
+        assert names == ["a", "b"]
+
+    @pytest.mark.integration
+    def test_prepares_once(self):
+        record = {
+            "jail_id": "PREPARED1",
+            "orig_booking_date": None,
+            "latest_charge_date": None,
+            "content_hash": None,
+        }
+
+        with psycopg2.connect(**config.pg_kwargs) as conn:
+            cursor = conn.cursor()
+            db.execute(cursor, "insert_entry", record)
+            first = cursor.fetchone()[0]
+            db.execute(cursor, "insert_entry", record)
+            assert cursor.fetchone()[0] == first
+
+            cursor.execute(
+                "SELECT count(*) FROM pg_prepared_statements "
+                "WHERE name = 'insert_entry'")
+            assert cursor.fetchone()[0] == 1
+            conn.rollback()
+
+    @pytest.mark.integration
+    def test_survives_rollback(self):
+        record = {
+            "jail_id": "PREPARED2",
+            "orig_booking_date": None,
+            "latest_charge_date": None,
+            "content_hash": None,
+        }
+
+        with psycopg2.connect(**config.pg_kwargs) as conn:
+            cursor = conn.cursor()
+            db.execute(cursor, "insert_entry", record)
+            conn.rollback()
+
+            # Executed by name, without preparing it again.
+            db.execute(cursor, "insert_entry", record)
+            assert cursor.fetchone()[0] is not None
+            conn.rollback()
+
+class TestPool(object):
+    @pytest.mark.integration
+    def test_commits_and_rolls_back(self, pool):
+        with db.connection(pool) as conn:
+            conn.cursor().execute(
+                "CREATE TEMPORARY TABLE pooled (x integer)")
+
+        with pytest.raises(ValueError):
+            with db.connection(pool) as conn:
+                conn.cursor().execute("INSERT INTO pooled VALUES (1)")
+                raise ValueError
+
+        with db.connection(pool) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT count(*) FROM pooled")
+            assert cursor.fetchone()[0] == 0
+
+    @pytest.mark.integration
+    def test_keeps_error_if_rollback_fails(self, pool):
+        with pytest.raises(ValueError):
+            with db.connection(pool) as conn:
+                conn.cursor().execute("SELECT 1")
+                with psycopg2.connect(**config.pg_kwargs) as other:
+                    other.cursor().execute(
+                        "SELECT pg_terminate_backend(%s)",
+                        (conn.get_backend_pid(),))
+                raise ValueError
+
+    @pytest.mark.integration
+    def test_replaces_lost_connections(self, pool):
+        with db.connection(pool) as conn:
+            conn.cursor().execute("SELECT pg_backend_pid()")
+            lost = conn
+
+        # Drop the connection from the server's side while it's idle.
+        with psycopg2.connect(**config.pg_kwargs) as other:
+            other.cursor().execute(
+                "SELECT pg_terminate_backend(%s)", (lost.get_backend_pid(),))
+
+        db._returned_at[lost] = 0.
+        with db.connection(pool) as conn:
+            assert conn is not lost
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            assert cursor.fetchone()[0] == 1
+        assert lost.closed
+
+    @pytest.mark.integration
+    def test_shared_pool(self):
+        assert db.get_pool() is db.get_pool()
+        db.close_pool()
+        assert not db.get_pool().closed
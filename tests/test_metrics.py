@@ -0,0 +1,159 @@
+import psycopg2
+import pytest
+import requests
+import responses
+
+from bookinglog import config
+from bookinglog import metrics
+from bookinglog import scrape
+
+
+URL = "https://apps.marincounty.org/BookingLog/Booking/Action"
+
+
+@pytest.fixture
+def cursor():
+    with psycopg2.connect(**config.pg_kwargs) as conn:
+        cursor = conn.cursor()
+        yield cursor
+
+        cursor.execute("delete from arrests")
+        cursor.execute("delete from inmates")
+        cursor.execute("delete from charge_items")
+        cursor.execute("delete from charges")
+        cursor.execute("delete from booking cascade")
+        cursor.execute("delete from daily_arrivals")
+        cursor.execute("delete from scrape_coverage")
+        conn.commit()
+
+@pytest.fixture(scope="module")
+def html():
+    with open("tests/data/mock.html") as fh:
+        mock_html = fh.read()
+    return mock_html
+
+@pytest.fixture(autouse=True)
+def reset():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+class TestTimers(object):
+    def test_timer(self):
+        for _ in range(2):
+            with metrics.timer("stage"):
+                pass
+
+        timer = metrics.snapshot()["timers"]["stage"]
+        assert timer["calls"] == 2
+        assert timer["wall_seconds"] >= 0
+
+    def test_timer_records_failures(self):
+        with pytest.raises(ValueError):
+            with metrics.timer("stage"):
+                raise ValueError
+
+        assert metrics.snapshot()["timers"]["stage"]["calls"] == 1
+
+    def test_timed_iter(self):
+        out = list(metrics.timed_iter("stage", lambda: iter([1, 2, 3])))
+
+        assert out == [1, 2, 3]
+        # Making the iterator, each item and the end of iteration.
+        assert metrics.snapshot()["timers"]["stage"]["calls"] == 5
+
+    def test_cpu_time_without_thread_time(self, monkeypatch):
+        monkeypatch.setattr(metrics, "cpu_time", metrics.time.process_time)
+
+        with metrics.timer("stage"):
+            sum(range(1000))
+
+        assert metrics.snapshot()["timers"]["stage"]["cpu_seconds"] >= 0
+
+    def test_counters(self):
+        metrics.increment("entries_ingested", 10)
+        metrics.increment("entries_ingested")
+
+        snapshot = metrics.snapshot()
+        assert snapshot["counters"] == {"entries_ingested": 11}
+        assert snapshot["records_per_second"]["overall"] > 0
+
+class TestExport(object):
+    def test_to_prometheus(self):
+        out = metrics.to_prometheus({
+            "timers": {
+                "fetch": {
+                    "calls": 2, "wall_seconds": 1.5, "cpu_seconds": .25},
+            },
+            "counters": {"bytes_downloaded": 100},
+            "elapsed_seconds": 2.,
+            "records_per_second": {"overall": 5.},
+        })
+
+        lines = out.splitlines()
+        assert "# TYPE bookinglog_stage_seconds_total counter" in lines
+        assert 'bookinglog_stage_calls_total{stage="fetch"} 2' in lines
+        assert (
+            'bookinglog_stage_seconds_total{stage="fetch",clock="wall"} 1.5'
+            in lines)
+        assert "bookinglog_bytes_downloaded_total 100" in lines
+        assert 'bookinglog_records_per_second{stage="overall"} 5.0' in lines
+
+    def test_report(self, tmpdir):
+        path = str(tmpdir.join("bookinglog.prom"))
+        metrics.increment("http_requests")
+
+        out = metrics.report(path)
+
+        assert out["counters"]["http_requests"] == 1
+        with open(path) as fh:
+            assert "bookinglog_http_requests_total 1" in fh.read()
+
+    def test_serve(self):
+        metrics.increment("http_requests")
+        server = metrics.serve(0, host="127.0.0.1")
+        try:
+            url = "http://127.0.0.1:{}/metrics".format(server.server_port)
+            response = requests.get(url)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert response.status_code == 200
+        assert "bookinglog_http_requests_total 1" in response.text
+
+class TestInstrumentation(object):
+    @pytest.mark.integration
+    @responses.activate
+    def test_scrape(self, html, cursor):
+        responses.add(method="POST", url=URL, body=html)
+
+        assert scrape.main("latest") == 0
+
+        snapshot = metrics.snapshot()
+        timers = snapshot["timers"]
+        for stage in ("fetch", "parse", "coerce", "ingest"):
+            assert timers[stage]["calls"] > 0
+        assert timers["query.insert_entry"]["calls"] == 2
+        assert timers["query.insert_coverage"]["calls"] == 1
+
+        counters = snapshot["counters"]
+        assert counters["http_requests"] == 1
+        assert counters["bytes_downloaded"] == len(html.encode())
+        assert counters["entries_parsed"] == 2
+        assert counters["entries_converted"] == 2
+        assert counters["entries_ingested"] == 2
+        assert counters["db_round_trips"] >= 8
+
+    @pytest.mark.integration
+    @responses.activate
+    def test_batch_scrape(self, html, cursor):
+        responses.add(method="POST", url=URL, body=html)
+
+        assert scrape.main("latest", ingest_mode="batch") == 0
+
+        timers = metrics.snapshot()["timers"]
+        for name in ("insert_entries", "insert_arrests", "insert_inmates",
+                     "insert_charges"):
+            assert timers["query." + name]["calls"] == 1
@@ -0,0 +1,123 @@
+from collections import Counter
+import json
+import pytest
+
+from bookinglog import pipeline
+from bookinglog import pull
+
+
+@pytest.fixture(scope="module")
+def entry():
+    with open("tests/data/mock.json") as fh:
+        data = json.load(fh)
+    return tuple(data)
+
+@pytest.fixture(scope="module")
+def html():
+    with open("tests/data/mock.html") as fh:
+        mock_html = fh.read()
+    return mock_html
+
+@pytest.fixture
+def invalid_entry(entry):
+    inmate, charges = entry
+    return {**inmate, "Weight": "heavy"}, charges
+
+
+class TestChunked(object):
+    def test_chunks(self):
+        out = list(pipeline.chunked(range(5), 2))
+        assert out == [[0, 1], [2, 3], [4]]
+
+    def test_empty(self):
+        out = list(pipeline.chunked([], 2))
+        assert out == []
+
+    def test_lazy(self):
+        def gen():
+            yield 1
+            raise AssertionError("Consumed too far")
+
+        chunks = pipeline.chunked(gen(), 1)
+        assert next(chunks) == [1]
+
+class TestConvert(object):
+    def test_counts(self, entry, invalid_entry):
+        counts = Counter()
+        entries = [entry, invalid_entry, entry]
+
+        out = list(pipeline.convert(entries, counts))
+
+        assert len(out) == 2
+        assert out[0][0]["weight"] == 200
+        assert counts == {"parsed": 3, "converted": 2, "failed": 1}
+
+class TestRun(object):
+    def test_ingests_in_chunks(self, entry, invalid_entry):
+        chunks = []
+
+        def ingest(chunk, cursor):
+            assert cursor == "cursor"
+            chunks.append(len(chunk))
+            return Counter(inserted=len(chunk))
+
+        entries = [entry] * 5 + [invalid_entry]
+        counts = pipeline.run(entries, "cursor", ingest, chunk_size=2)
+
+        assert chunks == [2, 2, 1]
+        assert counts["parsed"] == 6
+        assert counts["failed"] == 1
+        assert counts["ingested"] == 5
+        assert counts["inserted"] == 5
+
+    def test_writes_before_parsing_finishes(self, entry):
+        written = []
+
+        def entries():
+            yield entry
+            # The first chunk is written before the next entry is parsed.
+            assert written == [1]
+            yield entry
+
+        def ingest(chunk, cursor):
+            written.append(len(chunk))
+            return Counter()
+
+        counts = pipeline.run(entries(), None, ingest, chunk_size=1)
+        assert counts["ingested"] == 2
+
+    def test_write(self, entry):
+        def ingest(chunk, cursor):
+            return Counter(inserted=len(chunk))
+
+        counts = Counter(parsed=3)
+        out = pipeline.write([entry] * 3, None, ingest, 2, counts)
+
+        assert out is counts
+        assert counts == {"parsed": 3, "ingested": 3, "inserted": 3}
+
+class TestRunParallel(object):
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_matches_serial(self, html, workers, monkeypatch):
+        monkeypatch.setattr(pipeline, "FRAGMENTS_PER_TASK", 1)
+
+        def ingest(chunk, cursor):
+            cursor.extend(chunk)
+            return Counter(inserted=len(chunk))
+
+        expected = []
+        expected_counts = pipeline.run(
+            pull.iter_parse(html), expected, ingest, chunk_size=1)
+
+        out = []
+        counts = pipeline.run_parallel(
+            html, out, ingest, workers=workers, chunk_size=1)
+
+        assert out == expected
+        assert counts == expected_counts
+
+class TestImap(object):
+    @pytest.mark.parametrize("workers", [1, 3])
+    def test_ordered(self, workers):
+        out = list(pipeline.imap(abs, range(0, -20, -1), workers=workers))
+        assert out == list(range(20))
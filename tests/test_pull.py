@@ -1,5 +1,6 @@
 from bs4 import BeautifulSoup
 import pytest
+import requests
 import responses
 
 from bookinglog import pull
@@ -96,6 +97,21 @@ class TestParse(object):
         out = pull.parse(html)
         assert len(out) == 2
 
+    @pytest.mark.parametrize("engine", ["bs4", "lxml"])
+    def test_iter_parse(self, html, engine):
+        entries = pull.iter_parse(html, engine=engine)
+
+        inmate, _ = next(entries)
+        assert inmate["Jail Id"] == "PJAILID11"
+        assert len(list(entries)) == 1
+
+    @pytest.mark.parametrize("engine", ["bs4", "lxml"])
+    def test_engines_agree(self, html, engine):
+        expected = pull.parse(html)
+
+        out = pull.parse(html, engine=engine)
+        assert out == expected
+
     def test_charges(self, html):
         expected_first = [{
             "Charge": "11377 HS",
@@ -180,6 +196,41 @@ class TestParse(object):
         assert out[0][0] == expected_first
         assert out[1][0] == expected_second
 
+class TestSplit(object):
+    def test_fragments(self, html):
+        out = pull.split(html)
+
+        assert len(out) == 2
+        assert all('id="sec1"' in fragment for fragment in out)
+        assert all('id="sec2"' in fragment for fragment in out)
+
+    @pytest.mark.parametrize("engine", ["bs4", "lxml"])
+    def test_parse_fragments(self, html, engine):
+        expected = pull.parse(html, engine=engine)
+
+        out = [
+            entry
+            for fragment in pull.split(html.encode("utf-8"))
+            for entry in pull.parse(fragment, engine=engine)
+        ]
+        assert out == expected
+
+    def test_no_entries(self):
+        assert pull.split("<html><body></body></html>") == []
+
+    @pytest.mark.parametrize("tag, expected", [
+        ('<div id="sec1">', 1),
+        ("<div class='a' id='sec1'>", 1),
+        ("<div id=sec1>", 1),
+        ('<div id = "sec1" >', 1),
+        ('<div id="sec1-x">', 0),
+        ("<div id=sec10>", 0),
+        ('<div data-id="sec1">', 0),
+    ])
+    def test_section_ids(self, tag, expected):
+        out = pull.split("<html><body>" + tag + "</div></body></html>")
+        assert len(out) == expected
+
 class TestScrape(object):
     @pytest.mark.parametrize(
         "search, expected_body", [
@@ -204,6 +255,99 @@ class TestScrape(object):
         out = pull.scrape(search)
         assert out == content.encode()
 
+    @responses.activate
+    def test_last_name(self, url):
+        responses.add(responses.POST, url, body="<p>something</p>")
+
+        pull.scrape("last-name", last_name="O'NEIL")
+
+        body = responses.calls[0].request.body
+        assert body == "LastName=O%27NEIL&SearchByLastName=Search"
+
+    def test_last_name_required(self):
+        with pytest.raises(ValueError):
+            pull.search_body("last-name")
+
+    @responses.activate
+    def test_retries_server_errors(self, url):
+        statuses = iter([503, 500, 200])
+
+        def cb(request):
+            return (next(statuses), {}, "<p>something</p>")
+
+        responses.add_callback(responses.POST, url, callback=cb)
+
+        out = pull.scrape("latest", retries=2, backoff=0)
+        assert out == b"<p>something</p>"
+        assert len(responses.calls) == 3
+
+    @responses.activate
+    def test_gives_up(self, url):
+        responses.add(responses.POST, url, status=503)
+
+        with pytest.raises(requests.HTTPError):
+            pull.scrape("latest", retries=2, backoff=0)
+        assert len(responses.calls) == 3
+
+    @responses.activate
+    def test_does_not_retry_client_errors(self, url):
+        responses.add(responses.POST, url, status=404)
+
+        with pytest.raises(requests.HTTPError):
+            pull.scrape("latest", retries=2, backoff=0)
+        assert len(responses.calls) == 1
+
+    @responses.activate
+    def test_retries_connection_errors(self, url):
+        failures = iter([True, False])
+
+        def cb(request):
+            if next(failures):
+                raise requests.ConnectionError("Connection refused")
+            return (200, {}, "<p>something</p>")
+
+        responses.add_callback(responses.POST, url, callback=cb)
+
+        out = pull.scrape("latest", retries=1, backoff=0)
+        assert out == b"<p>something</p>"
+
+    @responses.activate
+    def test_session(self, url):
+        responses.add(responses.POST, url, body="<p>something</p>")
+
+        with pull.make_session() as session:
+            pull.scrape("latest", session=session)
+            pull.scrape("current", session=session)
+
+        assert len(responses.calls) == 2
+        request = responses.calls[0].request
+        assert "gzip" in request.headers["Accept-Encoding"]
+        assert request.headers["Content-Type"] == (
+            "application/x-www-form-urlencoded")
+
+    @responses.activate
+    def test_closes_own_session(self, url, monkeypatch):
+        responses.add(responses.POST, url, body="<p>something</p>")
+        sessions = []
+
+        def make_session():
+            sessions.append(requests.Session())
+            return sessions[-1]
+
+        monkeypatch.setattr(pull, "make_session", make_session)
+        closed = []
+        monkeypatch.setattr(
+            requests.Session, "close", lambda self: closed.append(self))
+
+        pull.scrape("latest")
+
+        assert closed == sessions
+
+    def test_backoff_delay(self):
+        for attempt in range(4):
+            delay = pull.backoff_delay(attempt, 0.5)
+            assert 0 <= delay <= 0.5 * 2 ** attempt
+
     @pytest.mark.external
     @pytest.mark.parametrize("search", ["latest", "current"])
     def test_request_returns_html(self, search):
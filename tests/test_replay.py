@@ -0,0 +1,110 @@
+from datetime import datetime
+import pytest
+import sys
+
+from bookinglog import __main__ as cli
+from bookinglog import archive
+from bookinglog import config
+from bookinglog import replay
+
+import psycopg2
+
+
+@pytest.fixture(scope="module")
+def html():
+    with open("tests/data/mock.html", "rb") as fh:
+        mock_html = fh.read()
+    return mock_html
+
+@pytest.fixture
+def root(tmpdir):
+    return str(tmpdir.join("archive"))
+
+@pytest.fixture
+def cursor():
+    with psycopg2.connect(**config.pg_kwargs) as conn:
+        cursor = conn.cursor()
+        yield cursor
+
+        cursor.execute("delete from arrests")
+        cursor.execute("delete from inmates")
+        cursor.execute("delete from charge_items")
+        cursor.execute("delete from charges")
+        cursor.execute("delete from booking cascade")
+        cursor.execute("delete from daily_arrivals")
+        cursor.execute("delete from scrape_coverage")
+        conn.commit()
+
+
+class TestSelect(object):
+    def test_filters(self):
+        records = [
+            {"search": "latest", "fetched_at": "2016-07-13T10:00:00",
+             "duplicate": False},
+            {"search": "latest", "fetched_at": "2016-07-14T10:00:00",
+             "duplicate": True},
+            {"search": "current", "fetched_at": "2016-07-15T10:00:00",
+             "duplicate": False},
+            {"search": "latest", "fetched_at": "2016-07-16T10:00:00",
+             "duplicate": False},
+        ]
+
+        out = list(replay.select(records))
+        assert out == [records[0], records[2], records[3]]
+
+        out = list(replay.select(records, duplicates=True))
+        assert out == records
+
+        out = list(replay.select(records, search_types=["current"]))
+        assert out == [records[2]]
+
+        out = list(replay.select(
+            records, since="2016-07-13", until="2016-07-16"))
+        assert out == [records[0], records[2]]
+
+class TestConvertPage(object):
+    def test_converts(self, root, html):
+        record = archive.store(root, html, "current")
+
+        out_record, entries, counts = replay.convert_page(root, "lxml", record)
+
+        assert out_record == record
+        assert [inmate["jail_id"] for inmate, _ in entries] == [
+            "PJAILID11", "PJAILID12"]
+        assert counts["converted"] == 2
+
+    def test_missing_page(self, root):
+        record = {"digest": "0" * 64}
+
+        _, entries, _ = replay.convert_page(root, "bs4", record)
+        assert entries is None
+
+class TestMain(object):
+    @pytest.mark.integration
+    @pytest.mark.parametrize("workers", [1, 2])
+    @pytest.mark.parametrize("ingest_mode", ["row", "batch", "copy"])
+    def test_replays(self, root, html, cursor, workers, ingest_mode):
+        archive.store(root, html, "current", fetched_at=datetime(2016, 7, 15))
+        archive.store(root, html, "current", fetched_at=datetime(2016, 7, 16))
+
+        status = replay.main(root, workers=workers, ingest_mode=ingest_mode)
+        assert status == 0
+
+        cursor.execute("select count(*) from booking")
+        assert cursor.fetchone()[0] == 2
+        cursor.execute("select count(*) from charges")
+        assert cursor.fetchone()[0] == 2
+
+    @pytest.mark.integration
+    # The module was imported by the tests before the command runs it.
+    @pytest.mark.filterwarnings("ignore::RuntimeWarning")
+    def test_subcommand(self, root, html, cursor, monkeypatch):
+        archive.store(root, html, "current", fetched_at=datetime(2016, 7, 15))
+        monkeypatch.setattr(sys, "argv", list(sys.argv))
+
+        with pytest.raises(SystemExit) as exit:
+            cli.main(["bookinglog", "replay", "--archive", root])
+        assert exit.value.code == 0
+
+        cursor.execute("select count(*) from booking")
+        assert cursor.fetchone()[0] == 2
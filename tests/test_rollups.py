@@ -0,0 +1,128 @@
+from datetime import date, datetime
+import psycopg2
+import pytest
+
+from bookinglog import config
+from bookinglog import dates
+from bookinglog import rollups
+from bookinglog import scrape
+
+
+@pytest.fixture
+def cursor():
+    with psycopg2.connect(**config.pg_kwargs) as conn:
+        cursor = conn.cursor()
+        yield cursor
+
+        cursor.execute("delete from arrests")
+        cursor.execute("delete from inmates")
+        cursor.execute("delete from charge_items")
+        cursor.execute("delete from charges")
+        cursor.execute("delete from booking cascade")
+        cursor.execute("delete from daily_arrivals")
+        cursor.execute("delete from scrape_coverage")
+        conn.commit()
+
+def make_entry(jail_id, booked_at):
+    inmate = {
+        "address": "SAN RAFAEL, CA",
+        "arrest_agency": "San Rafael PD",
+        "arrest_date": booked_at,
+        "arrest_location": "75 ALBERTS PARK",
+        "date_of_birth": datetime(1981, 10, 8),
+        "eye_color": "BLU",
+        "hair_color": "BRO",
+        "height": 70,
+        "jail_id": jail_id,
+        "latest_charge_date": booked_at,
+        "name": "DUNLOP, FUZZY",
+        "occupation": "CONSTRUCTION",
+        "orig_booking_date": booked_at,
+        "race": "W",
+        "sex": "M",
+        "weight": 170,
+    }
+    return inmate, []
+
+
+class TestBookingDates(object):
+    def test_pacific_dates(self):
+        entries = [
+            make_entry("A", dates.parse_datetime("7/13/2016 11:30 PM")),
+            make_entry("B", dates.parse_datetime("7/14/2016 12:30 AM")),
+            make_entry("C", dates.parse_datetime("7/14/2016 9:00 PM")),
+            make_entry("D", None),
+        ]
+
+        out = rollups.booking_dates(entries)
+        assert out == {date(2016, 7, 13), date(2016, 7, 14)}
+
+class TestRefreshArrivals(object):
+    @pytest.mark.integration
+    @pytest.mark.parametrize("ingest", list(scrape.ingest_modes.values()))
+    def test_counts(self, cursor, ingest):
+        entries = [
+            make_entry("A", dates.parse_datetime("7/13/2016 11:30 PM")),
+            make_entry("B", dates.parse_datetime("7/14/2016 12:30 AM")),
+            make_entry("C", dates.parse_datetime("7/14/2016 9:00 PM")),
+        ]
+
+        ingest(entries, cursor)
+
+        cursor.execute("select * from daily_arrivals order by booking_date")
+        assert cursor.fetchall() == [
+            (date(2016, 7, 13), 1),
+            (date(2016, 7, 14), 2),
+        ]
+
+    @pytest.mark.integration
+    def test_only_touched_dates(self, cursor):
+        first = make_entry("A", dates.parse_datetime("7/13/2016 1:00 PM"))
+        second = make_entry("B", dates.parse_datetime("7/15/2016 1:00 PM"))
+        scrape.ingest([first], cursor)
+        cursor.execute("update daily_arrivals set n = 99")
+
+        scrape.ingest([second], cursor)
+
+        cursor.execute("select * from daily_arrivals order by booking_date")
+        assert cursor.fetchall() == [
+            (date(2016, 7, 13), 99),
+            (date(2016, 7, 15), 1),
+        ]
+
+    @pytest.mark.integration
+    @pytest.mark.parametrize("ingest", list(scrape.ingest_modes.values()))
+    def test_moved_dates(self, cursor, ingest):
+        ingest(
+            [make_entry("A", dates.parse_datetime("7/13/2016 1:00 PM"))],
+            cursor)
+
+        ingest(
+            [make_entry("A", dates.parse_datetime("7/15/2016 1:00 PM"))],
+            cursor)
+
+        cursor.execute("select * from daily_arrivals order by booking_date")
+        assert cursor.fetchall() == [
+            (date(2016, 7, 13), 0),
+            (date(2016, 7, 15), 1),
+        ]
+
+class TestRecordCoverage(object):
+    @pytest.mark.integration
+    def test_records_runs(self, cursor):
+        # 7/15 2:00 UTC is 7/14 19:00 Pacific.
+        rollups.record_coverage(
+            "latest", cursor, scraped_at=datetime(2016, 7, 15, 2))
+        rollups.record_coverage(
+            "latest", cursor, scraped_at=datetime(2016, 7, 15, 6))
+        rollups.record_coverage(
+            "current", cursor, scraped_at=datetime(2016, 7, 15, 5))
+
+        cursor.execute(
+            "select scrape_date, search, runs from scrape_coverage "
+            "order by scrape_date, search"
+        )
+        assert cursor.fetchall() == [
+            (date(2016, 7, 14), "current", 1),
+            (date(2016, 7, 14), "latest", 2),
+        ]
@@ -1,8 +1,14 @@
+import json
 import psycopg2
 import pytest
 import responses
 
+from bookinglog import archive
+from bookinglog import bulk
+from bookinglog import changes
+from bookinglog import coerce
 from bookinglog import config
+from bookinglog import pull
 from bookinglog import scrape
 
 
@@ -15,8 +21,11 @@ def cursor():
         # Clear _everything_.
         cursor.execute("delete from arrests")
         cursor.execute("delete from inmates")
+        cursor.execute("delete from charge_items")
         cursor.execute("delete from charges")
         cursor.execute("delete from booking cascade")
+        cursor.execute("delete from daily_arrivals")
+        cursor.execute("delete from scrape_coverage")
         conn.commit()
 
 @pytest.fixture(scope="module")
@@ -25,6 +34,209 @@ def html():
         mock_html = fh.read()
     return mock_html
 
+@pytest.fixture(scope="module")
+def entries(html):
+    return [coerce.convert(*entry) for entry in pull.parse(html)]
+
+def snapshot(cursor):
+    """Read back ingested rows, keyed by jail id."""
+
+    cursor.execute(
+        "select booking.jail_id, booking.orig_booking_date, "
+        "  booking.latest_charge_date, arrests.arrest_date, "
+        "  arrests.agency, arrests.location, inmates.name, inmates.dob, "
+        "  inmates.height, inmates.weight, charges.recorded "
+        "from booking "
+        "join arrests on arrests.booking_id = booking.id "
+        "join inmates on inmates.booking_id = booking.id "
+        "join charges on charges.booking_id = booking.id "
+        "order by booking.jail_id"
+    )
+    return cursor.fetchall()
+
+
+class TestIngestBatch(object):
+    @pytest.mark.integration
+    def test_matches_row_ingest(self, entries, cursor):
+        scrape.ingest(entries, cursor)
+        expected = snapshot(cursor)
+        cursor.execute("delete from arrests")
+        cursor.execute("delete from inmates")
+        cursor.execute("delete from charge_items")
+        cursor.execute("delete from charges")
+        cursor.execute("delete from booking")
+
+        scrape.ingest_batch(entries, cursor)
+        out = snapshot(cursor)
+        assert out == expected
+
+    @pytest.mark.integration
+    def test_upserts_existing(self, entries, cursor):
+        scrape.ingest_batch(entries, cursor)
+
+        inmate, charges = entries[0]
+        updated = {**inmate, "weight": inmate["weight"] + 1}
+        scrape.ingest_batch([(updated, charges)], cursor)
+
+        cursor.execute("select count(*) from booking")
+        assert cursor.fetchone()[0] == len(entries)
+
+        cursor.execute(
+            "select weight from inmates "
+            "join booking on booking.id = inmates.booking_id "
+            "where jail_id = %s",
+            (inmate["jail_id"],)
+        )
+        assert cursor.fetchone()[0] == updated["weight"]
+
+    @pytest.mark.integration
+    def test_duplicate_jail_ids(self, entries, cursor):
+        inmate, charges = entries[0]
+        duplicated = [(inmate, []), (inmate, charges)]
+
+        scrape.ingest_batch(duplicated, cursor)
+
+        cursor.execute("select recorded from charges")
+        rows = cursor.fetchall()
+        assert len(rows) == 1
+        assert rows[0][0] == json.loads(json.dumps(charges))
+
+    @pytest.mark.integration
+    def test_empty(self, cursor):
+        scrape.ingest_batch([], cursor)
+
+        cursor.execute("select count(*) from booking")
+        assert cursor.fetchone()[0] == 0
+
+
+class TestBulkLoad(object):
+    def test_copy_value(self):
+        assert bulk.copy_value(None) == "\\N"
+        assert bulk.copy_value(12) == "12"
+        assert bulk.copy_value("") == ""
+        assert bulk.copy_value("a\tb\\c\n") == "a\\tb\\\\c\\n"
+
+    @pytest.mark.integration
+    def test_matches_row_ingest(self, entries, cursor):
+        scrape.ingest(entries, cursor)
+        expected = snapshot(cursor)
+        cursor.execute("delete from arrests")
+        cursor.execute("delete from inmates")
+        cursor.execute("delete from charge_items")
+        cursor.execute("delete from charges")
+        cursor.execute("delete from booking")
+
+        counts = bulk.load(entries, cursor)
+        assert counts == {"inserted": len(entries)}
+        assert snapshot(cursor) == expected
+
+    @pytest.mark.integration
+    def test_changes(self, entries, cursor):
+        scrape.ingest(entries, cursor)
+
+        inmate, charges = entries[0]
+        changed = [({**inmate, "occupation": ""}, charges)]
+        counts = bulk.load(changed + entries[1:], cursor)
+        assert counts == {"updated": 1, "unchanged": len(entries) - 1}
+
+        # Empty strings aren't loaded as nulls.
+        cursor.execute("select occupation from inmates order by booking_id")
+        assert cursor.fetchone()[0] == ""
+
+        counts = scrape.ingest(changed + entries[1:], cursor)
+        assert counts == {"unchanged": len(entries)}
+
+    @pytest.mark.integration
+    def test_duplicate_jail_ids(self, entries, cursor):
+        inmate, charges = entries[0]
+        duplicated = [(inmate, []), (inmate, charges)]
+
+        bulk.load(duplicated, cursor)
+
+        cursor.execute("select recorded from charges")
+        rows = cursor.fetchall()
+        assert len(rows) == 1
+        assert rows[0][0] == json.loads(json.dumps(charges))
+
+    @pytest.mark.integration
+    def test_empty(self, cursor):
+        assert bulk.load([], cursor) == {}
+
+
+class TestChargeItems(object):
+    @pytest.mark.integration
+    @pytest.mark.parametrize("ingest", list(scrape.ingest_modes.values()))
+    def test_expands_charges(self, entries, cursor, ingest):
+        ingest(entries, cursor)
+
+        cursor.execute(
+            "select jail_id, position, charge, description, level, bail, "
+            "  charge_authority "
+            "from charge_items "
+            "join booking on booking.id = charge_items.booking_id "
+            "order by jail_id, position"
+        )
+        out = cursor.fetchall()
+
+        expected = [
+            (inmate["jail_id"], i + 1, charge["charge"].lower(),
+             charge["description"].lower(), charge["level"].lower(),
+             charge["bail"], charge["charge_authority"].lower())
+            for inmate, charges in entries
+            for i, charge in enumerate(charges)
+        ]
+        assert out == expected
+
+    @pytest.mark.integration
+    @pytest.mark.parametrize("ingest", list(scrape.ingest_modes.values()))
+    def test_replaces_charges(self, entries, cursor, ingest):
+        ingest(entries, cursor)
+
+        inmate, charges = entries[0]
+        ingest([(inmate, charges[:1])], cursor)
+
+        cursor.execute(
+            "select count(*) from charge_items "
+            "join booking on booking.id = charge_items.booking_id "
+            "where jail_id = %s",
+            (inmate["jail_id"],)
+        )
+        assert cursor.fetchone()[0] == 1
+
+
+class TestChangeDetection(object):
+    @pytest.mark.integration
+    @pytest.mark.parametrize("ingest", [scrape.ingest, scrape.ingest_batch])
+    def test_skips_unchanged(self, entries, cursor, ingest):
+        first = ingest(entries, cursor)
+        assert first == {"inserted": len(entries)}
+
+        second = ingest(entries, cursor)
+        assert second == {"unchanged": len(entries)}
+
+    @pytest.mark.integration
+    @pytest.mark.parametrize("ingest", [scrape.ingest, scrape.ingest_batch])
+    def test_writes_changed(self, entries, cursor, ingest):
+        ingest(entries, cursor)
+
+        inmate, charges = entries[0]
+        changed = [({**inmate, "occupation": "RETIRED"}, charges)]
+        counts = ingest(changed + entries[1:], cursor)
+        assert counts == {"updated": 1, "unchanged": len(entries) - 1}
+
+        cursor.execute("select occupation from inmates order by booking_id")
+        assert cursor.fetchone()[0] == "RETIRED"
+
+    @pytest.mark.integration
+    def test_stores_hash(self, entries, cursor):
+        scrape.ingest(entries, cursor)
+
+        cursor.execute("select jail_id, content_hash from booking")
+        hashes = dict(cursor.fetchall())
+        for inmate, charges in entries:
+            expected = changes.content_hash(inmate, charges)
+            assert hashes[inmate["jail_id"]] == expected
+
 
 class TestScraper(object):
     @pytest.mark.integration
@@ -58,3 +270,57 @@ class TestScraper(object):
         cursor.execute("select count(*) from charges")
         charges_count = cursor.fetchone()[0]
         assert charges_count == expected_count
+
+    @pytest.mark.integration
+    @responses.activate
+    def test_multiple_searches(self, html, cursor):
+        responses.add(
+            method="POST",
+            url="https://apps.marincounty.org/BookingLog/Booking/Action",
+            body=html,
+        )
+
+        status = scrape.main("latest", "current")
+
+        assert status == 0
+        assert len(responses.calls) == 2
+
+        cursor.execute("select count(*) from booking")
+        assert cursor.fetchone()[0] == 2
+
+    @pytest.mark.integration
+    @pytest.mark.parametrize("engine", ["sync", "async"])
+    @responses.activate
+    def test_failed_conversion(self, html, cursor, engine):
+        weight = (
+            "Weight:\n            </th>\n"
+            "            <td>\n                "
+        )
+        responses.add(
+            method="POST",
+            url="https://apps.marincounty.org/BookingLog/Booking/Action",
+            body=html.replace(weight + "170", weight + "heavy"),
+        )
+
+        status = scrape.main("latest", engine=engine)
+
+        assert status == 1
+        cursor.execute("select count(*) from booking")
+        assert cursor.fetchone()[0] == 1
+
+    @pytest.mark.integration
+    @responses.activate
+    def test_archives_pages(self, html, cursor, tmpdir):
+        responses.add(
+            method="POST",
+            url="https://apps.marincounty.org/BookingLog/Booking/Action",
+            body=html,
+        )
+        root = str(tmpdir)
+
+        status = scrape.main("latest", "current", archive_dir=root)
+
+        assert status == 0
+        records = list(archive.index(root))
+        assert [r["search"] for r in records] == ["latest", "current"]
+        assert archive.load(root, records[0]["digest"]) == html.encode()
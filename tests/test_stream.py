@@ -0,0 +1,118 @@
+from lxml import etree
+import pytest
+
+from bookinglog import pull
+from bookinglog import stream
+
+
+@pytest.fixture(scope="module")
+def html():
+    with open("tests/data/mock.html") as fh:
+        mock_html = fh.read()
+    return mock_html
+
+@pytest.fixture
+def table():
+    html = (
+        '<table>\n'
+        '  <tr>\n'
+        '    <th scope="col"> First </th>\n'
+        '    <th scope="col"> Second </th>\n'
+        '  </tr>\n'
+        '  <tr>\n'
+        '    <td>11</td>\n'
+        '    <td>12</td>\n'
+        '  </tr>\n'
+        '  <tr>\n'
+        '    <td>21</td>\n'
+        '    <td>22</td>\n'
+        '  </tr>\n'
+        '</table>'
+    )
+    return etree.fromstring(html)
+
+@pytest.fixture
+def keyvalue_table():
+    html = (
+        '<table>\n'
+        '  <tr>\n'
+        '    <th scope="row">First:</th>\n'
+        '    <td>Hello</td>\n'
+        '  </tr>\n'
+        '  <tr>\n'
+        '    <th scope="row">Second:</th>\n'
+        '    <td>World</td>\n'
+        '  </tr>\n'
+        '</table>'
+    )
+    return etree.fromstring(html)
+
+
+class TestTable(object):
+    def test_parse_columns(self, table):
+        expected = ["First", "Second"]
+
+        out = stream.parse_columns(table)
+        assert out == expected
+
+    def test_parse_charges(self, table):
+        expected = [{
+            "First": "11",
+            "Second": "12",
+        }, {
+            "First": "21",
+            "Second": "22",
+        }]
+
+        out = stream.parse_charges(table)
+        assert out == expected
+
+class TestKeyValueTable(object):
+    def test_parse_row(self):
+        html = (
+            '<tr>\n'
+            '  <th scope="row">Key:</th>\n'
+            '  <td> <b>Value</b> </td>\n'
+            '</tr>'
+        )
+        row = etree.fromstring(html)
+        expected = ("Key", "Value")
+
+        out = stream.parse_row(row)
+        assert out == expected
+
+    def test_parse_table(self, keyvalue_table):
+        expected = {"First": "Hello", "Second": "World"}
+
+        out = stream.parse_table(keyvalue_table)
+        assert out == expected
+
+class TestParse(object):
+    def test_matches_soup(self, html):
+        expected = pull.parse(html, engine="bs4")
+
+        out = list(stream.parse(html))
+        assert out == expected
+
+    def test_bytes(self, html):
+        expected = pull.parse(html, engine="bs4")
+
+        out = list(stream.parse(html.encode("utf-8")))
+        assert out == expected
+
+    def test_small_feeds(self, html, monkeypatch):
+        expected = pull.parse(html, engine="bs4")
+        monkeypatch.setattr(stream, "FEED_SIZE", 7)
+
+        out = list(stream.parse(html))
+        assert out == expected
+
+    def test_lazy(self, html):
+        entries = stream.parse(html)
+
+        inmate, _ = next(entries)
+        assert inmate["Jail Id"] == "PJAILID11"
+
+    def test_no_entries(self):
+        out = list(stream.parse("<html><body></body></html>"))
+        assert out == []